@@ -13,10 +13,8 @@ db.createCollection('users');
 db.createCollection('logs');
 
 // İndeksler oluştur (performans için)
-db.incoming_calls.createIndex({ "timestamp": 1 });
-db.incoming_calls.createIndex({ "caller_number": 1 });
-db.incoming_calls.createIndex({ "called_number": 1 });
-db.incoming_calls.createIndex({ "date": 1 });
+// incoming_calls ve call_rollups index'leri ingestor tarafından yönetilir
+// (create_collection.CDR_INDEXES, helpers/rollups.ROLLUP_INDEXES); burada tanımlanmaz
 
 db.users.createIndex({ "phone_number": 1 }, { unique: true });
 
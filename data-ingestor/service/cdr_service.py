@@ -5,6 +5,7 @@ import servicemanager
 import sys
 import os
 import asyncio
+import multiprocessing
 from pathlib import Path
 
 # Project path'ini ekle
@@ -12,46 +13,82 @@ PROJECT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_DIR / 'src'))
 
 from processors.cdr_processor import CDRProcessor
+from helpers.logger import stop_mongo_logging
+from helpers.mongo import close_mongo_client
+
+
+def configure_worker_executable():
+    """
+    Servis pythonservice.exe içinde çalışır ve sys.executable servis host'unu gösterir. Parse process pool'u
+    (pipeline.parse_workers) spawn edilen worker'ları sys.executable ile başlattığı için worker'lar
+    gerçek python.exe ile başlatılmalıdır (venv'de Scripts\\python.exe).
+    """
+    if os.path.basename(sys.executable).lower() in ('python.exe', 'pythonw.exe'):
+        return
+    candidates = [
+        os.path.join(sys.exec_prefix, 'python.exe'),
+        os.path.join(sys.exec_prefix, 'Scripts', 'python.exe'),
+        os.path.join(sys.base_exec_prefix, 'python.exe'),
+    ]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            multiprocessing.set_executable(candidate)
+            servicemanager.LogInfoMsg(f'Parse worker executable: {candidate}')
+            return
+    servicemanager.LogErrorMsg(
+        f'python.exe not found under {sys.exec_prefix}; set pipeline.parse_workers: 1 to parse in-process'
+    )
+
 
 class CDRService(win32serviceutil.ServiceFramework):
     _svc_name_ = 'CDRDataIngestor'
     _svc_display_name_ = 'CDR Data Ingestor Service'
-    _svc_description_ = 'CDR dosyalarını 2 dakikada bir işleyen servis'
+    _svc_description_ = 'CDR dosyalarını geldikçe (en geç watcher.poll_interval saniyede bir) işleyen servis'
 
     def __init__(self, args):
         win32serviceutil.ServiceFramework.__init__(self, args)
         self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
         self.stop_requested = False
+        self.processor = None
+        self.loop = None
 
     def SvcStop(self):
         servicemanager.LogInfoMsg('CDR Service durduruluyor...')
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         self.stop_requested = True
+        # SvcStop servis kontrol thread'inde çağrılır: shutdown isteği event loop'a aktarılır
+        if self.processor is not None and self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.processor.request_shutdown)
+            except RuntimeError:
+                pass  # Loop zaten kapanmış
         win32event.SetEvent(self.hWaitStop)
 
     def SvcDoRun(self):
         servicemanager.LogInfoMsg('CDR Service başlatıldı')
         try:
+            # Processor parse pool'unu başlatmadan önce
+            configure_worker_executable()
             asyncio.run(self.main_loop())
         except Exception as e:
             servicemanager.LogErrorMsg(f'Service hatası: {e}')
 
     async def main_loop(self):
-        processor = CDRProcessor('E:\\CDR', 'E:\\CDR_Processed')
-        await processor.initialize()
-        servicemanager.LogInfoMsg('CDR Processor hazır')
-        
-        while not self.stop_requested:
-            try:
-                await processor.process_available_files()
-                # 2 dakika bekle
-                for i in range(24):  # 24 x 5 = 120 saniye
-                    if self.stop_requested:
-                        break
-                    await asyncio.sleep(5)
-            except Exception as e:
-                servicemanager.LogErrorMsg(f'İşlem hatası: {e}')
-                await asyncio.sleep(30)
+        self.loop = asyncio.get_running_loop()
+        self.processor = CDRProcessor('E:\\CDR', 'E:\\CDR_Processed')
+        try:
+            await self.processor.initialize()
+            servicemanager.LogInfoMsg('CDR Processor hazır')
+            if self.stop_requested:
+                # initialize sırasında gelen durdurma isteği
+                self.processor.request_shutdown()
+            # main.py ile aynı döngü: watcher olayları ve watcher.poll_interval, shutdown isteğine kadar
+            await self.processor.run_periodic_processing()
+        finally:
+            # Parse process'leri, watcher ve arka plan görevleri; sonra bekleyen log kayıtları ve client
+            await self.processor.close()
+            stop_mongo_logging()
+            close_mongo_client()
 
 if __name__ == '__main__':
     win32serviceutil.HandleCommandLine(CDRService)
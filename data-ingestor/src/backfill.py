@@ -0,0 +1,344 @@
+"""
+Arşiv CDR dosyalarının toplu yüklenmesi (backfill), servis döngüsü dışında.
+
+Kullanım:
+    python backfill.py E:\\CDR_Processed\\2024 [--defer-indexes] [--bypass-validation]
+    python backfill.py "E:\\CDR_Processed\\2024\\0[1-6]\\cdr_*" [--file-workers 4] [--batch-size 10000]
+
+Klasör verilirse altındaki tüm CDR dosyaları (cdr_*), değilse glob deseni yüklenir. Dosyalar taşınmaz,
+kilitlenmez ve checkpoint tutulmaz: tekrar çalıştırmak güvenlidir, daha önce yazılmış kayıtlar unique
+pk_id index'i ile elenir (duplicate olarak raporlanır).
+
+Parse tüm CPU'larda (process pool, dosyalar parçalara bölünür), yazma büyük unordered insert_many
+batch'leri ile paralel yapılır.
+    --defer-indexes      Unique pk_id index'i dışındaki index'ler yükleme öncesi silinir, sonunda yeniden oluşturulur
+    --bypass-validation  Sunucu tarafı $jsonSchema kontrolü atlanır (kayıtlar istemcide doğrulanır;
+                         bypassDocumentValidation yetkisi gerekir)
+Rollup'lar (config 'rollups') servisteki gibi insert edilen kayıtlarla güncellenir; --no-rollups ile atlanıp
+sonradan rebuild_rollups.py ile toplu hesaplanabilir.
+Sonunda throughput raporu yazdırılır ve dosya başına sayım doğrulaması yapılır: dosyadaki her pkid'nin
+collection'da bulunduğu kontrol edilir. Hatalı dosya ya da eksik kayıt varsa çıkış kodu 1'dir.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from bson.raw_bson import RawBSONDocument
+from helpers.bulk_writer import BulkWriter
+from helpers.document_builder import VALIDATION_SAMPLED
+from helpers.file_manager import cdr_file_sort_key
+from helpers.logger import main_logger as logger, stop_mongo_logging
+from helpers.mongo import close_mongo_client
+from helpers.rollups import CallRollups
+from processors.file_parser import find_record_boundaries, iter_csv_rows, read_header, parse_cdr_chunk
+from create_collection import create_collection_if_not_exists, get_index_manager
+from users import load_user_directory
+from utils import get_mongo_collection, get_rollup_collection, get_rollup_claim_collection, ingestion_config, config
+
+# Doğrulamada tek sorgudaki pkid sayısı
+VERIFY_BATCH_SIZE = 1000
+# Index tanımında create_index'e aktarılmayan alanlar
+_INDEX_INFO_FIELDS = ('key', 'v', 'ns')
+
+
+def resolve_files(patterns) -> list:
+    """Klasörlerdeki (alt klasörler dahil) ve glob desenlerine uyan CDR dosyaları, üretim zamanına göre sıralı"""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, names in os.walk(pattern):
+                files.update(os.path.join(root, name) for name in names if name.startswith('cdr_'))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(files, key=cdr_file_sort_key)
+
+
+def drop_secondary_indexes(collection) -> dict:
+    """
+    _id ve unique index'ler (idempotent yazma için gerekli) dışındaki index'leri sil.
+    Returns: silinen index tanımları {isim: index_information kaydı}
+    """
+    dropped = {}
+    for name, spec in collection.index_information().items():
+        if name == '_id_' or spec.get('unique'):
+            continue
+        collection.drop_index(name)
+        dropped[name] = spec
+        logger.info(f"Backfill: dropped index {name} {spec['key']} until the load finishes")
+    return dropped
+
+
+def create_indexes(collection, indexes: dict):
+    """drop_secondary_indexes ile silinen index'leri aynı tanımlarla yeniden oluştur"""
+    for name, spec in indexes.items():
+        options = {key: value for key, value in spec.items() if key not in _INDEX_INFO_FIELDS}
+        started = time.perf_counter()
+        collection.create_index(spec['key'], name=name, **options)
+        logger.info(f"Backfill: index {name} built in {time.perf_counter() - started:.1f}s")
+
+
+class Backfill:
+    """
+    Dosyaları servis pipeline'ı ile aynı aşamalarla yükler: parçalara bölme -> parse (process pool) ->
+    yazma (ortak in-flight limiti). En fazla file_workers dosya aynı anda, dosya başına en fazla
+    parse_queue_size parça parse edilmekte / yazılmayı bekler.
+    """
+
+    def __init__(self, collection, file_workers: int, parse_workers: int, write_workers: int,
+                 batch_size: int, batch_max_bytes: int, chunk_size: int, parse_queue_size: int,
+                 validation: str, sample_rate: int, bypass_validation: bool, rollups=None, user_directory=None):
+        self.collection = collection
+        self.rollups = rollups
+        self.file_workers = file_workers
+        self.parse_workers = parse_workers
+        self.write_workers = write_workers
+        self.batch_size = batch_size
+        self.batch_max_bytes = batch_max_bytes
+        self.chunk_size = chunk_size
+        self.parse_queue_size = parse_queue_size
+        self.validation = validation
+        self.sample_rate = sample_rate
+        self.bypass_validation = bypass_validation
+        self._pool = None
+        self._write_semaphore = None
+        self._user_directory = user_directory  # None: run() başında yüklenir
+
+    async def run(self, files: list) -> list:
+        """Dosyaları yükle. Returns: dosya başına sonuçlar (sırayla)"""
+        # Backfill boyunca tek dizin snapshot'ı
+        if self._user_directory is None:
+            self._user_directory = load_user_directory()
+        self._write_semaphore = asyncio.Semaphore(self.write_workers)
+        file_slots = asyncio.Semaphore(self.file_workers)
+
+        async def load_with_slot(file_path):
+            async with file_slots:
+                return await self.load_file(file_path)
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as self._pool:
+            return await asyncio.gather(*(load_with_slot(file_path) for file_path in files))
+
+    async def load_file(self, file_path: str) -> dict:
+        started = time.perf_counter()
+        result = {
+            'file_path': file_path,
+            'filename': os.path.basename(file_path),
+            'bytes': 0,
+            'records': 0,
+            'inserted': 0,
+            'duplicates': 0,
+            'failed': 0,
+            'seconds': 0,
+            'error': None,
+        }
+        writer = BulkWriter(
+            self.collection,
+            max_docs=self.batch_size,
+            max_bytes=self.batch_max_bytes,
+            semaphore=self._write_semaphore,
+            bypass_document_validation=self.bypass_validation,
+            rollups=self.rollups,
+        )
+        loop = asyncio.get_running_loop()
+        parsing = deque()
+        try:
+            result['bytes'] = os.path.getsize(file_path)
+            chunks = await asyncio.to_thread(find_record_boundaries, file_path, self.chunk_size)
+            header = await asyncio.to_thread(read_header, file_path)
+
+            for start, end in chunks:
+                parsing.append(loop.run_in_executor(
+                    self._pool, parse_cdr_chunk, file_path, start, end, header,
+                    self._user_directory, self.validation, self.sample_rate
+                ))
+                if len(parsing) >= self.parse_queue_size:
+                    result['records'] += await self._write_chunk(parsing.popleft(), writer)
+            while parsing:
+                result['records'] += await self._write_chunk(parsing.popleft(), writer)
+            await writer.flush()
+
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"Backfill failed for {result['filename']}: {e}")
+            for future in parsing:
+                future.cancel()
+            await writer.wait_pending()
+
+        result.update({key: value for key, value in writer.get_stats().items() if key in result})
+        result['seconds'] = time.perf_counter() - started
+        return result
+
+    async def _write_chunk(self, future, writer: BulkWriter) -> int:
+        count, documents = await future
+        for raw in documents:
+            await writer.add(RawBSONDocument(raw))
+        return count
+
+
+def verify_file(collection, file_path: str) -> dict:
+    """
+    Dosyadaki pkid'lerin collection'da bulunup bulunmadığını say (unique pk_id index'i üzerinden).
+    Dokümana çevrilemeyen ve yazılamayan satırlar eksik olarak görünür.
+    Returns: {'expected': dosyadaki pkid sayısı, 'found': collection'da bulunan}
+    """
+    rows = iter_csv_rows(file_path)
+    header = next(rows, None) or []
+    if 'pkid' not in header:
+        return {'expected': 0, 'found': 0}
+    pkid_index = header.index('pkid')
+    cluster_index = header.index('globalCallId_ClusterID') if 'globalCallId_ClusterID' in header else None
+
+    keys = {}  # cluster_id -> {pkid}
+    for row in rows:
+        if len(row) <= pkid_index or not row[pkid_index]:
+            continue
+        # Değer dönüştürülmeden yazılır (boş string dahil); kolon yoksa alan None / eksiktir
+        cluster_id = row[cluster_index] if cluster_index is not None and len(row) > cluster_index else None
+        keys.setdefault(cluster_id, set()).add(row[pkid_index])
+
+    expected = found = 0
+    for cluster_id, pkids in keys.items():
+        pkids = sorted(pkids)
+        expected += len(pkids)
+        for start in range(0, len(pkids), VERIFY_BATCH_SIZE):
+            found += collection.count_documents({
+                'pk_id': {'$in': pkids[start:start + VERIFY_BATCH_SIZE]},
+                'globalCall.cluster_id': cluster_id,
+            })
+    return {'expected': expected, 'found': found}
+
+
+def print_report(results: list, elapsed: float, index_seconds: float):
+    """Dosya başına ve toplam throughput"""
+    print(f"{'file':<48} {'records':>9} {'inserted':>9} {'dup':>7} {'failed':>7} {'seconds':>8} {'rows/s':>9}")
+    for result in results:
+        rate = result['records'] / result['seconds'] if result['seconds'] else 0
+        print(f"{result['filename']:<48} {result['records']:>9} {result['inserted']:>9} {result['duplicates']:>7} "
+              f"{result['failed']:>7} {result['seconds']:>8.1f} {rate:>9.0f}"
+              + (f"  ERROR: {result['error']}" if result['error'] else ""))
+
+    records = sum(result['records'] for result in results)
+    megabytes = sum(result['bytes'] for result in results) / 2 ** 20
+    print()
+    print(f"Files:      {len(results)} ({sum(1 for result in results if result['error'])} failed)")
+    print(f"Records:    {records} ({sum(result['inserted'] for result in results)} inserted, "
+          f"{sum(result['duplicates'] for result in results)} already present, "
+          f"{sum(result['failed'] for result in results)} failed)")
+    print(f"Load:       {elapsed:.1f}s, {records / elapsed if elapsed else 0:.0f} rows/s, "
+          f"{megabytes / elapsed if elapsed else 0:.1f} MB/s")
+    if index_seconds:
+        print(f"Indexes:    {index_seconds:.1f}s")
+
+
+def verify(collection, results: list) -> bool:
+    """Yüklenen her dosya için sayım doğrulaması. Returns: eksik kayıt yok mu"""
+    started = time.perf_counter()
+    complete = True
+    expected_total = found_total = 0
+    for result in results:
+        if result['error']:
+            continue
+        counts = verify_file(collection, result['file_path'])
+        expected_total += counts['expected']
+        found_total += counts['found']
+        if counts['found'] != counts['expected']:
+            complete = False
+            print(f"MISSING {result['filename']}: {counts['found']}/{counts['expected']} records in collection "
+                  f"({result['failed']} failed to insert)")
+    print(f"Verify:     {found_total}/{expected_total} records found in {time.perf_counter() - started:.1f}s"
+          + ("" if complete else ", see MISSING lines above"))
+    return complete
+
+
+async def backfill(args) -> bool:
+    files = resolve_files(args.paths)
+    if not files:
+        print("No CDR files found")
+        return False
+    logger.info(f"Backfill starting: {len(files)} files")
+
+    await create_collection_if_not_exists()
+    collection = get_mongo_collection()
+    deferred = drop_secondary_indexes(collection) if args.defer_indexes else {}
+
+    # Backfill boyunca tek dizin snapshot'ı: kayıtlar ve rollup'lar aynı dizinle
+    user_directory = load_user_directory()
+    rollups = None
+    rollup_config = config.get('rollups') or {}
+    if rollup_config.get('enabled', True) and not args.no_rollups:
+        rollups = CallRollups(
+            get_rollup_collection(),
+            get_rollup_claim_collection(),
+            tz=rollup_config.get('timezone', 'Europe/Istanbul'),
+            directory=lambda: user_directory,
+        )
+        rollups.ensure_indexes()
+
+    loader = Backfill(
+        collection,
+        file_workers=args.file_workers,
+        parse_workers=args.parse_workers,
+        write_workers=args.write_workers,
+        batch_size=args.batch_size,
+        batch_max_bytes=args.batch_max_mb * 1024 * 1024,
+        chunk_size=args.chunk_mb * 1024 * 1024,
+        parse_queue_size=args.parse_queue_size,
+        validation=args.validation,
+        sample_rate=ingestion_config.get('validation_sample_rate', 1000),
+        bypass_validation=args.bypass_validation,
+        rollups=rollups,
+        user_directory=user_directory,
+    )
+    started = time.perf_counter()
+    try:
+        results = await loader.run(files)
+    finally:
+        # Yükleme yarıda kalsa da silinen index'ler geri gelsin
+        index_started = time.perf_counter()
+        create_indexes(collection, deferred)
+        # Tanımlı olup henüz oluşturulmamış index'ler de (servis arka planda oluşturur, backfill burada)
+        built = get_index_manager(collection).ensure_all()['missing']
+        index_seconds = time.perf_counter() - index_started if deferred or built else 0
+    elapsed = index_started - started
+
+    print_report(results, elapsed, index_seconds)
+    logger.info(f"Backfill finished: {len(files)} files, {sum(result['records'] for result in results)} records, "
+                f"{elapsed:.1f}s")
+
+    complete = True if args.no_verify else verify(collection, results)
+    return complete and not any(result['error'] for result in results)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="CUCM CDR archive backfill")
+    parser.add_argument('paths', nargs='+', help="Klasör (alt klasörler dahil) ya da glob deseni")
+    parser.add_argument('--file-workers', type=int, default=cpus, help="Aynı anda yüklenen dosya sayısı")
+    parser.add_argument('--parse-workers', type=int, default=cpus, help="Parse process sayısı")
+    parser.add_argument('--parse-queue-size', type=int, default=8, help="Dosya başına parse edilen en fazla parça")
+    parser.add_argument('--write-workers', type=int, default=8, help="Aynı anda yazılan batch sayısı")
+    parser.add_argument('--batch-size', type=int, default=10000, help="insert_many başına doküman")
+    parser.add_argument('--batch-max-mb', type=int, default=32, help="insert_many başına en fazla BSON boyutu")
+    parser.add_argument('--chunk-mb', type=int, default=16, help="Parse parça boyutu")
+    parser.add_argument('--validation', default=ingestion_config.get('validation', VALIDATION_SAMPLED),
+                        choices=['strict', 'sampled', 'fast'], help="İstemci tarafı doğrulama")
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="Unique olmayan index'leri yüklemeden sonra oluştur")
+    parser.add_argument('--bypass-validation', action='store_true', help="Sunucu tarafı $jsonSchema kontrolünü atla")
+    parser.add_argument('--no-verify', action='store_true', help="Dosya başına sayım doğrulamasını atla")
+    parser.add_argument('--no-rollups', action='store_true', help="Rollup'ları güncelleme (sonra rebuild_rollups.py)")
+    args = parser.parse_args()
+
+    try:
+        complete = asyncio.run(backfill(args))
+    finally:
+        stop_mongo_logging()
+        close_mongo_client()
+    raise SystemExit(0 if complete else 1)
+
+
+if __name__ == '__main__':
+    main()
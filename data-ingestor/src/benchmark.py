@@ -0,0 +1,299 @@
+"""
+CDR ingestion benchmark'ları (manuel çalıştırma için)
+
+Kullanım:
+    python benchmark.py writes --file E:\\CDR_Processed\\2024\\01\\cdr_... [--latency-ms 1.0]
+    python benchmark.py parse --file E:\\CDR_Processed\\2024\\01\\cdr_...
+    python benchmark.py parity --file E:\\CDR_Processed\\2024\\01\\cdr_... [--file ...]
+    python benchmark.py directory [--users 3000] [--lookups 200000]
+    python benchmark.py reader --file E:\\CDR_Processed\\2024\\01\\cdr_... [--chunk-mb 16]
+    python benchmark.py chunks --file E:\\CDR_Processed\\2024\\01\\cdr_... [--workers 1,2,4,8] [--chunk-mb 16]
+
+--latency-ms verilirse MongoDB yerine gecikme simüle eden bir collection kullanılır
+(her çağrı bir network round trip kadar bekler). Verilmezse config.yaml'daki
+MongoDB'de geçici 'benchmark_incoming_calls' collection'ı kullanılır ve sonunda silinir.
+"""
+import argparse
+import asyncio
+import csv
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bson import encode
+from helpers.bulk_writer import BulkWriter, DEFAULT_MAX_DOCS, DEFAULT_MAX_BYTES
+from helpers.converters import compile_row_plan, parse_csv_row
+from helpers.document_builder import RowConverter, compile_document_builder
+from helpers.user_directory import UserDirectory
+from processors.file_parser import iter_csv_rows, parse_cdr_file, find_record_boundaries, read_header, parse_cdr_chunk
+from helpers.mongo import get_mongo_client
+from utils import config
+
+BENCHMARK_COLLECTION = 'benchmark_incoming_calls'
+
+
+class SimulatedCollection:
+    """Her çağrıda network round trip + doküman başı sunucu süresi kadar bekleyen collection"""
+
+    def __init__(self, latency_ms: float, per_doc_us: float):
+        self.latency = latency_ms / 1000.0
+        self.per_doc = per_doc_us / 1_000_000.0
+
+    def insert_one(self, document):
+        time.sleep(self.latency + self.per_doc)
+
+    def insert_many(self, documents, ordered=True, bypass_document_validation=False):
+        time.sleep(self.latency + self.per_doc * len(documents))
+
+    def drop(self):
+        pass
+
+
+def read_rows(file_path: str):
+    """Dosyayı header ve csv.reader satırları olarak oku"""
+    with open(file_path, mode='r', encoding='utf-8-sig') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader, None) or []
+        return compile_row_plan(tuple(header)), [row for row in csv_reader if row]
+
+
+async def write_insert_one(collection, plan, rows, users):
+    """Eski yol: satır başına insert_one"""
+    converter = RowConverter(plan, users)
+    for row in rows:
+        document = converter.convert(row)
+        if document is not None:
+            collection.insert_one(document)
+
+
+async def write_bulk(collection, plan, rows, users, max_in_flight):
+    writer = BulkWriter(collection, DEFAULT_MAX_DOCS, DEFAULT_MAX_BYTES, max_in_flight=max_in_flight)
+    converter = RowConverter(plan, users)
+    for row in rows:
+        document = converter.convert(row)
+        if document is not None:
+            await writer.add(document)
+    await writer.flush()
+
+
+def report(name: str, rows: int, elapsed: float):
+    print(f"{name:<32} {rows:>8} rows  {elapsed:>8.2f}s  {rows / elapsed:>10.0f} rows/s")
+
+
+def benchmark_writes(args):
+    plan, rows = read_rows(args.file)
+    users = []
+
+    if args.latency_ms is not None:
+        make_collection = lambda: SimulatedCollection(args.latency_ms, args.per_doc_us)
+    else:
+        db = get_mongo_client()[config['mongo']['database']]
+        make_collection = lambda: db[BENCHMARK_COLLECTION]
+
+    scenarios = [
+        ('insert_one (sequential)', lambda c: write_insert_one(c, plan, rows, users)),
+        ('insert_many, in_flight=1', lambda c: write_bulk(c, plan, rows, users, 1)),
+        (f'insert_many, in_flight={args.in_flight}', lambda c: write_bulk(c, plan, rows, users, args.in_flight)),
+    ]
+    for name, scenario in scenarios:
+        collection = make_collection()
+        collection.drop()
+        start = time.perf_counter()
+        asyncio.run(scenario(collection))
+        report(name, len(rows), time.perf_counter() - start)
+        collection.drop()
+
+
+def benchmark_parse(args):
+    """
+    Sadece CPU: CSV okuma + dokümana dönüştürme (MongoDB gerekmez).
+    Eski DictReader + satır başına dict yolu artık kodda yok; onunla karşılaştırmak için bu komut
+    o sürümün checkout'unda ayrıca çalıştırılmalıdır.
+    """
+    users = []
+
+    def row_plan():
+        with open(args.file, mode='r', encoding='utf-8-sig') as file:
+            csv_reader = csv.reader(file)
+            plan = compile_row_plan(tuple(next(csv_reader, None) or []))
+            return [parse_csv_row(row, plan, users).model_dump() for row in csv_reader if row]
+
+    def document_builder():
+        with open(args.file, mode='r', encoding='utf-8-sig') as file:
+            csv_reader = csv.reader(file)
+            builder = compile_document_builder(compile_row_plan(tuple(next(csv_reader, None) or [])))
+            return [builder.build(row, users) for row in csv_reader if row]
+
+    scenarios = [
+        ('csv.reader + compiled plan', row_plan),
+        ('compiled plan + doc builder', document_builder),
+    ]
+    for name, scenario in scenarios:
+        start = time.perf_counter()
+        documents = scenario()
+        report(name, len(documents), time.perf_counter() - start)
+
+
+def benchmark_parity(args):
+    """
+    Golden kontrol: hızlı document builder çıktısı CdrModel.model_dump() ile
+    BSON olarak byte-byte aynı mı? Hatalı satırlarda iki yol da hata vermeli.
+    """
+    users = []
+    rows = mismatches = 0
+
+    def bson_or_error(build):
+        try:
+            return encode(build())
+        except ValueError as e:  # ValidationError dahil
+            return type(e).__name__
+
+    for file_path in args.file:
+        with open(file_path, mode='r', encoding='utf-8-sig') as file:
+            csv_reader = csv.reader(file)
+            plan = compile_row_plan(tuple(next(csv_reader, None) or []))
+            builder = compile_document_builder(plan)
+            for row in csv_reader:
+                if not row:
+                    continue
+                rows += 1
+                expected = bson_or_error(lambda row=row, plan=plan: parse_csv_row(row, plan, users).model_dump())
+                actual = bson_or_error(lambda row=row, builder=builder: builder.build(row, users))
+                if expected != actual:
+                    mismatches += 1
+                    print(f"MISMATCH {file_path} row {rows}: {row}")
+
+    print(f"{rows} rows checked, {mismatches} mismatches")
+    if mismatches:
+        raise SystemExit(1)
+
+
+def benchmark_directory(args):
+    """Çağrı yönü lookup'ı: distinct() listesi vs UserDirectory (MongoDB gerekmez)"""
+    rng = random.Random(42)
+    users = [str(8036_0000 + i) for i in range(args.users)]
+    external = ['+90532' + str(rng.randint(1000000, 9999999)) for _ in range(1000)]
+    lookups = [rng.choice(users) if rng.random() < 0.5 else rng.choice(external) for _ in range(args.lookups)]
+
+    for name, index in [('list (distinct)', users), ('UserDirectory', UserDirectory(users))]:
+        start = time.perf_counter()
+        hits = sum(1 for number in lookups if number in index)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<32} {args.lookups:>8} lookups  {elapsed:>8.3f}s  {args.lookups / elapsed:>12.0f} lookups/s  ({hits} hits)")
+
+
+def peak_rss_mb() -> float:
+    """Process'in şimdiye kadarki en yüksek RSS'i (Windows'ta peak working set)"""
+    try:
+        import resource
+    except ImportError:
+        import win32api
+        import win32process
+        return win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())['PeakWorkingSetSize'] / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def measure_reader(file_path: str, start: int, end, use_mmap: bool):
+    """Temiz bir process'te çalışır: satırları okur, (satır, süre, peak RSS artışı) döner"""
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    rows = sum(1 for row in iter_csv_rows(file_path, start, end, use_mmap=use_mmap) if row)
+    return rows, time.perf_counter() - started, peak_rss_mb() - baseline
+
+
+def benchmark_reader(args):
+    """CSV okuyucu: buffered text vs mmap, tüm dosya ve tek parça (MongoDB gerekmez)"""
+    first_chunk = find_record_boundaries(args.file, args.chunk_mb * 1024 * 1024)[0]
+    scenarios = [
+        ('text, whole file', 0, None, False),
+        ('mmap, whole file', 0, None, True),
+        (f'text, first {args.chunk_mb}MB chunk', first_chunk[0], first_chunk[1], False),
+        (f'mmap, first {args.chunk_mb}MB chunk', first_chunk[0], first_chunk[1], True),
+    ]
+    for name, start, end, use_mmap in scenarios:
+        # Her senaryo yeni bir process'te: peak RSS önceki senaryodan etkilenmesin
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            rows, elapsed, rss = pool.submit(measure_reader, args.file, start, end, use_mmap).result()
+        report(name, rows, elapsed)
+        print(f"{'':<32} peak RSS +{rss:.1f} MB")
+
+
+def benchmark_chunks(args):
+    """Tek dosyanın parçalara bölünerek paralel parse edilmesi: 1..N process ölçeklenmesi (MongoDB gerekmez)"""
+    users = []
+    start = time.perf_counter()
+    expected = parse_cdr_file(args.file, users, args.validation, 1000)
+    serial = time.perf_counter() - start
+    report('serial', expected[0], serial)
+
+    for workers in [int(value) for value in args.workers.split(',')]:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Process başlatma süresi ölçüme girmesin
+            for future in [pool.submit(os.getpid) for _ in range(workers)]:
+                future.result()
+
+            start = time.perf_counter()
+            chunks = find_record_boundaries(args.file, args.chunk_mb * 1024 * 1024)
+            header = read_header(args.file)
+            futures = [pool.submit(parse_cdr_chunk, args.file, chunk_start, chunk_end, header, users, args.validation, 1000)
+                       for chunk_start, chunk_end in chunks]
+            records_count = 0
+            documents = []
+            for future in futures:
+                count, raws = future.result()
+                records_count += count
+                documents.extend(raws)
+            elapsed = time.perf_counter() - start
+
+        identical = (records_count, documents) == expected
+        report(f'{len(chunks)} chunks, {workers} workers', records_count, elapsed)
+        print(f"{'':<32} speedup {serial / elapsed:.2f}x, output {'identical' if identical else 'DIFFERENT'}")
+        if not identical:
+            raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CDR ingestion benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    writes = subparsers.add_parser('writes', help="Yazma yolu karşılaştırması (rows/s)")
+    writes.add_argument('--file', required=True, help="CUCM CDR dosyası")
+    writes.add_argument('--in-flight', type=int, default=4)
+    writes.add_argument('--latency-ms', type=float, default=None, help="MongoDB yerine simüle edilmiş RTT")
+    writes.add_argument('--per-doc-us', type=float, default=20.0, help="Simülasyonda doküman başı sunucu süresi")
+    writes.set_defaults(func=benchmark_writes)
+
+    parse = subparsers.add_parser('parse', help="Parse CPU karşılaştırması (rows/s)")
+    parse.add_argument('--file', required=True, help="CUCM CDR dosyası")
+    parse.set_defaults(func=benchmark_parse)
+
+    parity = subparsers.add_parser('parity', help="Document builder / Pydantic byte-byte karşılaştırması")
+    parity.add_argument('--file', required=True, action='append', help="CUCM CDR dosyası (birden fazla verilebilir)")
+    parity.set_defaults(func=benchmark_parity)
+
+    directory = subparsers.add_parser('directory', help="Dahili numara lookup mikrobenchmark'ı")
+    directory.add_argument('--users', type=int, default=3000)
+    directory.add_argument('--lookups', type=int, default=200000)
+    directory.set_defaults(func=benchmark_directory)
+
+    reader = subparsers.add_parser('reader', help="CSV okuyucu karşılaştırması (süre ve peak RSS)")
+    reader.add_argument('--file', required=True, help="CUCM CDR dosyası")
+    reader.add_argument('--chunk-mb', type=int, default=16)
+    reader.set_defaults(func=benchmark_reader)
+
+    chunks = subparsers.add_parser('chunks', help="Büyük dosya parça parse ölçeklenmesi (1..N process)")
+    chunks.add_argument('--file', required=True, help="CUCM CDR dosyası")
+    chunks.add_argument('--workers', default=f'1,2,4,{os.cpu_count()}', help="Virgülle ayrılmış process sayıları")
+    chunks.add_argument('--chunk-mb', type=int, default=16)
+    chunks.add_argument('--validation', default='sampled', choices=['strict', 'sampled', 'fast'])
+    chunks.set_defaults(func=benchmark_chunks)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
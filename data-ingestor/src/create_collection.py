@@ -1,296 +1,395 @@
+import argparse
 import asyncio
-from helpers.logger import main_logger as logger
-from pymongo import MongoClient
+from helpers.logger import main_logger as logger, stop_mongo_logging
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 from helpers.config import load_config
+from helpers.mongo import get_database, close_mongo_client
+from helpers.index_manager import IndexManager, IndexSpec
 
 config = load_config()
 
-async def create_collection_if_not_exists():
-    client = MongoClient(config['mongo']['uri'])
-    db = client[config['mongo']['database']]
-    collection_name = config['mongo']['collection']
-    
-    if collection_name not in db.list_collection_names():
-        db.create_collection(collection_name)
-        schema = {
+# incoming_calls index tanımları (helpers.index_manager): backend sorguları tarih aralığı + yön, taraf numarası
+# (üç tarafın $or'u, her kol kendi index'i ile) ve türetilmiş arama / takvim alanları üzerinden
+CDR_INDEXES = [
+    # Idempotent yazma: aynı CDR (pkid, cluster) ikinci kez yazılamaz; pk_id'si olmayan kayıtlar index dışında
+    IndexSpec('pk_id_unique', [('pk_id', ASCENDING), ('globalCall.cluster_id', ASCENDING)], required=True,
+              unique=True, partialFilterExpression={'pk_id': {'$type': 'string'}}),
+    IndexSpec('origination_direction', [('dateTime.origination', DESCENDING), ('callDirection', ASCENDING)]),
+    IndexSpec('callingParty_origination', [('callingParty.number', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    IndexSpec('finalCalledParty_origination',
+              [('finalCalledParty.number', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    IndexSpec('originalCalledParty_origination',
+              [('originalCalledParty.number', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    # attach_search_fields alanları: tek multikey index'te eşitlik / prefix (^8036) araması
+    IndexSpec('parties_origination', [('parties', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    IndexSpec('partyDigits_origination', [('partyDigits', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    IndexSpec('partyDigitsReversed_origination',
+              [('partyDigitsReversed', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    IndexSpec('blocks_origination', [('blocks', ASCENDING), ('dateTime.origination', DESCENDING)]),
+    # Yerel gün bazlı raporlar
+    IndexSpec('calendar_day_direction', [('calendar.day', ASCENDING), ('callDirection', ASCENDING)]),
+]
+
+# incoming_calls $jsonSchema validator'ı. Mevcut collection'lara da her başlangıçta collMod ile uygulanır;
+# yeni alanlar (party.user, parties / partyDigits / blocks, calendar) eski kurulumlarda da doğrulanır.
+CDR_SCHEMA = {
+    'bsonType': 'object',
+    'required': ['cdrRecordType'],
+    'properties': {
+        'authCodeDescription': {'bsonType': ['string', 'null']},
+        'authorization': {
             'bsonType': 'object',
-            'required': ['cdrRecordType'],
             'properties': {
-                'authCodeDescription': {'bsonType': ['string', 'null']},
-                'authorization': {
-                    'bsonType': 'object',
-                    'properties': {
-                        'level': {'bsonType': ['int', 'null']},
-                        'code_value': {'bsonType': ['string', 'null']}
-                    }
-                },
-                'callSecuredStatus': {'bsonType': ['int', 'null']},
-                'calledPartyPatternUsage': {'bsonType': ['int', 'null']},
-                'callingParty': {
+                'level': {'bsonType': ['int', 'null']},
+                'code_value': {'bsonType': ['string', 'null']}
+            }
+        },
+        'callSecuredStatus': {'bsonType': ['int', 'null']},
+        'calledPartyPatternUsage': {'bsonType': ['int', 'null']},
+        'callingParty': {
+            'bsonType': 'object',
+            'properties': {
+                'number': {'bsonType': ['string', 'null']},
+                'partition': {'bsonType': ['string', 'null']},
+                'uri': {'bsonType': ['string', 'null']},
+                'unicode_login_user_id': {'bsonType': ['string', 'null']},
+                'user': {'bsonType': ['object', 'null']}
+            }
+        },
+        'cdrRecordType': {'bsonType': ['int', 'null']},
+        'clientMatterCode': {'bsonType': ['string', 'null']},
+        'comment': {'bsonType': ['string', 'null']},
+        'currentRoutingReason': {'bsonType': ['int', 'null']},
+        'dateTime': {
+            'bsonType': 'object',
+            'properties': {
+                'connect': {'bsonType': ['date', 'null']},
+                'disconnect': {'bsonType': ['date', 'null']},
+                'origination': {'bsonType': ['date', 'null']}
+            }
+        },
+        'destination': {
+            'bsonType': 'object',
+            'properties': {
+                'call_termination_on_behalf_of': {'bsonType': ['int', 'null']},
+                'conversation_id': {'bsonType': ['string', 'null']},
+                'dtmf_method': {'bsonType': ['string', 'null']},
+                'device_name': {'bsonType': ['string', 'null']},
+                'ip_addr': {'bsonType': ['string', 'null']},
+                'ipv4v6_addr': {'bsonType': ['string', 'null']},
+                'leg_identifier': {'bsonType': ['int', 'null']},
+                'cause': {
                     'bsonType': 'object',
                     'properties': {
-                        'number': {'bsonType': ['string', 'null']},
-                        'partition': {'bsonType': ['string', 'null']},
-                        'uri': {'bsonType': ['string', 'null']},
-                        'unicode_login_user_id': {'bsonType': ['string', 'null']}
+                        'location': {'bsonType': ['int', 'null']},
+                        'value': {'bsonType': ['int', 'null']}
                     }
                 },
-                'cdrRecordType': {'bsonType': ['int', 'null']},
-                'clientMatterCode': {'bsonType': ['string', 'null']},
-                'comment': {'bsonType': ['string', 'null']},
-                'currentRoutingReason': {'bsonType': ['int', 'null']},
-                'dateTime': {
+                'media_cap': {
                     'bsonType': 'object',
                     'properties': {
-                        'connect': {'bsonType': ['date', 'null']},
-                        'disconnect': {'bsonType': ['date', 'null']},
-                        'origination': {'bsonType': ['date', 'null']}
+                        'bandwidth': {'bsonType': ['int', 'null']},
+                        'bandwidth_channel2': {'bsonType': ['int', 'null']},
+                        'g723_bit_rate': {'bsonType': ['int', 'null']},
+                        'max_frames_per_packet': {'bsonType': ['int', 'null']},
+                        'payload_capacity': {'bsonType': ['int', 'null']}
                     }
                 },
-                'destination': {
+                'media_transport_address': {
                     'bsonType': 'object',
                     'properties': {
-                        'call_termination_on_behalf_of': {'bsonType': ['int', 'null']},
-                        'conversation_id': {'bsonType': ['string', 'null']},
-                        'dtmf_method': {'bsonType': ['string', 'null']},
-                        'device_name': {'bsonType': ['string', 'null']},
-                        'ip_addr': {'bsonType': ['string', 'null']},
-                        'ipv4v6_addr': {'bsonType': ['string', 'null']},
-                        'leg_identifier': {'bsonType': ['int', 'null']},
-                        'cause': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'location': {'bsonType': ['int', 'null']},
-                                'value': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'media_cap': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'bandwidth': {'bsonType': ['int', 'null']},
-                                'bandwidth_channel2': {'bsonType': ['int', 'null']},
-                                'g723_bit_rate': {'bsonType': ['int', 'null']},
-                                'max_frames_per_packet': {'bsonType': ['int', 'null']},
-                                'payload_capacity': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'media_transport_address': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'ip': {'bsonType': ['string', 'null']},
-                                'port': {'bsonType': ['int', 'null']},
-                                'ip_channel2': {'bsonType': ['string', 'null']},
-                                'port_channel2': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'mobile': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'call_duration': {'bsonType': ['int', 'null']},
-                                'device_name': {'bsonType': ['string', 'null']}
-                            }
-                        },
-                        'node_id': {'bsonType': ['int', 'null']},
-                        'precedence_level': {'bsonType': ['int', 'null']},
-                        'rsvp': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'audio_stat': {'bsonType': ['int', 'null']},
-                                'video_stat': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'span': {'bsonType': ['int', 'null']},
-                        'video_cap': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'bandwidth': {'bsonType': ['int', 'null']},
-                                'bandwidth_channel2': {'bsonType': ['int', 'null']},
-                                'codec': {'bsonType': ['int', 'null']},
-                                'codec_channel2': {'bsonType': ['int', 'null']},
-                                'resolution': {'bsonType': ['int', 'null']},
-                                'resolution_channel2': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'video_channel_role_channel2': {'bsonType': ['int', 'null']},
-                        'video_transport_address': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'ip': {'bsonType': ['string', 'null']},
-                                'ip_channel2': {'bsonType': ['string', 'null']},
-                                'port': {'bsonType': ['int', 'null']},
-                                'port_channel2': {'bsonType': ['int', 'null']}
-                            }
-                        }
+                        'ip': {'bsonType': ['string', 'null']},
+                        'port': {'bsonType': ['int', 'null']},
+                        'ip_channel2': {'bsonType': ['string', 'null']},
+                        'port_channel2': {'bsonType': ['int', 'null']}
                     }
                 },
-                'duration': {'bsonType': ['int', 'null']},
-                'finalCalledParty': {
+                'mobile': {
                     'bsonType': 'object',
                     'properties': {
-                        'number': {'bsonType': ['string', 'null']},
-                        'partition': {'bsonType': ['string', 'null']},
-                        'uri': {'bsonType': ['string', 'null']},
-                        'pattern': {'bsonType': ['string', 'null']},
-                        'unicode_login_user_id': {'bsonType': ['string', 'null']}
+                        'call_duration': {'bsonType': ['int', 'null']},
+                        'device_name': {'bsonType': ['string', 'null']}
                     }
                 },
-                'finalMobileCalledPartyNumber': {'bsonType': ['string', 'null']},
-                'globalCall': {
+                'node_id': {'bsonType': ['int', 'null']},
+                'precedence_level': {'bsonType': ['int', 'null']},
+                'rsvp': {
                     'bsonType': 'object',
                     'properties': {
-                        'call_id': {'bsonType': ['string', 'null']},
-                        'manager_id': {'bsonType': ['int', 'null']},
-                        'cluster_id': {'bsonType': ['string', 'null']}
+                        'audio_stat': {'bsonType': ['int', 'null']},
+                        'video_stat': {'bsonType': ['int', 'null']}
                     }
                 },
-                'huntPilot': {
+                'span': {'bsonType': ['int', 'null']},
+                'video_cap': {
                     'bsonType': 'object',
                     'properties': {
-                        'dn': {'bsonType': ['string', 'null']},
-                        'partition': {'bsonType': ['string', 'null']},
-                        'pattern': {'bsonType': ['string', 'null']}
+                        'bandwidth': {'bsonType': ['int', 'null']},
+                        'bandwidth_channel2': {'bsonType': ['int', 'null']},
+                        'codec': {'bsonType': ['int', 'null']},
+                        'codec_channel2': {'bsonType': ['int', 'null']},
+                        'resolution': {'bsonType': ['int', 'null']},
+                        'resolution_channel2': {'bsonType': ['int', 'null']}
                     }
                 },
-                'incoming': {
+                'video_channel_role_channel2': {'bsonType': ['int', 'null']},
+                'video_transport_address': {
                     'bsonType': 'object',
                     'properties': {
-                        'icid': {'bsonType': ['string', 'null']},
-                        'orig_ioi': {'bsonType': ['string', 'null']},
-                        'protocol_call_ref': {'bsonType': ['string', 'null']},
-                        'protocol_id': {'bsonType': ['int', 'null']},
-                        'term_ioi': {'bsonType': ['string', 'null']}
+                        'ip': {'bsonType': ['string', 'null']},
+                        'ip_channel2': {'bsonType': ['string', 'null']},
+                        'port': {'bsonType': ['int', 'null']},
+                        'port_channel2': {'bsonType': ['int', 'null']}
                     }
-                },
-                'joinBehalfOf': {'bsonType': ['int', 'null']},
-                'lastRedirect': {
+                }
+            }
+        },
+        'duration': {'bsonType': ['int', 'null']},
+        'finalCalledParty': {
+            'bsonType': 'object',
+            'properties': {
+                'number': {'bsonType': ['string', 'null']},
+                'partition': {'bsonType': ['string', 'null']},
+                'uri': {'bsonType': ['string', 'null']},
+                'pattern': {'bsonType': ['string', 'null']},
+                'unicode_login_user_id': {'bsonType': ['string', 'null']},
+                'user': {'bsonType': ['object', 'null']}
+            }
+        },
+        'finalMobileCalledPartyNumber': {'bsonType': ['string', 'null']},
+        'globalCall': {
+            'bsonType': 'object',
+            'properties': {
+                'call_id': {'bsonType': ['string', 'null']},
+                'manager_id': {'bsonType': ['int', 'null']},
+                'cluster_id': {'bsonType': ['string', 'null']}
+            }
+        },
+        'huntPilot': {
+            'bsonType': 'object',
+            'properties': {
+                'dn': {'bsonType': ['string', 'null']},
+                'partition': {'bsonType': ['string', 'null']},
+                'pattern': {'bsonType': ['string', 'null']}
+            }
+        },
+        'incoming': {
+            'bsonType': 'object',
+            'properties': {
+                'icid': {'bsonType': ['string', 'null']},
+                'orig_ioi': {'bsonType': ['string', 'null']},
+                'protocol_call_ref': {'bsonType': ['string', 'null']},
+                'protocol_id': {'bsonType': ['int', 'null']},
+                'term_ioi': {'bsonType': ['string', 'null']}
+            }
+        },
+        'joinBehalfOf': {'bsonType': ['int', 'null']},
+        'lastRedirect': {
+            'bsonType': 'object',
+            'properties': {
+                'dn': {'bsonType': ['string', 'null']},
+                'dn_partition': {'bsonType': ['string', 'null']},
+                'uri': {'bsonType': ['string', 'null']},
+                'redirect_on_behalf_of': {'bsonType': ['int', 'null']},
+                'reason': {'bsonType': ['int', 'null']}
+            }
+        },
+        'lastRedirecting': {
+            'bsonType': 'object',
+            'properties': {
+                'party_pattern': {'bsonType': ['string', 'null']},
+                'routing_reason': {'bsonType': ['int', 'null']}
+            }
+        },
+        'mobileCallingPartyNumber': {'bsonType': ['string', 'null']},
+        'mobileCallType': {'bsonType': ['int', 'null']},
+        'orig': {
+            'bsonType': 'object',
+            'properties': {
+                'call_termination_on_behalf_of': {'bsonType': ['int', 'null']},
+                'call_party': {
                     'bsonType': 'object',
                     'properties': {
-                        'dn': {'bsonType': ['string', 'null']},
-                        'dn_partition': {'bsonType': ['string', 'null']},
-                        'uri': {'bsonType': ['string', 'null']},
                         'redirect_on_behalf_of': {'bsonType': ['int', 'null']},
-                        'reason': {'bsonType': ['int', 'null']}
+                        'redirect_reason': {'bsonType': ['int', 'null']}
                     }
                 },
-                'lastRedirecting': {
+                'cause': {
                     'bsonType': 'object',
                     'properties': {
-                        'party_pattern': {'bsonType': ['string', 'null']},
-                        'routing_reason': {'bsonType': ['int', 'null']}
+                        'location': {'bsonType': ['int', 'null']},
+                        'value': {'bsonType': ['int', 'null']}
                     }
                 },
-                'mobileCallingPartyNumber': {'bsonType': ['string', 'null']},
-                'mobileCallType': {'bsonType': ['int', 'null']},
-                'orig': {
+                'conversation_id': {'bsonType': ['int', 'null']},
+                'dtmf_method': {'bsonType': ['int', 'null']},
+                'device_name': {'bsonType': ['string', 'null']},
+                'ip_addr': {'bsonType': ['string', 'null']},
+                'ipv4v6_addr': {'bsonType': ['string', 'null']},
+                'leg_call_identifier': {'bsonType': ['int', 'null']},
+                'orig_media_cap': {
                     'bsonType': 'object',
                     'properties': {
-                        'call_termination_on_behalf_of': {'bsonType': ['int', 'null']},
-                        'call_party': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'redirect_on_behalf_of': {'bsonType': ['int', 'null']},
-                                'redirect_reason': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'cause': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'location': {'bsonType': ['int', 'null']},
-                                'value': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'conversation_id': {'bsonType': ['int', 'null']},
-                        'dtmf_method': {'bsonType': ['int', 'null']},
-                        'device_name': {'bsonType': ['string', 'null']},
-                        'ip_addr': {'bsonType': ['string', 'null']},
-                        'ipv4v6_addr': {'bsonType': ['string', 'null']},
-                        'leg_call_identifier': {'bsonType': ['int', 'null']},
-                        'orig_media_cap': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'bandwidth': {'bsonType': ['int', 'null']},
-                                'bandwidth_channel2': {'bsonType': ['int', 'null']},
-                                'g723_bit_rate': {'bsonType': ['int', 'null']},
-                                'max_frames_per_packet': {'bsonType': ['int', 'null']},
-                                'payload_capability': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'node_id': {'bsonType': ['int', 'null']},
-                        'precedence_level': {'bsonType': ['int', 'null']},
-                        'rsvp': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'audio_stat': {'bsonType': ['int', 'null']},
-                                'video_stat': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'routing_reason': {'bsonType': ['int', 'null']},
-                        'span': {'bsonType': ['int', 'null']},
-                        'video_cap': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'bandwidth': {'bsonType': ['int', 'null']},
-                                'bandwidth_channel2': {'bsonType': ['int', 'null']},
-                                'codec': {'bsonType': ['int', 'null']},
-                                'codec_channel2': {'bsonType': ['int', 'null']},
-                                'resolution': {'bsonType': ['int', 'null']},
-                                'resolution_channel2': {'bsonType': ['int', 'null']}
-                            }
-                        },
-                        'video_channel_role_channel2': {'bsonType': ['int', 'null']},
-                        'video_transport_address': {
-                            'bsonType': 'object',
-                            'properties': {
-                                'ip': {'bsonType': ['string', 'null']},
-                                'ip_channel2': {'bsonType': ['string', 'null']},
-                                'port': {'bsonType': ['int', 'null']},
-                                'port_channel2': {'bsonType': ['int', 'null']}
-                            }
-                        }
+                        'bandwidth': {'bsonType': ['int', 'null']},
+                        'bandwidth_channel2': {'bsonType': ['int', 'null']},
+                        'g723_bit_rate': {'bsonType': ['int', 'null']},
+                        'max_frames_per_packet': {'bsonType': ['int', 'null']},
+                        'payload_capability': {'bsonType': ['int', 'null']}
                     }
                 },
-                'originalCalledParty': {
+                'node_id': {'bsonType': ['int', 'null']},
+                'precedence_level': {'bsonType': ['int', 'null']},
+                'rsvp': {
                     'bsonType': 'object',
                     'properties': {
-                        'number': {'bsonType': ['string', 'null']},
-                        'partition': {'bsonType': ['string', 'null']},
-                        'uri': {'bsonType': ['string', 'null']},
-                        'pattern': {'bsonType': ['string', 'null']}
+                        'audio_stat': {'bsonType': ['int', 'null']},
+                        'video_stat': {'bsonType': ['int', 'null']}
                     }
                 },
-                'outgoing': {
+                'routing_reason': {'bsonType': ['int', 'null']},
+                'span': {'bsonType': ['int', 'null']},
+                'video_cap': {
                     'bsonType': 'object',
                     'properties': {
-                        'icid': {'bsonType': ['string', 'null']},
-                        'orig_ioi': {'bsonType': ['string', 'null']},
-                        'protocol_call_ref': {'bsonType': ['string', 'null']},
-                        'protocol_id': {'bsonType': ['int', 'null']},
-                        'term_ioi': {'bsonType': ['string', 'null']}
+                        'bandwidth': {'bsonType': ['int', 'null']},
+                        'bandwidth_channel2': {'bsonType': ['int', 'null']},
+                        'codec': {'bsonType': ['int', 'null']},
+                        'codec_channel2': {'bsonType': ['int', 'null']},
+                        'resolution': {'bsonType': ['int', 'null']},
+                        'resolution_channel2': {'bsonType': ['int', 'null']}
                     }
                 },
-                'outpulsed': {
+                'video_channel_role_channel2': {'bsonType': ['int', 'null']},
+                'video_transport_address': {
                     'bsonType': 'object',
                     'properties': {
-                        'called_party_number': {'bsonType': ['string', 'null']},
-                        'calling_party_number': {'bsonType': ['string', 'null']},
-                        'last_redirecting_number': {'bsonType': ['string', 'null']},
-                        'original_called_party_number': {'bsonType': ['string', 'null']}
+                        'ip': {'bsonType': ['string', 'null']},
+                        'ip_channel2': {'bsonType': ['string', 'null']},
+                        'port': {'bsonType': ['int', 'null']},
+                        'port_channel2': {'bsonType': ['int', 'null']}
                     }
-                },
-                'wasCallQueued': {'bsonType': ['bool', 'null']},
-                'totalWaitTimeInQueue': {'bsonType': ['int', 'null']},
-                'callDirection': {'bsonType': ['int', 'null']},
+                }
+            }
+        },
+        'originalCalledParty': {
+            'bsonType': 'object',
+            'properties': {
+                'number': {'bsonType': ['string', 'null']},
+                'partition': {'bsonType': ['string', 'null']},
+                'uri': {'bsonType': ['string', 'null']},
+                'pattern': {'bsonType': ['string', 'null']},
+                'user': {'bsonType': ['object', 'null']}
+            }
+        },
+        'outgoing': {
+            'bsonType': 'object',
+            'properties': {
+                'icid': {'bsonType': ['string', 'null']},
+                'orig_ioi': {'bsonType': ['string', 'null']},
+                'protocol_call_ref': {'bsonType': ['string', 'null']},
+                'protocol_id': {'bsonType': ['int', 'null']},
+                'term_ioi': {'bsonType': ['string', 'null']}
+            }
+        },
+        'outpulsed': {
+            'bsonType': 'object',
+            'properties': {
+                'called_party_number': {'bsonType': ['string', 'null']},
+                'calling_party_number': {'bsonType': ['string', 'null']},
+                'last_redirecting_number': {'bsonType': ['string', 'null']},
+                'original_called_party_number': {'bsonType': ['string', 'null']}
             }
-        }
+        },
+        'wasCallQueued': {'bsonType': ['bool', 'null']},
+        'totalWaitTimeInQueue': {'bsonType': ['int', 'null']},
+        'callDirection': {'bsonType': ['int', 'null']},
+        'directoryVersion': {'bsonType': ['string', 'null']},
+        'parties': {'bsonType': ['array', 'null'], 'items': {'bsonType': 'string'}},
+        'partyDigits': {'bsonType': ['array', 'null'], 'items': {'bsonType': 'string'}},
+        'partyDigitsReversed': {'bsonType': ['array', 'null'], 'items': {'bsonType': 'string'}},
+        'blocks': {'bsonType': ['array', 'null'], 'items': {'bsonType': 'string'}},
+        'calendar': {
+            'bsonType': ['object', 'null'],
+            'properties': {
+                'day': {'bsonType': 'string'},
+                'hour': {'bsonType': 'int'},
+                'isoWeek': {'bsonType': 'string'},
+                'month': {'bsonType': 'string'},
+                'weekday': {'bsonType': 'int'},
+                'businessHours': {'bsonType': 'bool'}
+            }
+        },
+    }
+}
+
+
+def get_index_manager(collection) -> IndexManager:
+    """incoming_calls için index yöneticisi (config.yaml 'indexes' bloğu)"""
+    index_config = config.get('indexes') or {}
+    return IndexManager(
+        collection,
+        CDR_INDEXES,
+        unused_days=index_config.get('unused_days', 7),
+        report_interval=index_config.get('report_interval', 86400),
+    )
+
+
+async def create_collection_if_not_exists():
+    db = get_database()
+    collection_name = config['mongo']['collection']
+    
+    if collection_name not in db.list_collection_names():
+        db.create_collection(collection_name)
+        logger.info(f"Collection '{collection_name}' created.")
+
+    # Validator her seferinde güncellenir: sadece oluştururken uygulansaydı şemaya eklenen alanlar
+    # mevcut collection'lara hiç ulaşmazdı
+    try:
         db.command({
             'collMod': collection_name,
-            'validator': {'$jsonSchema': schema},
+            'validator': {'$jsonSchema': CDR_SCHEMA},
             'validationLevel': 'strict',
             'validationAction': 'error'
         })
-        logger.info(f"Collection '{collection_name}' created with schema validation.")
-    else:
-        logger.info(f"Collection '{collection_name}' already exists.")
+        logger.info(f"Collection '{collection_name}' schema validation is up to date.")
+    except OperationFailure as e:
+        # collMod yetkisi olmayan kullanıcı: yazma yine çalışır, validator eski kalır
+        logger.warning(f"Could not update schema validation of '{collection_name}': {e}")
+
+    # Sadece yazmalar için gerekli index'ler; diğerleri servis başlarken arka planda (IndexManager.start)
+    get_index_manager(db[collection_name]).ensure_required()
+
+def main():
+    """
+    Collection'ı ve tüm tanımlı index'leri oluştur (servis beklemeden, senkron).
+        python create_collection.py            # eksik index'leri oluştur
+        python create_collection.py --report   # ayrıca $indexStats ile tanımsız / kullanılmayan index raporu
+    """
+    parser = argparse.ArgumentParser(description="Create the CDR collection and its declared indexes")
+    parser.add_argument('--report', action='store_true', help="Tanımsız ve kullanılmayan index'leri listele")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(create_collection_if_not_exists())
+        manager = get_index_manager(get_database()[config['mongo']['collection']])
+        plan = manager.ensure_all()
+        print(f"Built: {[spec.name for spec in plan['missing']] or 'none'}")
+        if plan['conflicting']:
+            print(f"Differs from declaration (drop to rebuild): {plan['conflicting']}")
+        if args.report:
+            report = manager.report()
+            if report['usage'] is None:
+                print("Usage: $indexStats unavailable (indexStats privilege required)")
+            else:
+                for name, entry in sorted(report['usage'].items()):
+                    print(f"  {name}: {entry['ops']} uses since {entry['since']:%Y-%m-%d %H:%M}")
+            print(f"Undeclared: {report['unknown'] or 'none'}")
+            print(f"Unused for {manager.unused_days}+ days: {report['unused'] or 'none'}")
+    finally:
+        stop_mongo_logging()
+        close_mongo_client()
+
 
 if __name__ == '__main__':
-    asyncio.run(create_collection_if_not_exists())
\ No newline at end of file
+    main()
@@ -2,8 +2,8 @@
 import os
 import pandas as pd
 import numpy as np
-from pymongo import MongoClient
 from helpers.config import load_config
+from helpers.mongo import get_database
 
 config = load_config()
 
@@ -59,8 +59,7 @@ def excel_to_dataframe(excel_file_path):
     return df
 
 def get_mongo_collections():
-    client = MongoClient(config['mongo']['uri'])
-    db = client[config['mongo']['database']]
+    db = get_database()
     return db['users'], db['departments']
 
 def insert_departments(df, departments_collection):
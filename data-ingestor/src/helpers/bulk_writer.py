@@ -0,0 +1,272 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, List, Optional, Set
+from bson import encode
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
+from helpers.logger import main_logger as logger
+from helpers.write_controller import TRANSIENT_WRITE_ERRORS
+
+# MongoDB tek doküman limiti 16MB, insert_many mesajları zaten bölüyor;
+# bu sınır bellek ve tek flush süresini kontrol etmek için
+DEFAULT_MAX_DOCS = 1000
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+# Aynı anda thread pool'da çalışan insert_many sayısı
+DEFAULT_MAX_IN_FLIGHT = 4
+# MongoDB duplicate key hata kodu
+DUPLICATE_KEY_ERROR = 11000
+
+
+def write_batch(collection, batch: List[RawBSONDocument], bypass_document_validation: bool = False,
+                rollups=None) -> tuple:
+    """
+    Batch'i unordered insert_many ile yaz (thread pool'da çalışır; spool replay de kullanır).
+    bypass_document_validation: sunucu tarafı $jsonSchema kontrolü atlanır (backfill, istemcide doğrulanmış kayıtlar).
+    rollups (CallRollups) verilirse collection'da bulunan tüm dokümanlar (insert edilen ve duplicate'ler) bildirilir;
+    CallRollups daha önce sayılmış olanları atlar, yazılıp sayılamamış olanları (tekrar deneme, yeniden işleme) sayar.
+    BulkWriteError durumunda başarısız dokümanları raporla, geri kalanlar zaten yazılmıştır.
+    Duplicate key hataları daha önce yazılmış satırlardır, hata sayılmaz.
+    Bağlantı hataları gibi diğer hatalar çağırana iletilir (dosya tekrar denenecek).
+    Returns: (inserted, failed, duplicates)
+    """
+    try:
+        collection.insert_many(batch, ordered=False, bypass_document_validation=bypass_document_validation)
+        if rollups is not None:
+            rollups.update(batch)
+        return len(batch), 0, 0
+    except BulkWriteError as e:
+        details = e.details
+        write_errors = details.get('writeErrors', [])
+        inserted = details.get('nInserted', 0)
+
+        failed = [error for error in write_errors if error.get('code') != DUPLICATE_KEY_ERROR]
+        duplicates = len(write_errors) - len(failed)
+        for error in failed:
+            failed_doc = batch[error['index']]
+            logger.error(
+                f"Bulk insert failed for pk_id={failed_doc.get('pk_id')} "
+                f"(code {error.get('code')}): {error.get('errmsg')}"
+            )
+
+        if failed:
+            logger.warning(
+                f"Bulk insert partially failed: {inserted}/{len(batch)} inserted, "
+                f"{len(failed)} failed, {duplicates} already present"
+            )
+        elif duplicates:
+            logger.debug(f"Bulk insert skipped {duplicates}/{len(batch)} documents already present")
+
+        if rollups is not None and len(failed) < len(batch):
+            # Unordered insert: duplicate dışında hata vermeyen tüm dokümanlar collection'dadır
+            rejected = {error['index'] for error in failed}
+            rollups.update([document for index, document in enumerate(batch) if index not in rejected])
+        return inserted, len(failed), duplicates
+
+
+class BulkWriter:
+    """
+    Dokümanları biriktirip unordered insert_many ile toplu yazan writer.
+    Batch hem doküman sayısı hem de encode edilmiş byte boyutu ile sınırlıdır.
+
+    PyMongo senkron olduğu için yazmalar thread pool'a aktarılır; en fazla max_in_flight
+    batch aynı anda yazılırken event loop CSV okumaya ve shutdown kontrolüne devam eder.
+
+    Duplicate key hataları (unique pk_id index'i, yeniden işlenen satırlar) hata sayılmaz.
+    mark(position) ile işaretlenen noktadan önce eklenen tüm batch'ler yazıldığında
+    on_commit(position) çağrılır (batch'ler sırasız bitse de pozisyonlar sırayla commit edilir).
+
+    controller (AdaptiveWriteController) verilirse batch boyutu ve in-flight limiti ondan alınır,
+    her yazmanın süresi ona bildirilir ve geçici hatalarda (AutoReconnect, timeout) batch
+    controller'ın belirlediği süre beklenip en fazla max_retries kez tekrar denenir.
+
+    spool (BatchSpool) verilirse geçici hata sonrası yazılamayan batch'ler diskteki spool'a eklenir ve
+    yazılmış sayılır (commit ilerler). Spool'da replay bekleyen batch varken yeni batch'ler de MongoDB
+    denenmeden spool'a yazılır: kesinti boyunca her batch için tekrar deneme beklenmez.
+
+    rollups (CallRollups) verilirse her batch'te collection'da bulunan dokümanlar özet sayaçlarına bildirilir
+    (her kayıt bir kez sayılır).
+    """
+
+    def __init__(self, collection, max_docs: int = DEFAULT_MAX_DOCS, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, semaphore: asyncio.Semaphore = None,
+                 on_commit: Optional[Callable] = None, metrics=None, controller=None, spool=None,
+                 bypass_document_validation: bool = False, rollups=None):
+        self.collection = collection
+        self.bypass_document_validation = bypass_document_validation
+        self.rollups = rollups
+        self.controller = controller
+        self.spool = spool
+        self.metrics = metrics  # Opsiyonel StageMetrics: bekleyen/yazılan batch'ler
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_in_flight = max(1, max_in_flight)
+
+        # Birden fazla dosya paralel işlenirken toplam in-flight limiti için ortak semaphore verilebilir
+        self._semaphore = controller or semaphore or asyncio.Semaphore(self.max_in_flight)
+        self._pending: Set[asyncio.Task] = set()
+        self._error = None
+
+        self._batch: List[RawBSONDocument] = []
+        self._batch_bytes = 0
+
+        # Commit takibi: batch sıra numaraları ve bekleyen (gereken batch, pozisyon) işaretleri
+        self.on_commit = on_commit
+        self._dispatched = 0
+        self._completed: Set[int] = set()
+        self._watermark = -1  # Bu sıra numarasına kadar tüm batch'ler yazıldı
+        self._marks = deque()
+        self.committed = None
+
+        # İstatistikler
+        self.inserted = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.retries = 0
+        self.spooled = 0
+
+    async def add(self, document):
+        """Dokümanı batch'e ekle, sınır aşılırsa flush et"""
+        if not isinstance(document, RawBSONDocument):
+            # Bir kez encode et: hem boyut hesabı hem de insert için aynı byte'lar kullanılır
+            document = RawBSONDocument(encode(document))
+
+        size = len(document.raw)
+        if self._batch and self._batch_bytes + size > self.max_bytes:
+            await self._dispatch()
+
+        self._batch.append(document)
+        self._batch_bytes += size
+
+        max_docs = self.controller.batch_size if self.controller is not None else self.max_docs
+        if len(self._batch) >= max_docs:
+            await self._dispatch()
+
+    async def mark(self, position):
+        """Şu ana kadar eklenen dokümanlar yazıldığında position commit edilmiş sayılır"""
+        required = self._dispatched if self._batch else self._dispatched - 1
+        self._marks.append((required, position))
+        await self._commit_marks()
+
+    async def flush(self):
+        """Biriken batch'i yaz ve devam eden tüm yazmaların bitmesini bekle"""
+        await self._dispatch()
+        await self.wait_pending()
+        self._raise_if_failed()
+
+    async def wait_pending(self):
+        """Devam eden yazmaların bitmesini bekle (hata durumunda dosya unlock edilmeden önce)"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _dispatch(self):
+        """Mevcut batch'i arka planda yazmaya gönder (in-flight limiti dolarsa bekler)"""
+        self._raise_if_failed()
+        if not self._batch:
+            return
+
+        batch = self._batch
+        self._batch = []
+        self._batch_bytes = 0
+        sequence = self._dispatched
+        self._dispatched += 1
+
+        if self.metrics is not None:
+            self.metrics.enqueue()
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            if self.metrics is not None:
+                self.metrics.dequeue()
+            raise
+        task = asyncio.create_task(self._run_batch(batch, sequence))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+        # Tamamlanan yazmaların callback'leri ve diğer görevler çalışabilsin
+        await asyncio.sleep(0)
+
+    async def _run_batch(self, batch: List[RawBSONDocument], sequence: int):
+        try:
+            inserted, failed, duplicates = await self._write_with_retry(batch)
+            self.inserted += inserted
+            self.failed += failed
+            self.duplicates += duplicates
+            self.batches += 1
+            if self.metrics is not None:
+                self.metrics.record(1, len(batch))
+
+            self._completed.add(sequence)
+            while self._watermark + 1 in self._completed:
+                self._watermark += 1
+                self._completed.discard(self._watermark)
+            await self._commit_marks()
+        except Exception as e:
+            # İlk yazma hatası sonraki add/flush çağrısında çağırana iletilir (commit ilerlemez)
+            if self._error is None:
+                self._error = e
+        finally:
+            self._semaphore.release()
+            if self.metrics is not None:
+                self.metrics.dequeue()
+
+    async def _write_with_retry(self, batch: List[RawBSONDocument]) -> tuple:
+        if self.spool is not None and self.spool.pending:
+            return await self._spool_batch(batch)
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await asyncio.to_thread(
+                    write_batch, self.collection, batch, self.bypass_document_validation, self.rollups
+                )
+            except TRANSIENT_WRITE_ERRORS as e:
+                if self.controller is None or attempt >= self.controller.max_retries:
+                    if self.spool is None:
+                        raise
+                    logger.warning(f"MongoDB unavailable ({type(e).__name__}), spooling batches to disk: {e}")
+                    return await self._spool_batch(batch)
+                attempt += 1
+                self.retries += 1
+                # Batch'in yazılmış kısmı tekrar denemede duplicate olarak elenir
+                await asyncio.sleep(self.controller.backoff(e))
+                continue
+            if self.controller is not None:
+                self.controller.observe(time.monotonic() - started)
+            return result
+
+    async def _spool_batch(self, batch: List[RawBSONDocument]) -> tuple:
+        """Batch'i spool'a yaz (SpoolFullError çağırana iletilir, dosya tekrar denenecek)"""
+        await asyncio.to_thread(self.spool.append, batch)
+        self.spooled += len(batch)
+        return 0, 0, 0
+
+    async def _commit_marks(self):
+        position = None
+        while self._marks and self._marks[0][0] <= self._watermark:
+            position = self._marks.popleft()[1]
+        if position is None:
+            return
+        self.committed = position
+        if self.on_commit is not None:
+            try:
+                await asyncio.to_thread(self.on_commit, position)
+            except Exception as e:
+                # Checkpoint kaydedilemezse yazma devam eder; en kötü ihtimalle daha geriden devam edilir
+                logger.warning(f"Commit callback failed at {position}: {e}")
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    def get_stats(self) -> dict:
+        return {
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+            'batches': self.batches,
+            'retries': self.retries,
+            'spooled': self.spooled,
+        }
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from typing import Tuple
+from helpers.logger import main_logger as logger
+
+
+class CheckpointStore:
+    """
+    Dosya başına son commit edilen noktayı tutar: {_id: dosya adı, size, offset, row}.
+    offset bir kayıt başıdır; row o noktaya kadar işlenen satır sayısıdır.
+    Yarım kalan bir dosya tekrar işlenirken bu noktadan devam edilir.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def load(self, filename: str, size: int) -> Tuple[int, int]:
+        """Returns: (offset, row). Checkpoint yoksa ya da dosya değişmişse (0, 0)"""
+        checkpoint = self.collection.find_one({'_id': filename})
+        if checkpoint is None:
+            return 0, 0
+        if checkpoint.get('size') != size:
+            logger.warning(
+                f"Checkpoint for {filename} ignored: file size changed "
+                f"({checkpoint.get('size')} -> {size}), starting over"
+            )
+            self.clear(filename)
+            return 0, 0
+        return checkpoint['offset'], checkpoint['row']
+
+    def save(self, filename: str, size: int, offset: int, row: int):
+        # Batch'ler paralel commit edilebilir; $max ile checkpoint hiç geri gitmez
+        self.collection.update_one(
+            {'_id': filename},
+            {
+                '$max': {'offset': offset, 'row': row},
+                '$set': {'size': size, 'updated_at': datetime.now(timezone.utc)},
+            },
+            upsert=True
+        )
+
+    def clear(self, filename: str):
+        self.collection.delete_one({'_id': filename})
@@ -1,11 +1,14 @@
 from helpers.logger import main_logger as logger
 import socket
 import struct
+from functools import lru_cache
+from typing import List, Sequence
 from datetime import datetime, timezone
 from models.cdrModel import CdrModel
 from models.cdrModel import CallDirection
-from models.cdrSubModels import Authorization, CallingParty, DateTime, Destination, DestinationCause, DestinationMediaCap, DestinationMediaTransportAddress, DestinationRsvp, DestinationVideoCap, DestinationVideoTransportAddress, DeviceMobile, FinalCalledParty, GlobalCall, HuntPilot, Incoming, LastRedirect, LastRedirecting, Orig, OrigCalledParty, OrigCause, OrigMediaCap, OrigRsvp, OrigVideoCap, OrigVideoTransportAddress, OriginalCalledParty, Outgoing, OutPulsed
 from users import get_mongo_users_collection
+from helpers.user_directory import number_digits
+from helpers.time_buckets import get_calendar
 
 def to_int(value):
     if value is None:
@@ -16,15 +19,19 @@ def to_int(value):
         logger.warning(f"Error converting {value} to integer: {e}")
         return None
 
-def convert_unix_time_toiso8601(unix_time):
+# Bir dosyadaki CDR'lar dar bir zaman aralığını paylaşır; aynı saniye tekrar tekrar dönüştürülmez
+@lru_cache(maxsize=16384)
+def convert_unix_time_to_datetime(unix_time):
+    """Epoch saniyesini doğrudan tz-aware UTC datetime'a çevir (ISO string ara adımı olmadan)"""
     if unix_time is None or unix_time == 0:
         return None
     try:
         # UTC timezone ile dönüştür - MongoDB UTC olarak saklar
-        return datetime.fromtimestamp(unix_time, tz=timezone.utc).isoformat()
+        return datetime.fromtimestamp(unix_time, tz=timezone.utc)
     except (ValueError, OSError):
-        logger.warning(f"Error converting {unix_time} to ISO8601")
+        logger.warning(f"Error converting {unix_time} to datetime")
         return None
+
 def negative_int_to_ip(neg_ip):
     # 1. Negatif Değeri
     pos_ip = (1 << 32) + neg_ip
@@ -62,201 +69,263 @@ def convert_boolean(value):
         return None
 
 def determine_call_direction(calling_party_number: str, original_called_party_number: str, users_collection) -> CallDirection:
-    if calling_party_number in users_collection and original_called_party_number in users_collection:
-        return CallDirection.INTERNAL
-    elif calling_party_number not in users_collection:
+    # users_collection: UserDirectory (O(1) lookup); her numara bir kez kontrol edilir
+    if calling_party_number not in users_collection:
         return CallDirection.INCOMING
-    elif calling_party_number in users_collection and original_called_party_number not in users_collection:
-        return CallDirection.OUTGOING
-    return None
+    if original_called_party_number in users_collection:
+        return CallDirection.INTERNAL
+    return CallDirection.OUTGOING
+
+# Kullanıcı bilgisi (isim, departman) ve arama alanları türetilen taraflar
+PARTIES = ('callingParty', 'finalCalledParty', 'originalCalledParty')
+
+def attach_user_profiles(document: dict, users_collection):
+    # users_collection: UserDirectory; taraf numarasının kullanıcı bilgisi party.user alanına yazılır
+    profile_of = getattr(users_collection, 'profile_of', None)
+    if profile_of is None:
+        return
+    for party in PARTIES:
+        value = document.get(party)
+        if value is not None:
+            value['user'] = profile_of(value.get('number'))
+
+def attach_search_fields(document: dict, users_collection):
+    # Taraf numaralarından index'li arama alanları: ham numaralar, normalize rakamlar, ters çevrilmiş
+    # rakamlar (sonek araması) ve izlenen blok etiketleri. Değer yoksa alan None.
+    numbers = []
+    for party in PARTIES:
+        value = document.get(party)
+        if value is not None and value.get('number'):
+            numbers.append(value['number'])
+    numbers = list(dict.fromkeys(numbers))
+    digits = list(dict.fromkeys(filter(None, map(number_digits, numbers))))
+
+    blocks_of = getattr(users_collection, 'blocks_of', None)
+    blocks = list(dict.fromkeys(tag for value in digits for tag in blocks_of(value))) if blocks_of else []
+
+    document['parties'] = numbers or None
+    document['partyDigits'] = digits or None
+    document['partyDigitsReversed'] = [value[::-1] for value in digits] or None
+    document['blocks'] = blocks or None
+
+def attach_calendar_buckets(document: dict):
+    # Başlangıç zamanının yerel takvim alanları (gün, saat, hafta, ay, haftanın günü, mesai) -> calendar
+    date_time = document.get('dateTime')
+    document['calendar'] = get_calendar().buckets(date_time.get('origination') if date_time is not None else None)
+
+def to_ip(value):
+    return int_to_ip(to_int(value))
+
+def to_datetime(value):
+    return convert_unix_time_to_datetime(to_int(value))
+
+def to_bool(value):
+    return convert_boolean(to_int(value))
+
+# CSV kolonu -> CdrModel alan yolu -> dönüştürücü (None: string olduğu gibi alınır)
+# Yeni bir CUCM alanı eklemek için sadece bu tabloya satır eklemek yeterli.
+FIELD_MAP = [
+    ('authCodeDescription',                     'authCodeDescription',                               None),
+    ('authorizationCodeValue',                  'authorization.code_value',                          None),
+    ('authorizationLevel',                      'authorization.level',                               to_int),
+    ('callSecuredStatus',                       'callSecuredStatus',                                 to_int),
+    ('calledPartyPatternUsage',                 'calledPartyPatternUsage',                           to_int),
+    ('callingPartyNumber',                      'callingParty.number',                               None),
+    ('callingPartyNumberPartition',             'callingParty.partition',                            None),
+    ('callingPartyUnicodeLoginUserID',          'callingParty.unicode_login_user_id',                None),
+    ('callingPartyNumber_uri',                  'callingParty.uri',                                  None),
+    ('cdrRecordType',                           'cdrRecordType',                                     to_int),
+    ('clientMatterCode',                        'clientMatterCode',                                  None),
+    ('comment',                                 'comment',                                           None),
+    ('currentRoutingReason',                    'currentRoutingReason',                              to_int),
+    ('dateTimeConnect',                         'dateTime.connect',                                  to_datetime),
+    ('dateTimeDisconnect',                      'dateTime.disconnect',                               to_datetime),
+    ('dateTimeOrigination',                     'dateTime.origination',                              to_datetime),
+    ('destCallTerminationOnBehalfOf',           'destination.call_termination_on_behalf_of',         to_int),
+    ('destConversationId',                      'destination.conversation_id',                       None),
+    ('destDeviceName',                          'destination.device_name',                           None),
+    ('destDTMFMethod',                          'destination.dtmf_method',                           None),
+    ('destIpAddr',                              'destination.ip_addr',                               to_ip),
+    ('destIpv4v6Addr',                          'destination.ipv4v6_addr',                           None),
+    ('destLegIdentifier',                       'destination.leg_identifier',                        to_int),
+    ('destCause_location',                      'destination.cause.location',                        to_int),
+    ('destCause_value',                         'destination.cause.value',                           to_int),
+    ('destMediaCap_Bandwidth',                  'destination.media_cap.bandwidth',                   to_int),
+    ('destMediaCap_Bandwidth_Channel2',         'destination.media_cap.bandwidth_channel2',          to_int),
+    ('destMediaCap_g723BitRate',                'destination.media_cap.g723_bit_rate',               to_int),
+    ('destMediaCap_maxFramesPerPacket',         'destination.media_cap.max_frames_per_packet',       to_int),
+    ('destMediaCap_payloadCapability',          'destination.media_cap.payload_capability',          to_int),
+    ('destMediaTransportAddress_IP',            'destination.media_transport_address.ip',            to_ip),
+    ('destMediaTransportAddress_Port',          'destination.media_transport_address.port',          to_int),
+    ('destMediaTransportAddress_IP_Channel2',   'destination.media_transport_address.ip_channel2',   to_ip),
+    ('destMediaTransportAddress_Port_Channel2', 'destination.media_transport_address.port_channel2', to_int),
+    ('destMobileCallDuration',                  'destination.mobile.call_duration',                  to_int),
+    ('destMobileDeviceName',                    'destination.mobile.device_name',                    None),
+    ('destNodeId',                              'destination.node_id',                               to_int),
+    ('destPrecedenceLevel',                     'destination.precedence_level',                      to_int),
+    ('destRSVPAudioStat',                       'destination.rsvp.audio_stat',                       to_int),
+    ('destRSVPVideoStat',                       'destination.rsvp.video_stat',                       to_int),
+    ('destSpan',                                'destination.span',                                  to_int),
+    ('destVideoCap_Bandwidth',                  'destination.video_cap.bandwidth',                   to_int),
+    ('destVideoCap_Codec',                      'destination.video_cap.codec',                       to_int),
+    ('destVideoCap_Resolution',                 'destination.video_cap.resolution',                  to_int),
+    ('destVideoCap_Bandwidth_Channel2',         'destination.video_cap.bandwidth_channel2',          to_int),
+    ('destVideoCap_Codec_Channel2',             'destination.video_cap.codec_channel2',              to_int),
+    ('destVideoCap_Resolution_Channel2',        'destination.video_cap.resolution_channel2',         to_int),
+    ('destVideoChannel_Role_Channel2',          'destination.video_channel_role_channel2',           to_int),
+    ('destVideoTransportAddress_IP',            'destination.video_transport_address.ip',            to_ip),
+    ('destVideoTransportAddress_Port',          'destination.video_transport_address.port',          to_int),
+    ('destVideoTransportAddress_IP_Channel2',   'destination.video_transport_address.ip_channel2',   to_ip),
+    ('destVideoTransportAddress_Port_Channel2', 'destination.video_transport_address.port_channel2', to_int),
+    ('duration',                                'duration',                                          to_int),
+    ('finalCalledPartyNumber',                  'finalCalledParty.number',                           None),
+    ('finalCalledPartyNumberPartition',         'finalCalledParty.partition',                        None),
+    ('finalCalledPartyUnicodeLoginUserID',      'finalCalledParty.unicode_login_user_id',            None),
+    ('finalCalledPartyNumber_uri',              'finalCalledParty.uri',                              None),
+    ('finalCalledPartyPattern',                 'finalCalledParty.pattern',                          None),
+    ('finalMobileCalledPartyNumber',            'finalMobileCalledPartyNumber',                      None),
+    ('globalCallId_ClusterID',                  'globalCall.cluster_id',                             None),
+    ('globalCallID_callId',                     'globalCall.call_id',                                None),
+    ('globalCallID_callManagerId',              'globalCall.manager_id',                             to_int),
+    ('huntPilotDN',                             'huntPilot.dn',                                      None),
+    ('huntPilotPartition',                      'huntPilot.partition',                               None),
+    ('huntPilotPattern',                        'huntPilot.pattern',                                 None),
+    ('IncomingICID',                            'incoming.icid',                                     None),
+    ('IncomingOrigIOI',                         'incoming.orig_ioi',                                 None),
+    ('IncomingProtocolCallRef',                 'incoming.protocol_call_ref',                        None),
+    ('IncomingProtocolID',                      'incoming.protocol_id',                              to_int),
+    ('IncomingTermIOI',                         'incoming.term_ioi',                                 None),
+    ('joinOnBehalfOf',                          'joinBehalfOf',                                      to_int),
+    ('lastRedirectDn',                          'lastRedirect.dn',                                   None),
+    ('lastRedirectDnPartition',                 'lastRedirect.partition',                            None),
+    ('lastRedirectRedirectReason',              'lastRedirect.reason',                               to_int),
+    ('lastRedirectingPartyPattern',             'lastRedirecting.party_pattern',                     None),
+    ('lastRedirectingRoutingReason',            'lastRedirecting.routing_reason',                    to_int),
+    ('mobileCallingPartyNumber',                'mobileCallingPartyNumber',                          None),
+    ('mobileCallType',                          'mobileCallType',                                    to_int),
+    ('origCallTerminationOnBehalfOf',           'orig.call_termination_on_behalf_of',                to_int),
+    ('origCalledPartyRedirectOnBehalfOf',       'orig.call_party.redirect_on_behalf_of',             to_int),
+    ('origCalledPartyRedirectReason',           'orig.call_party.redirect_reason',                   to_int),
+    ('origCause_location',                      'orig.cause.location',                               to_int),
+    ('origCause_value',                         'orig.cause.value',                                  to_int),
+    ('origConversationId',                      'orig.conversation_id',                              to_int),
+    ('origDeviceName',                          'orig.device_name',                                  None),
+    ('origDTMFMethod',                          'orig.dtmf_method',                                  to_int),
+    ('origIpv4v6Addr',                          'orig.ipv4v6_addr',                                  None),
+    ('origIpAddr',                              'orig.ip_addr',                                      to_ip),
+    ('origLegCallIdentifier',                   'orig.leg_call_identifier',                          to_int),
+    ('origNodeId',                              'orig.node_id',                                      to_int),
+    ('origMediaCap_Bandwidth',                  'orig.orig_media_cap.bandwidth',                     to_int),
+    ('origMediaCap_g723BitRate',                'orig.orig_media_cap.g723_bit_rate',                 to_int),
+    ('origMediaCap_maxFramesPerPacket',         'orig.orig_media_cap.max_frames_per_packet',         to_int),
+    ('origMediaCap_payloadCapability',          'orig.orig_media_cap.payload_capability',            to_int),
+    ('origPrecedenceLevel',                     'orig.precedence_level',                             to_int),
+    ('origRoutingReason',                       'orig.routing_reason',                               to_int),
+    ('origVideoChannel_Role_Channel2',          'orig.video_channel_role_channel2',                  to_int),
+    ('origRSVPAudioStat',                       'orig.rsvp.audio_stat',                              to_int),
+    ('origRSVPVideoStat',                       'orig.rsvp.video_stat',                              to_int),
+    ('origSpan',                                'orig.span',                                         None),
+    ('origVideoCap_Bandwidth',                  'orig.video_cap.bandwidth',                          to_int),
+    ('origVideoCap_Codec',                      'orig.video_cap.codec',                              to_int),
+    ('origVideoCap_Resolution',                 'orig.video_cap.resolution',                         to_int),
+    ('origVideoCap_Bandwidth_Channel2',         'orig.video_cap.bandwidth_channel2',                 to_int),
+    ('origVideoCap_Codec_Channel2',             'orig.video_cap.codec_channel2',                     to_int),
+    ('origVideoCap_Resolution_Channel2',        'orig.video_cap.resolution_channel2',                to_int),
+    ('origVideoTransportAddress_IP',            'orig.video_transport_address.ip',                   to_ip),
+    ('origVideoTransportAddress_Port',          'orig.video_transport_address.port',                 to_int),
+    ('origVideoTransportAddress_IP_Channel2',   'orig.video_transport_address.ip_channel2',          to_ip),
+    ('origVideoTransportAddress_Port_Channel2', 'orig.video_transport_address.port_channel2',        to_int),
+    ('originalCalledPartyNumber',               'originalCalledParty.number',                        None),
+    ('originalCalledPartyNumberPartition',      'originalCalledParty.partition',                     None),
+    ('originalCalledPartyNumber_uri',           'originalCalledParty.uri',                           None),
+    ('originalCalledPartyPattern',              'originalCalledParty.pattern',                       None),
+    ('OutgoingICID',                            'outgoing.icid',                                     None),
+    ('OutgoingOrigIOI',                         'outgoing.orig_ioi',                                 None),
+    ('OutgoingProtocolCallRef',                 'outgoing.protocol_call_ref',                        None),
+    ('OutgoingProtocolID',                      'outgoing.protocol_id',                              to_int),
+    ('OutgoingTermIOI',                         'outgoing.term_ioi',                                 None),
+    ('outpulsedCallingPartyNumber',             'outpulsed.calling_party_number',                    None),
+    ('outpulsedCalledPartyNumber',              'outpulsed.called_party_number',                     None),
+    ('outpulsedLastRedirectingNumber',          'outpulsed.last_redirecting_number',                 None),
+    ('outpulsedOriginalCalledPartyNumber',      'outpulsed.original_called_party_number',            None),
+    ('totalWaitTimeInQueue',                    'totalWaitTimeInQueue',                              to_int),
+    ('wasCallQueued',                           'wasCallQueued',                                     to_bool),
+    ('pkid',                                    'pk_id',                                             None),
+]
 
-def parse_csv_to_model(csv_data: dict, users_collection) -> CdrModel:
 
+class RowPlan:
+    """
+    Bir CSV header'ı için derlenmiş dönüşüm planı.
+    Header bir kez okunur, her alan için kolon index'i çözülür; satırlar
+    csv.reader listesi olarak satır başına dict oluşturmadan decode edilir.
+    """
+
+    def __init__(self, header: Sequence[str]):
+        self.header = tuple(header)
+        positions = {name: index for index, name in enumerate(self.header)}
+
+        # İç içe dict'ler: (parent container, key) sırasıyla, parent her zaman önce gelir
+        self._containers = []
+        container_ids = {(): 0}
+        self._steps = []
+        self.indexes = []  # FIELD_MAP sırasıyla kolon index'leri (kolon yoksa None)
+        self.missing_columns = []
+
+        for column, path, converter in FIELD_MAP:
+            keys = tuple(path.split('.'))
+            for depth in range(1, len(keys)):
+                prefix = keys[:depth]
+                if prefix not in container_ids:
+                    container_ids[prefix] = len(self._containers) + 1
+                    self._containers.append((container_ids[prefix[:-1]], prefix[-1]))
+
+            index = positions.get(column)
+            self.indexes.append(index)
+            if index is None:
+                self.missing_columns.append(column)
+            self._steps.append((index, container_ids[keys[:-1]], keys[-1], converter))
+
+    def decode(self, row: List[str]) -> dict:
+        """Satırı CdrModel şeklinde iç içe dict'e çevir (eksik kolonlar None)"""
+        length = len(row)
+        containers = [{}]
+        for parent, key in self._containers:
+            container = {}
+            containers[parent][key] = container
+            containers.append(container)
+
+        for index, container, key, converter in self._steps:
+            value = row[index] if index is not None and index < length else None
+            if converter is not None:
+                value = converter(value)
+            containers[container][key] = value
+
+        return containers[0]
+
+
+@lru_cache(maxsize=32)
+def compile_row_plan(header: tuple) -> RowPlan:
+    """Header imzasına göre cache'lenmiş plan (CUCM sürümü kolon ekler/sıralarsa yeni plan derlenir)"""
+    plan = RowPlan(header)
+    if plan.missing_columns:
+        logger.info(f"Compiled CDR row plan for new header ({len(header)} columns, "
+                    f"{len(plan.missing_columns)} mapped columns missing: {plan.missing_columns})")
+    return plan
+
+
+def parse_csv_row(row: List[str], plan: RowPlan, users_collection) -> CdrModel:
+    """csv.reader satırını derlenmiş plan ile CdrModel'e çevir"""
+    document = plan.decode(row)
     call_direction = determine_call_direction(
-        csv_data.get('callingPartyNumber'),
-        csv_data.get('originalCalledPartyNumber'),
+        document['callingParty']['number'],
+        document['originalCalledParty']['number'],
         users_collection
     )
-    return CdrModel(
-        authCodeDescription = csv_data.get('authCodeDescription'),
-        authorization = Authorization(
-            code_value=csv_data.get('authorizationCodeValue'),
-            level=to_int(csv_data.get('authorizationLevel')),
-        ),
-        callSecuredStatus = to_int(csv_data.get('callSecuredStatus')),
-        calledPartyPatternUsage=to_int(csv_data.get('calledPartyPatternUsage')),
-        callingParty=CallingParty(
-            number=csv_data.get('callingPartyNumber'),
-            partition=csv_data.get('callingPartyNumberPartition'),    
-            unicode_login_user_id=csv_data.get('callingPartyUnicodeLoginUserID'),
-            uri=csv_data.get('callingPartyNumber_uri'),
-        ),
-        cdrRecordType=to_int(csv_data.get('cdrRecordType')),
-        clientMatterCode=csv_data.get('clientMatterCode'),
-        comment=csv_data.get('comment'),
-        currentRoutingReason=to_int(csv_data.get('currentRoutingReason')),
-        dateTime=DateTime(
-            connect=convert_unix_time_toiso8601(to_int(csv_data.get('dateTimeConnect'))),
-            disconnect=convert_unix_time_toiso8601(to_int(csv_data.get('dateTimeDisconnect'))),
-            origination=convert_unix_time_toiso8601(to_int(csv_data.get('dateTimeOrigination'))),
-        ),
-        destination=Destination(
-            call_termination_on_behalf_of = to_int(csv_data.get('destCallTerminationOnBehalfOf')),
-            conversation_id = csv_data.get('destConversationId'),
-            device_name = csv_data.get('destDeviceName'),
-            dtmf_method = csv_data.get('destDTMFMethod'),
-            ip_addr = int_to_ip(to_int(csv_data.get('destIpAddr'))),
-            ipv4v6_addr=csv_data.get('destIpv4v6Addr'),
-            leg_identifier = to_int(csv_data.get('destLegIdentifier')),
-            cause = DestinationCause(
-                location = to_int(csv_data.get('destCause_location')),
-                value = to_int(csv_data.get('destCause_value')),
-            ),
-            media_cap=DestinationMediaCap(
-                bandwidth=to_int(csv_data.get('destMediaCap_Bandwidth')),
-                bandwidth_channel2=to_int(csv_data.get('destMediaCap_Bandwidth_Channel2')),
-                g723_bit_rate=to_int(csv_data.get('destMediaCap_g723BitRate')),
-                max_frames_per_packet=to_int(csv_data.get('destMediaCap_maxFramesPerPacket')),
-                payload_capability=to_int(csv_data.get('destMediaCap_payloadCapability')),
-            ),
-            media_transport_address=DestinationMediaTransportAddress(
-                ip=int_to_ip(to_int(csv_data.get('destMediaTransportAddress_IP'))),
-                port=to_int(csv_data.get('destMediaTransportAddress_Port')),
-                ip_channel2=int_to_ip(to_int(csv_data.get('destMediaTransportAddress_IP_Channel2'))),
-                port_channel2=to_int(csv_data.get('destMediaTransportAddress_Port_Channel2')),
-            ),
-            mobile=DeviceMobile(
-                call_duration=to_int(csv_data.get('destMobileCallDuration')),
-                device_name=csv_data.get('destMobileDeviceName'),
-            ),
-            node_id=to_int(csv_data.get('destNodeId')),
-            precedence_level=to_int(csv_data.get('destPrecedenceLevel')),
-            rsvp=DestinationRsvp(
-                audio_stat=to_int(csv_data.get('destRSVPAudioStat')),
-                video_stat=to_int(csv_data.get('destRSVPVideoStat')),
-            ),
-            span=to_int(csv_data.get('destSpan')),
-            video_cap=DestinationVideoCap(
-                bandwidth=to_int(csv_data.get('destVideoCap_Bandwidth')),
-                codec=to_int(csv_data.get('destVideoCap_Codec')),
-                resolution=to_int(csv_data.get('destVideoCap_Resolution')),
-                bandwidth_channel2=to_int(csv_data.get('destVideoCap_Bandwidth_Channel2')),
-                codec_channel2=to_int(csv_data.get('destVideoCap_Codec_Channel2')),
-                resolution_channel2=to_int(csv_data.get('destVideoCap_Resolution_Channel2')),
-            ),
-            video_channel_role_channel2=to_int(csv_data.get('destVideoChannel_Role_Channel2')),
-            video_transport_address=DestinationVideoTransportAddress(
-                ip=int_to_ip(to_int(csv_data.get('destVideoTransportAddress_IP'))),
-                port=to_int(csv_data.get('destVideoTransportAddress_Port')),
-                ip_channel2=int_to_ip(to_int(csv_data.get('destVideoTransportAddress_IP_Channel2'))),
-                port_channel2=to_int(csv_data.get('destVideoTransportAddress_Port_Channel2')),
-            ),
-        ),
-        duration=to_int(csv_data.get('duration')),
-        finalCalledParty=FinalCalledParty(
-            number=csv_data.get('finalCalledPartyNumber'),
-            partition=csv_data.get('finalCalledPartyNumberPartition'),
-            unicode_login_user_id=csv_data.get('finalCalledPartyUnicodeLoginUserID'),
-            uri=csv_data.get('finalCalledPartyNumber_uri'),
-            pattern=csv_data.get('finalCalledPartyPattern'),
-        ),
-        finalMobileCalledPartyNumber=csv_data.get('finalMobileCalledPartyNumber'),
-        globalCall=GlobalCall(
-            cluster_id=csv_data.get('globalCallId_ClusterID'),
-            call_id=csv_data.get('globalCallID_callId'),
-            manager_id=to_int(csv_data.get('globalCallID_callManagerId')),
-        ),
-        huntPilot=HuntPilot(
-            dn=csv_data.get('huntPilotDN'),
-            partition=csv_data.get('huntPilotPartition'),
-            pattern=csv_data.get('huntPilotPattern'),    
-        ),
-        incoming=Incoming(
-            icid=csv_data.get('IncomingICID'),
-            orig_ioi=csv_data.get('IncomingOrigIOI'),
-            protocol_call_ref=csv_data.get('IncomingProtocolCallRef'),
-            protocol_id=to_int(csv_data.get('IncomingProtocolID')),
-            term_ioi=csv_data.get('IncomingTermIOI'),
-        ),
-        joinBehalfOf=to_int(csv_data.get('joinOnBehalfOf')),
-        lastRedirect=LastRedirect(
-            dn=csv_data.get('lastRedirectDn'),
-            partition=csv_data.get('lastRedirectDnPartition'),
-            reason=to_int(csv_data.get('lastRedirectRedirectReason')),
-        ),
-        lastRedirecting=LastRedirecting(
-            party_pattern=csv_data.get('lastRedirectingPartyPattern'),
-            routing_reason=to_int(csv_data.get('lastRedirectingRoutingReason')),
-        ),
-        mobileCallingPartyNumber=csv_data.get('mobileCallingPartyNumber'),
-        mobileCallType=to_int(csv_data.get('mobileCallType')),
-        orig=Orig(
-            call_termination_on_behalf_of=to_int(csv_data.get('origCallTerminationOnBehalfOf')),
-            call_party=OrigCalledParty(
-                redirect_on_behalf_of=to_int(csv_data.get('origCalledPartyRedirectOnBehalfOf')),
-                redirect_reason=to_int(csv_data.get('origCalledPartyRedirectReason')),
-            ),
-            cause=OrigCause(
-                location=to_int(csv_data.get('origCause_location')),
-                value=to_int(csv_data.get('origCause_value')),    
-            ),
-            conversation_id=to_int(csv_data.get('origConversationId')),
-            device_name=csv_data.get('origDeviceName'),
-            dtmf_method=to_int(csv_data.get('origDTMFMethod')),
-            ipv4v6_addr=csv_data.get('origIpv4v6Addr'),
-            ip_addr=int_to_ip(to_int(csv_data.get('origIpAddr'))),
-            leg_call_identifier=to_int(csv_data.get('origLegCallIdentifier')),
-            node_id=to_int(csv_data.get('origNodeId')),
-            orig_media_cap=OrigMediaCap(
-                bandwidth=to_int(csv_data.get('origMediaCap_Bandwidth')),
-                g723_bit_rate=to_int(csv_data.get('origMediaCap_g723BitRate')),
-                max_frames_per_packet=to_int(csv_data.get('origMediaCap_maxFramesPerPacket')),
-                payload_capability=to_int(csv_data.get('origMediaCap_payloadCapability')),
-            ),
-            precedence_level=to_int(csv_data.get('origPrecedenceLevel')),
-            routing_reason=to_int(csv_data.get('origRoutingReason')),
-            video_channel_role_channel2=to_int(csv_data.get('origVideoChannel_Role_Channel2')),
-            rsvp=OrigRsvp(
-                audio_stat=to_int(csv_data.get('origRSVPAudioStat')),
-                video_stat=to_int(csv_data.get('origRSVPVideoStat')), 
-            ),
-            span=csv_data.get('origSpan'),
-            video_cap=OrigVideoCap(
-                bandwidth=to_int(csv_data.get('origVideoCap_Bandwidth')),
-                codec=to_int(csv_data.get('origVideoCap_Codec')),
-                resolution=to_int(csv_data.get('origVideoCap_Resolution')),
-                bandwidth_channel2=to_int(csv_data.get('origVideoCap_Bandwidth_Channel2')),
-                codec_channel2=to_int(csv_data.get('origVideoCap_Codec_Channel2')),
-                resolution_channel2=to_int(csv_data.get('origVideoCap_Resolution_Channel2')),
-            ),
-            video_transport_address=OrigVideoTransportAddress(
-                ip=int_to_ip(to_int(csv_data.get('origVideoTransportAddress_IP'))),
-                port=to_int(csv_data.get('origVideoTransportAddress_Port')),
-                ip_channel2=int_to_ip(to_int(csv_data.get('origVideoTransportAddress_IP_Channel2'))),
-                port_channel2=to_int(csv_data.get('origVideoTransportAddress_Port_Channel2')),
-            ),
-        ),
-        originalCalledParty=OriginalCalledParty(
-            number=csv_data.get('originalCalledPartyNumber'),
-            partition=csv_data.get('originalCalledPartyNumberPartition'),
-            uri=csv_data.get('originalCalledPartyNumber_uri'),
-            pattern=csv_data.get('originalCalledPartyPattern'),
-        ),
-        outgoing=Outgoing(
-            icid=csv_data.get('OutgoingICID'),
-            orig_ioi=csv_data.get('OutgoingOrigIOI'),
-            protocol_call_ref=csv_data.get('OutgoingProtocolCallRef'),
-            protocol_id=to_int(csv_data.get('OutgoingProtocolID')),
-            term_ioi=csv_data.get('OutgoingTermIOI'),
-        ),
-        outpulsed=OutPulsed(
-            calling_party_number=csv_data.get('outpulsedCallingPartyNumber'),
-            called_party_number=csv_data.get('outpulsedCalledPartyNumber'),
-            last_redirecting_number=csv_data.get('outpulsedLastRedirectingNumber'),
-            original_called_party_number=csv_data.get('outpulsedOriginalCalledPartyNumber'),
-        ),
-        totalWaitTimeInQueue=to_int(csv_data.get('totalWaitTimeInQueue')),
-        wasCallQueued=convert_boolean(to_int(csv_data.get('wasCallQueued'))),
-        callDirection=call_direction.value,
-        pk_id=csv_data.get('pkid'),
-    )
\ No newline at end of file
+    document['callDirection'] = call_direction.value
+    document['directoryVersion'] = getattr(users_collection, 'version', None)
+    attach_user_profiles(document, users_collection)
+    attach_search_fields(document, users_collection)
+    attach_calendar_buckets(document)
+    return CdrModel.model_validate(document)
+
@@ -0,0 +1,166 @@
+from functools import lru_cache
+from typing import List, get_args
+from bson import encode
+from bson.raw_bson import RawBSONDocument
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from helpers.logger import main_logger as logger
+from helpers.converters import FIELD_MAP, RowPlan, attach_calendar_buckets, attach_search_fields, attach_user_profiles, determine_call_direction, parse_csv_row
+from models.cdrModel import CdrModel
+
+VALIDATION_STRICT = 'strict'    # Her satır Pydantic ile (eski yol)
+VALIDATION_SAMPLED = 'sampled'  # Hızlı yol + her N satırda bir Pydantic ile karşılaştırma
+VALIDATION_FAST = 'fast'        # Sadece hızlı yol
+
+_INT_ADAPTER = TypeAdapter(int)
+
+
+def _lax_int(value):
+    """Pydantic'in lax str -> int dönüşümü (ham string alanlar için, örn. origSpan)"""
+    if value is None:
+        return None
+    if value.isascii():
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    # '5.0' gibi nadir durumlar için Pydantic'in kendi kuralları (hata da aynı şekilde ValidationError)
+    return _INT_ADAPTER.validate_python(value)
+
+
+# Dönüştürücünün çıktısı alan tipinden farklıysa Pydantic'in yapacağı dönüşüm
+_COERCERS = {
+    (int, None): _lax_int,
+}
+
+
+def _field_type(field):
+    """Optional[X] -> X"""
+    return next(arg for arg in get_args(field.annotation) if arg is not type(None))
+
+
+class DocumentBuilder:
+    """
+    RowPlan çıktısını Pydantic modeli oluşturmadan, CdrModel.model_dump() ile aynı
+    iç içe doküman şekline (aynı key sırası ve tipler) dönüştüren hızlı yol.
+    Model alanları import sırasında değil plan derlenirken CdrModel'den okunur,
+    böylece modele eklenen alanlar otomatik olarak dokümanda yer alır.
+    """
+
+    def __init__(self, plan: RowPlan):
+        self.plan = plan
+
+        # Container'lar model alan sırasıyla: (parent index, key, alan isimleri)
+        self._containers = []
+        leaf_types = {}
+        container_ids = {}
+
+        def add_container(model, path, parent):
+            container_ids[path] = len(self._containers)
+            self._containers.append((parent, path[-1] if path else None, list(model.model_fields)))
+            for name, field in model.model_fields.items():
+                field_type = _field_type(field)
+                if isinstance(field_type, type) and issubclass(field_type, BaseModel):
+                    add_container(field_type, path + (name,), container_ids[path])
+                else:
+                    leaf_types[path + (name,)] = field_type
+
+        add_container(CdrModel, (), None)
+
+        # Modelde karşılığı olmayan kolonlar Pydantic'te olduğu gibi yok sayılır
+        self._steps = []
+        for index, (_, path, converter) in zip(plan.indexes, FIELD_MAP):
+            keys = tuple(path.split('.'))
+            if keys not in leaf_types:
+                continue
+            coercer = _COERCERS.get((leaf_types[keys], converter.__name__ if converter else None))
+            self._steps.append((index, container_ids[keys[:-1]], keys[-1], converter, coercer))
+
+        self._calling_party = container_ids[('callingParty',)]
+        self._original_called_party = container_ids[('originalCalledParty',)]
+
+    def build(self, row: List[str], users_collection) -> dict:
+        """Satırı doğrudan MongoDB dokümanına çevir. Geçersiz değerlerde ValueError/ValidationError"""
+        length = len(row)
+        containers = []
+        for parent, key, fields in self._containers:
+            container = dict.fromkeys(fields)
+            if parent is not None:
+                containers[parent][key] = container
+            containers.append(container)
+
+        for index, container, key, converter, coercer in self._steps:
+            value = row[index] if index is not None and index < length else None
+            if converter is not None:
+                value = converter(value)
+            if coercer is not None:
+                value = coercer(value)
+            containers[container][key] = value
+
+        document = containers[0]
+        document['callDirection'] = determine_call_direction(
+            containers[self._calling_party]['number'],
+            containers[self._original_called_party]['number'],
+            users_collection
+        ).value
+        document['directoryVersion'] = getattr(users_collection, 'version', None)
+        attach_user_profiles(document, users_collection)
+        attach_search_fields(document, users_collection)
+        attach_calendar_buckets(document)
+        return document
+
+
+@lru_cache(maxsize=32)
+def compile_document_builder(plan: RowPlan) -> DocumentBuilder:
+    """Plan başına bir builder (planlar header imzasına göre zaten cache'li)"""
+    return DocumentBuilder(plan)
+
+
+class RowConverter:
+    """
+    Bir dosyanın satırlarını seçilen validasyon moduna göre dokümana çevirir.
+    sampled modunda her sample_rate satırda bir Pydantic sonucu ile hızlı yol karşılaştırılır;
+    fark varsa loglanır ve Pydantic sonucu kullanılır.
+    """
+
+    def __init__(self, plan: RowPlan, users_collection, mode: str = VALIDATION_SAMPLED,
+                 sample_rate: int = 1000, encode_documents: bool = False):
+        if mode not in (VALIDATION_STRICT, VALIDATION_SAMPLED, VALIDATION_FAST):
+            raise ValueError(f"Unknown validation mode: {mode}")
+        self.plan = plan
+        self.users_collection = users_collection
+        self.mode = mode
+        self.sample_rate = max(1, sample_rate)
+        self.encode_documents = encode_documents
+        self.builder = compile_document_builder(plan) if mode != VALIDATION_STRICT else None
+
+        self._rows = 0
+        self.mismatches = 0
+
+    def convert(self, row: List[str]):
+        """Satırı dokümana çevir (encode_documents ise RawBSONDocument). Hatalı satırlar loglanır ve None döner."""
+        self._rows += 1
+        try:
+            if self.builder is None:
+                document = parse_csv_row(row, self.plan, self.users_collection).model_dump()
+            else:
+                document = self.builder.build(row, self.users_collection)
+                if self.mode == VALIDATION_SAMPLED and (self._rows - 1) % self.sample_rate == 0:
+                    document = self._verify(row, document)
+        except (ValidationError, ValueError) as e:
+            logger.error(f"Validation error for row {row}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error converting record for row {row}: {e}")
+            return None
+
+        if self.encode_documents:
+            return RawBSONDocument(encode(document))
+        return document
+
+    def _verify(self, row: List[str], document: dict) -> dict:
+        validated = parse_csv_row(row, self.plan, self.users_collection).model_dump()
+        if validated != document:
+            self.mismatches += 1
+            differing = [key for key in validated if validated[key] != document.get(key)]
+            logger.error(f"Fast document builder mismatch for pk_id={validated.get('pk_id')} in fields {differing}")
+        return validated
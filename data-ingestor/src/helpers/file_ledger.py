@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+# Dosya durumları
+STATE_PROCESSING = 'processing'   # .processing olarak kilitli
+STATE_PENDING = 'pending'         # Hata sonrası kaynak klasöre geri bırakıldı
+STATE_PROCESSED = 'processed'     # Processed klasörüne taşındı
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    size INTEGER,
+    records INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    processed_path TEXT,
+    host TEXT,
+    pid INTEGER,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_state ON files (state);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class FileLedger:
+    """
+    Dosya başına işleme durumu (SQLite, MongoDB kesintisinden bağımsız).
+    FileManager kilitleme / geri bırakma / taşıma sırasında günceller; processed sayısı bir sayaçta
+    artımlı tutulur, böylece istatistikler klasör taranmadan okunur.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+
+    def _execute(self, statements):
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, params in statements:
+                    self._connection.execute(sql, params)
+                self._connection.execute('COMMIT')
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+
+    def _counter(self, name: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def seed_processed_count(self, count_files: Callable[[], int]) -> int:
+        """
+        Processed sayacı yoksa (ledger ilk kez oluşturuldu) count_files ile bir kez say.
+        Sonraki çalıştırmalarda sayaç artımlı güncellenir.
+        """
+        count = self._counter(STATE_PROCESSED)
+        if count is None:
+            count = count_files()
+            self._execute([('INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)', (STATE_PROCESSED, count))])
+        return count
+
+    def mark_processing(self, filename: str, size: int, host: str = None, pid: int = None):
+        # host / pid: kilidin sahibi (yarım kalan .processing dosyalarının tespiti için)
+        self._execute([(
+            """
+            INSERT INTO files (filename, state, size, attempts, host, pid, updated_at) VALUES (?, ?, ?, 1, ?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET state = excluded.state, size = excluded.size,
+                attempts = attempts + 1, host = excluded.host, pid = excluded.pid, updated_at = excluded.updated_at
+            """,
+            (filename, STATE_PROCESSING, size, host, pid, _now())
+        )])
+
+    def mark_pending(self, filename: str):
+        self._execute([(
+            'UPDATE files SET state = ?, updated_at = ? WHERE filename = ?',
+            (STATE_PENDING, _now(), filename)
+        )])
+
+    def mark_processed(self, filename: str, processed_path: str, records: int):
+        # Sayaç, dosya daha önce processed değilse artar (aynı dosyanın tekrar bildirimi sayılmaz)
+        self._execute([
+            (
+                """
+                UPDATE counters SET value = value + 1 WHERE name = ? AND NOT EXISTS
+                    (SELECT 1 FROM files WHERE filename = ? AND state = ?)
+                """,
+                (STATE_PROCESSED, filename, STATE_PROCESSED)
+            ),
+            (
+                """
+                INSERT INTO files (filename, state, records, processed_path, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (filename) DO UPDATE SET state = excluded.state, records = excluded.records,
+                    processed_path = excluded.processed_path, updated_at = excluded.updated_at
+                """,
+                (filename, STATE_PROCESSED, records, processed_path, _now())
+            ),
+        ])
+
+    def get(self, filename: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self._connection.execute('SELECT * FROM files WHERE filename = ?', (filename,))
+            row = cursor.fetchone()
+            return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def count(self, state: str) -> int:
+        if state == STATE_PROCESSED:
+            return self._counter(STATE_PROCESSED) or 0
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM files WHERE state = ?', (state,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,18 +1,58 @@
 import os
+import re
 import shutil
+import socket
+import sqlite3
 import time
 from datetime import datetime
 from helpers.logger import main_logger as logger
-from typing import List
+from helpers.file_ledger import FileLedger, STATE_PROCESSED
+from typing import List, Optional, Tuple
+
+# CUCM dosya adındaki üretim zamanı: cdr_StandAloneCluster_01_202401151030_12345
+_CDR_TIMESTAMP = re.compile(r'_(\d{12})_')
+
+
+def cdr_file_sort_key(file_path: str):
+    """Dosyaları CUCM'in ürettiği sıraya göre sırala (zaman yoksa dosya adına göre)"""
+    filename = os.path.basename(file_path)
+    match = _CDR_TIMESTAMP.search(filename)
+    return (match.group(1) if match else '', filename)
+
 
 class FileManager:
-    def __init__(self, source_dir: str = "E:\\CDR", processed_dir: str = "E:\\CDR_Processed"):
+    def __init__(self, source_dir: str = "E:\\CDR", processed_dir: str = "E:\\CDR_Processed",
+                 stable_seconds: int = 60, ledger_path: Optional[str] = None):
         self.source_dir = source_dir
         self.processed_dir = processed_dir
         self.processing_extension = ".processing"
+        # Yazılıp kapatıldığı bilinmeyen dosyanın hazır sayılması için değişmeden geçmesi gereken süre
+        self.stable_seconds = stable_seconds
+        # File watcher'ın yazılıp kapatıldığını bildirdiği dosyalar (bekleme süresi gerekmez)
+        self._ready = set()
+        # Hata sonrası geri adlandırdığımız dosyalar: bu rename'in olayı yeni dosya sayılmaz
+        self._unlocked = set()
+        # Bu process'in kilitlediği dosyalar: kurtarma bunlara dokunmaz
+        self._locked = set()
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        
+        # Son taramanın sonuçları: istatistikler klasör tekrar listelenmeden bunlardan okunur
+        self._pending_count = None
+        self._processing_count = None
+        self._scanned_stats = {}
         
         # Klasörleri oluştur
         self._ensure_directories()
+        
+        # Dosya durumları (processed sayısı dahil) artımlı olarak ledger'da tutulur
+        self.ledger_path = ledger_path or os.path.join(processed_dir, 'file_ledger.sqlite3')
+        self.ledger = None
+        try:
+            self.ledger = FileLedger(self.ledger_path)
+            self.ledger.seed_processed_count(self._count_processed_files)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"File ledger {self.ledger_path} could not be opened, processed count unavailable: {e}")
     
     def _ensure_directories(self):
         """Gerekli klasörleri oluştur"""
@@ -30,6 +70,27 @@ class FileManager:
             logger.error(f"Error creating directories: {e}")
             raise
     
+    def _scan_source(self) -> list:
+        """
+        Kaynak klasörü tek os.scandir geçişiyle tara: CDR dosyaları ve stat sonuçları.
+        Bekleyen / kilitli dosya sayıları istatistikler için saklanır.
+        Returns: [(file_path, stat), ...]
+        """
+        files = []
+        processing_count = 0
+        with os.scandir(self.source_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.processing_extension):
+                    processing_count += 1
+                elif self._is_cdr_file(entry.name) and entry.is_file():
+                    # Windows'ta stat dizin listesinden gelir, ek sistem çağrısı yok
+                    files.append((entry.path, entry.stat()))
+        
+        self._pending_count = len(files)
+        self._processing_count = processing_count
+        self._scanned_stats = dict(files)
+        return files
+    
     def get_available_files(self) -> List[str]:
         """İşlenmeye hazır dosyaları getir - CDR dosyaları uzantısız"""
         available_files = []
@@ -40,41 +101,66 @@ class FileManager:
         
         try:
             # CDR dosyaları uzantısız - sadece .processing ve gizli dosyaları hariç tut
-            all_files = [f for f in os.listdir(self.source_dir) 
-                        if not f.endswith(self.processing_extension) 
-                        and not f.startswith('.') 
-                        and os.path.isfile(os.path.join(self.source_dir, f))
-                        and f.startswith('cdr_')]  # CDR dosyalarını filtrele
+            all_files = self._scan_source()
             
             logger.info(f"Found {len(all_files)} CDR files in source directory")
             
-            for filename in all_files:
-                file_path = os.path.join(self.source_dir, filename)
-                
+            for file_path, stat in all_files:
                 # Dosya concurrent access kontrolü
-                if self._is_file_ready_for_processing(file_path):
+                if self._is_file_ready_for_processing(file_path, stat=stat):
                     available_files.append(file_path)
                 else:
-                    logger.debug(f"File not ready for processing: {filename}")
+                    logger.debug(f"File not ready for processing: {os.path.basename(file_path)}")
             
+            # En eski dosyadan başla (paralel işlemede de dosyalar bu sırayla başlatılır)
+            available_files.sort(key=cdr_file_sort_key)
             logger.info(f"Found {len(available_files)} files ready for processing")
             
+            # Artık klasörde olmayan dosyaların hazır işaretleri
+            self._ready.intersection_update(self._scanned_stats)
+            
         except Exception as e:
             logger.error(f"Error scanning source directory: {e}")
         
         return available_files
     
-    def _is_file_ready_for_processing(self, file_path: str, stable_duration: int = 60) -> bool:
+    def _is_cdr_file(self, filename: str) -> bool:
+        # CDR dosyaları uzantısız; .processing ve gizli dosyalar hariç
+        return (filename.startswith('cdr_')
+                and not filename.endswith(self.processing_extension)
+                and not filename.startswith('.'))
+    
+    def mark_ready(self, file_path: str) -> bool:
+        """
+        File watcher: dosya yazılıp kapatıldı ya da klasöre taşındı, beklemeden işlenebilir.
+        Returns: işlenecek yeni bir CDR dosyası mı (kendi unlock rename'lerimiz ve diğer dosyalar değil)
+        """
+        if not self._is_cdr_file(os.path.basename(file_path)):
+            return False
+        if file_path in self._unlocked:
+            self._unlocked.discard(file_path)
+            return False
+        self._ready.add(file_path)
+        return True
+    
+    def _is_file_ready_for_processing(self, file_path: str, stable_duration: int = None,
+                                      stat: os.stat_result = None) -> bool:
         """
         Dosyanın işlenmeye hazır olup olmadığını kontrol et
-        stable_duration saniye boyunca dosya boyutu değişmemişse hazır kabul et
+        File watcher yazma bittiğini bildirdiyse hemen, bildirmediyse stable_duration
+        (varsayılan stable_seconds) saniye boyunca değişmemişse hazır kabul et
+        stat: taramada alınmış stat sonucu (verilmezse dosyadan okunur)
         """
+        if stable_duration is None:
+            stable_duration = self.stable_seconds
         try:
-            if not os.path.exists(file_path):
-                return False
+            if stat is None:
+                if not os.path.exists(file_path):
+                    return False
+                stat = os.stat(file_path)
             
             # İlk boyutu al
-            initial_stat = os.stat(file_path)
+            initial_stat = stat
             initial_size = initial_stat.st_size
             initial_mtime = initial_stat.st_mtime
             
@@ -82,11 +168,15 @@ class FileManager:
             if initial_size < 100:  # 100 byte altı
                 return False
             
+            # Yazma bitti (close-write / move olayı)
+            if file_path in self._ready:
+                return True
+            
             # Son değiştirilme zamanından şu ana kadar geçen süre
             current_time = time.time()
             time_since_modification = current_time - initial_mtime
             
-            # 1 dakikadan az önce değiştirilmişse bekle
+            # stable_duration saniyeden az önce değiştirilmişse bekle
             if time_since_modification < stable_duration:
                 logger.debug(f"File modified recently, waiting: {os.path.basename(file_path)}")
                 return False
@@ -107,7 +197,23 @@ class FileManager:
             locked_file_path = file_path + self.processing_extension
             
             # Dosyayı yeniden adlandır (atomic operation)
-            os.rename(file_path, locked_file_path)
+            self._locked.add(locked_file_path)
+            try:
+                os.rename(file_path, locked_file_path)
+            except OSError:
+                self._locked.discard(locked_file_path)
+                raise
+            self._ready.discard(file_path)
+            self._unlocked.discard(file_path)
+            stat = self._scanned_stats.pop(file_path, None)
+            self._update_ledger(
+                'mark_processing',
+                os.path.basename(file_path),
+                stat.st_size if stat is not None else os.path.getsize(locked_file_path),
+                self.host,
+                self.pid
+            )
+            self._adjust_counts(pending=-1, processing=1)
             
             logger.info(f"File locked for processing: {os.path.basename(file_path)}")
             return locked_file_path
@@ -126,7 +232,12 @@ class FileManager:
                 return
             
             original_file_path = locked_file_path[:-len(self.processing_extension)]
+            # Tekrar deneme periyodik taramada: bu rename'in olayı hemen yeniden işlemeyi tetiklemesin
+            self._unlocked.add(original_file_path)
             os.rename(locked_file_path, original_file_path)
+            self._locked.discard(locked_file_path)
+            self._update_ledger('mark_pending', os.path.basename(original_file_path))
+            self._adjust_counts(pending=1, processing=-1)
             
             logger.warning(f"File unlocked due to processing failure: {os.path.basename(original_file_path)}")
             
@@ -161,6 +272,9 @@ class FileManager:
             
             # Dosyayı taşı
             shutil.move(locked_file_path, target_file_path)
+            self._locked.discard(locked_file_path)
+            self._update_ledger('mark_processed', original_filename, target_file_path, records_count)
+            self._adjust_counts(processing=-1)
             
             logger.info(f"File moved to processed: {original_filename} ({records_count} records)")
             return True
@@ -171,27 +285,77 @@ class FileManager:
             self.unlock_file_on_failure(locked_file_path)
             return False
     
+    def get_foreign_locked_files(self) -> List[Tuple[str, os.stat_result, Optional[dict]]]:
+        """
+        Kaynak klasörde bu process'e ait olmayan .processing dosyaları (önceki çalıştırmadan ya da
+        başka bir process'ten kalan kilitler). Returns: [(locked_file_path, stat, ledger kaydı), ...]
+        """
+        locked_files = []
+        with os.scandir(self.source_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.processing_extension) or entry.path in self._locked:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Bu arada taşındı
+                entry_info = None
+                if self.ledger is not None:
+                    try:
+                        entry_info = self.ledger.get(entry.name[:-len(self.processing_extension)])
+                    except sqlite3.Error as e:
+                        logger.warning(f"File ledger lookup failed for {entry.name}: {e}")
+                locked_files.append((entry.path, stat, entry_info))
+        return locked_files
+    
+    def release_stale_lock(self, locked_file_path: str) -> Optional[str]:
+        """
+        Sahibi artık çalışmayan .processing dosyasını orijinal adına döndür ve hemen işlenmek üzere
+        hazır işaretle (periyodik taramayı beklemez). Returns: orijinal dosya yolu, dosya yoksa None
+        """
+        original_file_path = locked_file_path[:-len(self.processing_extension)]
+        try:
+            os.rename(locked_file_path, original_file_path)
+        except FileNotFoundError:
+            return None
+        self._ready.add(original_file_path)
+        self._update_ledger('mark_pending', os.path.basename(original_file_path))
+        self._adjust_counts(pending=1, processing=-1)
+        return original_file_path
+    
+    def _adjust_counts(self, pending: int = 0, processing: int = 0):
+        """Kilitleme / geri bırakma / taşıma sonrası son taramadaki sayıları güncelle (sonraki tarama düzeltir)"""
+        if self._pending_count is not None:
+            self._pending_count = max(0, self._pending_count + pending)
+            self._processing_count = max(0, self._processing_count + processing)
+    
+    def _update_ledger(self, method: str, *args):
+        """Ledger güncellemesi; hata dosya işlemeyi durdurmaz (sadece istatistik etkilenir)"""
+        if self.ledger is None:
+            return
+        try:
+            getattr(self.ledger, method)(*args)
+        except sqlite3.Error as e:
+            logger.warning(f"File ledger update ({method}) failed for {args[0]}: {e}")
+    
+    def _count_processed_files(self) -> int:
+        """Processed klasöründeki CDR dosyalarını bir kez say (ledger ilk oluşturulduğunda)"""
+        logger.info(f"Counting processed files in {self.processed_dir} to seed the file ledger...")
+        processed_count = 0
+        for root, dirs, files in os.walk(self.processed_dir):
+            processed_count += sum(1 for f in files if f.startswith('cdr_'))
+        return processed_count
+    
     def get_processing_stats(self) -> dict:
-        """İşleme istatistiklerini döndür"""
+        """İşleme istatistiklerini döndür (son taramadan ve ledger sayacından, klasör taranmaz)"""
         try:
-            source_count = len([f for f in os.listdir(self.source_dir) 
-                              if f.lower().endswith('.csv') and not f.endswith(self.processing_extension)]) \
-                              if os.path.exists(self.source_dir) else 0
-            
-            processing_count = len([f for f in os.listdir(self.source_dir) 
-                                  if f.endswith(self.processing_extension)]) \
-                                  if os.path.exists(self.source_dir) else 0
-            
-            # Processed klasörü toplam dosya sayısı
-            processed_count = 0
-            if os.path.exists(self.processed_dir):
-                for root, dirs, files in os.walk(self.processed_dir):
-                    processed_count += len([f for f in files if f.lower().endswith('.csv')])
+            if self._pending_count is None and os.path.exists(self.source_dir):
+                self._scan_source()
             
             return {
-                'pending_files': source_count,
-                'processing_files': processing_count,
-                'processed_files': processed_count,
+                'pending_files': self._pending_count or 0,
+                'processing_files': self._processing_count or 0,
+                'processed_files': self.ledger.count(STATE_PROCESSED) if self.ledger is not None else None,
                 'source_dir': self.source_dir,
                 'processed_dir': self.processed_dir
             }
@@ -199,3 +363,9 @@ class FileManager:
         except Exception as e:
             logger.error(f"Error getting processing stats: {e}")
             return {}
+    
+    def close(self):
+        """Ledger bağlantısını kapat"""
+        if self.ledger is not None:
+            self.ledger.close()
+            self.ledger = None
@@ -0,0 +1,131 @@
+import asyncio
+import ctypes
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+from helpers.file_ledger import STATE_PROCESSING
+from helpers.logger import main_logger as logger
+
+# Windows: OpenProcess / GetExitCodeProcess
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_ERROR_ACCESS_DENIED = 5
+_STILL_ACTIVE = 259
+
+
+def pid_alive(pid: int) -> bool:
+    """Bu makinede pid ile çalışan bir process var mı"""
+    if pid <= 0:
+        return False
+    if sys.platform == 'win32':
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # Başka kullanıcının process'i: var ama erişim yok
+            return ctypes.get_last_error() == _ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == _STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _lock_age(stat: os.stat_result, entry: Optional[dict]) -> float:
+    """Kilidin yaşı (saniye): ledger'daki kilitleme zamanı, yoksa (ya da okunamıyorsa) dosya zamanları"""
+    if entry is not None and entry.get('state') == STATE_PROCESSING:
+        try:
+            return time.time() - datetime.fromisoformat(entry['updated_at']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            pass
+    # Linux'ta rename ctime'ı günceller; Windows'ta ctime oluşturma zamanıdır (kilit daha eski sayılır)
+    return time.time() - max(stat.st_mtime, stat.st_ctime)
+
+
+def stale_reason(stat: os.stat_result, entry: Optional[dict], host: str, stale_seconds: int) -> Optional[str]:
+    """
+    Kilit sahipsiz mi: aynı makinedeki sahibi çalışmıyorsa hemen, aksi halde (sahibi bilinmiyor, başka
+    makinede ya da pid başka bir process'e geçmiş) stale_seconds'tan eskiyse. Okunamayan ledger kaydında sahip
+    bilinmiyor sayılır ve yaş dosya zamanlarından hesaplanır. Returns: sebep, kilit geçerliyse None
+    """
+    if entry is not None and entry.get('state') == STATE_PROCESSING and entry.get('host') == host \
+            and isinstance(entry.get('pid'), int):
+        # Bu process'in kilitleri FileManager'da ayrıca tutulur; ledger'da aynı pid önceki çalıştırmadandır
+        if entry['pid'] == os.getpid() or not pid_alive(entry['pid']):
+            return f"owner process {entry['pid']} is not running"
+
+    age = _lock_age(stat, entry)
+    if age >= stale_seconds:
+        owner = f"{entry.get('host')}:{entry.get('pid')}" if entry is not None and entry.get('host') else "unknown owner"
+        return f"locked for {age:.0f}s by {owner}"
+    return None
+
+
+class StaleFileRecovery:
+    """
+    Servis yarıda kesildiğinde kaynak klasörde kalan .processing dosyalarını kurtarır.
+    Başlangıçta ve her interval saniyede arka planda çalışır (başlangıcı geciktirmez). Sahipsiz dosya
+    orijinal adına döndürülür ve normal işleme turuna verilir: son checkpoint'ten devam edilir,
+    tekrar yazılan satırları unique pk_id index'i eler.
+    """
+
+    def __init__(self, file_manager, stale_seconds: int = 3600, interval: int = 300,
+                 on_recovered: Callable[[List[str]], None] = None):
+        self.file_manager = file_manager
+        self.stale_seconds = stale_seconds
+        self.interval = interval
+        self.on_recovered = on_recovered
+        self._task: Optional[asyncio.Task] = None
+
+    def _recover(self) -> List[str]:
+        recovered = []
+        for locked_file_path, stat, entry in self.file_manager.get_foreign_locked_files():
+            reason = stale_reason(stat, entry, self.file_manager.host, self.stale_seconds)
+            if reason is None:
+                continue
+            file_path = self.file_manager.release_stale_lock(locked_file_path)
+            if file_path is not None:
+                logger.warning(f"Recovered orphaned file {os.path.basename(file_path)} ({reason})")
+                recovered.append(file_path)
+        return recovered
+
+    async def recover(self) -> List[str]:
+        """Sahipsiz .processing dosyalarını kurtar. Returns: kurtarılan dosya yolları"""
+        try:
+            # Event loop'ta: FileManager'ın kilit / hazır kümeleri işleme ile aynı thread'de güncellenir
+            recovered = self._recover()
+        except Exception as e:
+            logger.error(f"Orphaned file recovery failed: {e}")
+            return []
+        if recovered and self.on_recovered is not None:
+            self.on_recovered(recovered)
+        return recovered
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.recover()
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,137 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from typing import Callable, Optional
+from helpers.logger import main_logger as logger
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008   # Yazma için açılmış dosya kapatıldı (upload bitti)
+IN_MOVED_TO = 0x00000080      # Dosya klasöre taşındı / yeniden adlandırıldı (geçici isimle upload)
+IN_Q_OVERFLOW = 0x00004000    # Kernel kuyruğu taştı, olaylar kayboldu
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+_READ_SIZE = 64 * 1024
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not (hasattr(libc, 'inotify_init1') and hasattr(libc, 'inotify_add_watch')):  # Eski glibc'de yok
+        return None
+    return libc
+
+
+def inotify_available() -> bool:
+    return _load_libc() is not None
+
+
+class InotifyWatcher:
+    """
+    Linux inotify ile klasör izleme (ek bağımlılık yok, ctypes). Event loop'a reader olarak eklenir.
+    Bir dosya yazılıp kapatıldığında ya da klasöre taşındığında on_file(path), olay kaybında
+    (kuyruk taşması) on_overflow() çağrılır; o durumda klasör baştan taranmalıdır.
+    """
+
+    def __init__(self, directory: str, on_file: Callable[[str], None], on_overflow: Callable[[], None]):
+        self.directory = directory
+        self.on_file = on_file
+        self.on_overflow = on_overflow
+        self._fd: Optional[int] = None
+        self._loop = None
+
+    def start(self):
+        libc = _load_libc()
+        if libc is None:
+            raise OSError("inotify is not available on this platform")
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch failed for {self.directory}: {os.strerror(errno)}")
+
+        self._fd = fd
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(fd, self._read_events)
+
+    def stop(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return
+
+        position = 0
+        while position + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, position)
+            position += _EVENT_HEADER.size
+            name = data[position:position + length].rstrip(b'\0')
+            position += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f"File watcher event queue overflowed for {self.directory}, rescanning")
+                self.on_overflow()
+            elif name:
+                self.on_file(os.path.join(self.directory, os.fsdecode(name)))
+
+
+class FileWatcher:
+    """
+    Kaynak klasörde yeni dosya geldiğinde işlemeyi tetikler.
+    mode: auto (inotify varsa onu, yoksa sadece periyodik tarama) | inotify | poll.
+    Yazılıp kapatılan dosyalar FileManager'a hazır olarak bildirilir (sabit bekleme süresi gerekmez);
+    periyodik tarama her modda güvenlik ağı olarak devam eder.
+    """
+
+    def __init__(self, file_manager, mode: str = 'auto'):
+        self.file_manager = file_manager
+        self.mode = mode
+        self.changed = asyncio.Event()
+        self._inotify: Optional[InotifyWatcher] = None
+
+    @property
+    def active(self) -> bool:
+        return self._inotify is not None
+
+    def start(self):
+        if self.mode == 'poll':
+            return
+        if self.mode == 'auto' and not inotify_available():
+            logger.info("File watcher: inotify not available, using periodic scan only")
+            return
+
+        watcher = InotifyWatcher(self.file_manager.source_dir, self._on_file, self.changed.set)
+        try:
+            watcher.start()
+        except OSError as e:
+            if self.mode == 'inotify':
+                raise
+            logger.warning(f"File watcher could not be started, using periodic scan only: {e}")
+            return
+        self._inotify = watcher
+        logger.info(f"File watcher: inotify on {self.file_manager.source_dir}")
+
+    def stop(self):
+        if self._inotify is not None:
+            self._inotify.stop()
+            self._inotify = None
+
+    def _on_file(self, file_path: str):
+        if self.file_manager.mark_ready(file_path):
+            self.changed.set()
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+from pymongo.errors import OperationFailure
+from helpers.logger import main_logger as logger
+
+# index_information() kayıtlarında karşılaştırılmayan alanlar
+_INFO_ONLY_FIELDS = ('key', 'v', 'ns', 'background')
+
+
+class IndexSpec:
+    """
+    Bir collection'da olması gereken index'in tanımı.
+    required: yazmalardan önce senkron oluşturulur (ör. idempotent yazma için unique pk_id index'i);
+    diğerleri arka planda oluşturulur. options create_index'e aynen aktarılır (unique, partialFilterExpression...).
+    """
+
+    def __init__(self, name: str, keys: list, required: bool = False, **options):
+        self.name = name
+        self.keys = [(field, direction) for field, direction in keys]
+        self.required = required
+        self.options = options
+
+    def matches(self, info: dict) -> bool:
+        """index_information() kaydı bu tanımla aynı mı (key sırası ve seçenekler)"""
+        if [(field, direction) for field, direction in info['key']] != self.keys:
+            return False
+        options = {key: value for key, value in info.items() if key not in _INFO_ONLY_FIELDS}
+        return options == self.options
+
+
+class IndexManager:
+    """
+    Collection'ın index'lerini tanımlara (IndexSpec listesi) göre yönetir:
+      - required index'ler ensure_required() ile senkron, diğer eksikler start() ile arka planda (thread'de,
+        tek tek) oluşturulur; MongoDB 4.2+ index build'i yazmaları bloklamaz, ingestion devam eder
+      - aynı isimde farklı tanımlı index'ler değiştirilmez, raporlanır (drop + yeniden oluşturma elle yapılır)
+      - $indexStats ile kullanım raporu: tanımsız (elle / eski script'lerle oluşturulmuş) ve unused_days'ten
+        uzun süredir hiç kullanılmamış index'ler loglanır. Index'ler otomatik silinmez.
+    """
+
+    def __init__(self, collection, specs: List[IndexSpec], unused_days: int = 7, report_interval: int = 86400):
+        self.collection = collection
+        self.specs = list(specs)
+        self.unused_days = unused_days
+        self.report_interval = report_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def plan(self) -> dict:
+        """
+        Mevcut index'leri tanımlarla karşılaştır.
+        Returns: {'missing': [IndexSpec], 'conflicting': [isim], 'unknown': [isim]}
+        """
+        existing = self.collection.index_information()
+        declared = {spec.name for spec in self.specs}
+        missing = []
+        conflicting = []
+        for spec in self.specs:
+            info = existing.get(spec.name)
+            if info is None:
+                missing.append(spec)
+            elif not spec.matches(info):
+                conflicting.append(spec.name)
+        unknown = [name for name in existing if name != '_id_' and name not in declared]
+        return {'missing': missing, 'conflicting': conflicting, 'unknown': unknown}
+
+    def _create(self, spec: IndexSpec) -> bool:
+        started = time.perf_counter()
+        try:
+            self.collection.create_index(spec.keys, name=spec.name, **spec.options)
+        except OperationFailure as e:
+            # Ör. mevcut duplicate kayıtlar (unique) ya da aynı key'lerle farklı isimde index
+            logger.error(f"Index {spec.name} could not be created on '{self.collection.name}': {e}")
+            return False
+        logger.info(f"Index {spec.name} on '{self.collection.name}' ready in {time.perf_counter() - started:.1f}s")
+        return True
+
+    def ensure_required(self):
+        """required index'leri oluştur (yazmalar başlamadan, senkron)"""
+        for spec in self.plan()['missing']:
+            if spec.required:
+                self._create(spec)
+
+    def ensure_all(self) -> dict:
+        """Tüm eksik index'leri senkron oluştur (backfill sonu, CLI). Returns: plan()"""
+        plan = self.plan()
+        for spec in plan['missing']:
+            self._create(spec)
+        self._log_conflicts(plan)
+        return plan
+
+    def _log_conflicts(self, plan: dict):
+        for name in plan['conflicting']:
+            logger.warning(
+                f"Index {name} on '{self.collection.name}' differs from its declaration; "
+                f"drop it to let the ingestor rebuild it"
+            )
+
+    def usage(self) -> Optional[dict]:
+        """$indexStats: {isim: {'ops': erişim sayısı, 'since': sayımın başladığı an}}; yetki / destek yoksa None"""
+        try:
+            stats = self.collection.aggregate([{'$indexStats': {}}])
+            return {
+                entry['name']: {'ops': entry['accesses']['ops'], 'since': entry['accesses']['since']}
+                for entry in stats
+            }
+        except Exception as e:
+            logger.info(f"Index usage statistics unavailable for '{self.collection.name}': {e}")
+            return None
+
+    def report(self) -> dict:
+        """
+        Eksik, farklı tanımlı, tanımsız ve kullanılmayan index'leri logla.
+        Kullanım sayaçları mongod yeniden başladığında sıfırlanır; bir index sadece sayım unused_days'ten
+        uzun süredir devam ediyorsa kullanılmıyor sayılır.
+        Returns: plan() + {'unused': [isim], 'usage': $indexStats özeti ya da None}
+        """
+        plan = self.plan()
+        usage = self.usage()
+        unused = []
+        if usage is not None:
+            now = datetime.now(timezone.utc)
+            for name, entry in usage.items():
+                since = entry['since']
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                if name != '_id_' and entry['ops'] == 0 and (now - since).days >= self.unused_days:
+                    unused.append(name)
+
+        collection_name = self.collection.name
+        if plan['missing']:
+            logger.warning(f"Missing indexes on '{collection_name}': {[spec.name for spec in plan['missing']]}")
+        self._log_conflicts(plan)
+        for name in plan['unknown']:
+            ops = usage[name]['ops'] if usage is not None and name in usage else 'unknown'
+            logger.warning(f"Undeclared index {name} on '{collection_name}' ({ops} uses), drop it if not needed")
+        for name in unused:
+            if name not in plan['unknown']:
+                logger.warning(
+                    f"Index {name} on '{collection_name}' has not been used since {usage[name]['since']:%Y-%m-%d}"
+                )
+        return dict(plan, unused=unused, usage=usage)
+
+    def start(self):
+        """Eksik index'leri arka planda oluştur, sonra her report_interval saniyede kullanım raporu"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        try:
+            plan = await asyncio.to_thread(self.plan)
+            for spec in plan['missing']:
+                logger.info(f"Building index {spec.name} on '{self.collection.name}' in the background")
+                await asyncio.to_thread(self._create, spec)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background index build failed on '{self.collection.name}': {e}")
+
+        while True:
+            try:
+                await asyncio.to_thread(self.report)
+            except Exception as e:
+                logger.warning(f"Index report failed on '{self.collection.name}': {e}")
+            if self.report_interval <= 0:
+                return
+            await asyncio.sleep(self.report_interval)
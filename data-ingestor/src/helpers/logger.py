@@ -1,9 +1,14 @@
 # src/logger.py
 import logging
 import os
-from pymongo import MongoClient
+import threading
+import time
 import traceback
+from collections import deque
+from datetime import datetime, timezone
+from pymongo.errors import OperationFailure
 from helpers.config import load_config
+from helpers.mongo import get_mongo_client
 
 config = load_config()
 
@@ -11,18 +16,130 @@ config = load_config()
 LOG_DIR = os.environ.get('CDR_LOG_DIR', 'E:\\CDR_Logs')
 
 
+# config.yaml 'logging.mongo' bloğu yoksa kullanılan değerler
+DEFAULT_MONGO_LOG_OPTIONS = {
+    'queue_size': 10000,        # Yazılmayı bekleyen en fazla kayıt; dolunca en eski kayıt düşer
+    'batch_size': 500,          # insert_many başına kayıt
+    'flush_interval': 1.0,      # Saniye: kuyruk batch_size'a ulaşmasa da bu aralıkla yazılır
+    'dedupe_seconds': 60,       # WARNING+ : aynı mesajın tekrarları bu süre içinde tek kayda indirgenir
+    'rate_limit': 20,           # WARNING+ : saniyede en fazla kayıt (burst: 5 saniyelik)
+    'ttl_days': 30,             # created_at üzerinde TTL index (null = kapalı)
+    'capped_bytes': None,       # Collection yoksa bu boyutta capped oluşturulur (null = normal collection)
+}
+
+
 class MongoHandler(logging.Handler):
-    def __init__(self, db_name, collection_name, level=logging.NOTSET):
+    """
+    Log kayıtlarını MongoDB'ye arka planda toplu yazar (insert_many), log çağıran thread beklemez.
+    emit kaydı sadece sınırlı kuyruğa ekler; kuyruk doluysa en eski kayıt düşer ve sayılır.
+    Arka plan thread'i kuyruğu batch_size'lık ya da flush_interval'lık gruplar halinde yazar.
+
+    WARNING ve üstü kayıtlarda hata patlamaları sınırlanır: aynı kaynak satırından (dosya:satır) aynı mesajla
+    dedupe_seconds içinde gelen tekrarlar yazılmaz, süre dolunca "N benzer kayıt" özeti yazılır (aynı log
+    çağrısından gelen farklı mesajlar, ör. her başarısız dosya, ayrı kayıtlardır);
+    ayrıca saniyede en fazla rate_limit kayıt yazılır (token bucket).
+    """
+
+    def __init__(self, db_name, collection_name, level=logging.NOTSET, options: dict = None):
         super().__init__(level)
-        self.client = MongoClient(config['mongo']['uri'])
-        self.db = self.client[db_name]
-        self.collection = self.db[collection_name]
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.options = dict(DEFAULT_MONGO_LOG_OPTIONS)
+        self.options.update(options or {})
+        self._collection = None
+        self._reset()
+
+    def _reset(self):
+        """Kuyruk ve thread durumu (fork edilen parse process'lerinde yeniden oluşturulur)"""
+        self._pid = os.getpid()
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._recent = {}  # (dosya, satır, level, mesaj) -> [pencere başı, bastırılan sayı, ilk mesaj]
+        self._tokens = float((self.options['rate_limit'] or 0) * 5)
+        self._tokens_at = time.monotonic()
+        self._reported = (0, 0)  # Log'a bildirilmiş (dropped, rate_limited)
+        self.stats = {'written': 0, 'dropped': 0, 'suppressed': 0, 'rate_limited': 0, 'failed': 0}
+
+    @property
+    def collection(self):
+        # Paylaşılan client ilk yazmada alınır (parse process'leri log yazmadıkça bağlantı açmaz).
+        # Shutdown'da kapatılan client yeniden açılmaz; sonraki kayıtlar sessizce düşer.
+        if self._collection is None:
+            self._collection = get_mongo_client()[self.db_name][self.collection_name]
+            self._prepare_collection(self._collection)
+        return self._collection
+
+    def _prepare_collection(self, collection):
+        """Capped collection / TTL index (log collection sınırsız büyümesin)"""
+        try:
+            capped_bytes = self.options.get('capped_bytes')
+            if capped_bytes and self.collection_name not in collection.database.list_collection_names():
+                collection.database.create_collection(self.collection_name, capped=True, size=capped_bytes)
+            ttl_days = self.options.get('ttl_days')
+            if ttl_days:
+                ttl_seconds = int(ttl_days * 86400)
+                try:
+                    collection.create_index('created_at', name='created_at_ttl', expireAfterSeconds=ttl_seconds)
+                except OperationFailure:
+                    # Index farklı süreyle var: süreyi güncelle
+                    collection.database.command({
+                        'collMod': self.collection_name,
+                        'index': {'name': 'created_at_ttl', 'expireAfterSeconds': ttl_seconds},
+                    })
+        except Exception as e:
+            print(f"Warning: Could not prepare MongoDB log collection: {e}")
+
+    def _allow(self, record) -> bool:
+        """WARNING+ kayıtlar için dedupe ve rate limit (lock altında çağrılır)"""
+        if record.levelno < logging.WARNING:
+            return True
+        now = time.monotonic()
+        if self.options['dedupe_seconds']:
+            key = (record.pathname, record.lineno, record.levelno, record.getMessage())
+            recent = self._recent.get(key)
+            if recent is not None and now - recent[0] < self.options['dedupe_seconds']:
+                recent[1] += 1
+                self.stats['suppressed'] += 1
+                return False
+            if recent is not None and recent[1]:
+                self._queue.append(self._summary(key, recent))
+            self._recent[key] = [now, 0, record.getMessage()]
+
+        rate = self.options['rate_limit']
+        if not rate:
+            return True
+        self._tokens = min(rate * 5, self._tokens + (now - self._tokens_at) * rate)
+        self._tokens_at = now
+        if self._tokens < 1:
+            self.stats['rate_limited'] += 1
+            return False
+        self._tokens -= 1
+        return True
+
+    def _summary(self, key, recent) -> dict:
+        pathname, lineno, levelno, _ = key
+        return {
+            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "created_at": datetime.now(timezone.utc),
+            "level": logging.getLevelName(levelno),
+            "message": f"{recent[1]} similar messages suppressed in {self.options['dedupe_seconds']}s, first: {recent[2]}",
+            "filename": pathname,
+            "line": lineno,
+            "function": None,
+            "exception": None,
+            "suppressed": recent[1],
+        }
 
     def emit(self, record):
         try:
+            if self._pid != os.getpid():
+                self._reset()
             log_entry = self.format(record)
             log_data = {
                 "timestamp": record.asctime,
+                "created_at": datetime.fromtimestamp(record.created, timezone.utc),
                 "level": record.levelname,
                 "message": record.message,
                 "filename": record.pathname,
@@ -32,11 +149,97 @@ class MongoHandler(logging.Handler):
             }
             if record.exc_info:
                 log_data["exception"] = ''.join(traceback.format_exception(*record.exc_info))
-            self.collection.insert_one(log_data)
+
+            with self._condition:
+                if self._closed or not self._allow(record):
+                    return
+                if len(self._queue) >= self.options['queue_size']:
+                    self._queue.popleft()
+                    self.stats['dropped'] += 1
+                self._queue.append(log_data)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='mongo-log-writer', daemon=True)
+                    self._thread.start()
+                if len(self._queue) >= self.options['batch_size']:
+                    self._condition.notify()
         except Exception:
             # MongoDB bağlantı hatası olsa bile service crash etmesin
             pass
 
+    def _take_batch(self) -> list:
+        """Yazılacak kayıtlar + süresi dolan tekrar özetleri + yazılmayan kayıt bildirimi (lock altında)"""
+        now = time.monotonic()
+        for key, recent in list(self._recent.items()):
+            if now - recent[0] >= self.options['dedupe_seconds']:
+                del self._recent[key]
+                if recent[1]:
+                    self._queue.append(self._summary(key, recent))
+
+        dropped = self.stats['dropped'] - self._reported[0]
+        rate_limited = self.stats['rate_limited'] - self._reported[1]
+        if dropped or rate_limited:
+            self._reported = (self.stats['dropped'], self.stats['rate_limited'])
+            self._queue.append({
+                "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+                "created_at": datetime.now(timezone.utc),
+                "level": "WARNING",
+                "message": f"Mongo log lines not written: {dropped} dropped (queue full), {rate_limited} rate limited",
+                "filename": __file__,
+                "line": None,
+                "function": None,
+                "exception": None,
+            })
+
+        batch_size = self.options['batch_size']
+        return [self._queue.popleft() for _ in range(min(batch_size, len(self._queue)))]
+
+    def _write(self, batch: list):
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            self.stats['written'] += len(batch)
+        except Exception:
+            # MongoDB erişilemezse kayıtlar düşer (dosya log'unda mevcut), kuyruk büyümez
+            self.stats['failed'] += len(batch)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._queue) < self.options['batch_size']:
+                    self._condition.wait(self.options['flush_interval'])
+                batch = self._take_batch()
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            if closed:
+                with self._condition:
+                    if not self._queue:
+                        return
+
+    def flush(self):
+        """Kuyruktaki kayıtları hemen yaz (çağıran thread'de)"""
+        while True:
+            with self._condition:
+                if self._pid != os.getpid():
+                    return
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        """Kalan kayıtları yaz ve arka plan thread'ini durdur"""
+        with self._condition:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+            self._condition.notify()
+        if thread is not None:
+            thread.join(timeout=10)
+        super().close()
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            return dict(self.stats, queued=len(self._queue))
+
 
 class SafeFileHandler(logging.FileHandler):
     """Dizin yoksa oluşturan güvenli file handler"""
@@ -69,7 +272,8 @@ def setup_logger(name, level=logging.INFO):
     try:
         mongo_handler = MongoHandler(
             db_name=config['mongo']['database'], 
-            collection_name=config['mongo']['log_collection']
+            collection_name=config['mongo']['log_collection'],
+            options=(config.get('logging') or {}).get('mongo'),
         )
         mongo_handler.setFormatter(formatter)
         mongo_handler.setLevel(logging.INFO)
@@ -96,4 +300,11 @@ def setup_logger(name, level=logging.INFO):
     return logger
 
 # Ana logger'ı oluşturun
-main_logger = setup_logger('main_logger')
\ No newline at end of file
+main_logger = setup_logger('main_logger')
+
+
+def stop_mongo_logging():
+    """Bekleyen Mongo log kayıtlarını yaz ve yazıcı thread'ini durdur (paylaşılan client kapatılmadan önce)"""
+    for handler in main_logger.handlers:
+        if isinstance(handler, MongoHandler):
+            handler.close()
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+from helpers.config import load_config
+
+config = load_config()
+
+# helpers.logger bu modülü kullanır (MongoHandler); döngüsel import olmaması için logger ismiyle alınır
+logger = logging.getLogger('main_logger')
+
+# config.yaml 'mongo.pool' bloğu yoksa kullanılan değerler
+DEFAULT_POOL_OPTIONS = {
+    'max_pool_size': 50,
+    'min_pool_size': 10,
+    'max_idle_time_ms': 30000,
+    'wait_queue_timeout_ms': None,
+    'server_selection_timeout_ms': 5000,
+    'connect_timeout_ms': 10000,
+}
+
+
+class PoolStatsListener(ConnectionPoolListener):
+    """
+    Connection pool olaylarından istatistik: kullanımdaki bağlantı sayısı ve
+    bağlantı almak için bekleme süresi (pool dolu ise wait queue).
+    Checkout çağıran thread'de senkron yapıldığı için başlangıç zamanı thread-local tutulur.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.pool_clears = 0
+
+    def _waited(self) -> float:
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.monotonic() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.monotonic()
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # Kullanılmayan olaylar
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.checkout_failures
+            return {
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'wait_avg_ms': round(self.wait_total / attempts * 1000, 2) if attempts else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 2),
+                'connections_open': self.connections_created - self.connections_closed,
+                'pool_clears': self.pool_clears,
+            }
+
+
+# Tüm modüllerin paylaştığı tek client (tek connection pool ve tek server monitoring)
+_client = None
+_client_lock = threading.Lock()
+pool_stats = PoolStatsListener()
+
+
+def get_pool_options() -> dict:
+    options = dict(DEFAULT_POOL_OPTIONS)
+    options.update(config['mongo'].get('pool') or {})
+    return options
+
+
+def get_mongo_client() -> MongoClient:
+    """Paylaşılan MongoClient'ı döndür (ilk çağrıda oluşturulur)"""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is not None:
+            return _client
+        options = get_pool_options()
+        _client = MongoClient(
+            config['mongo']['uri'],
+            maxPoolSize=options['max_pool_size'],
+            minPoolSize=options['min_pool_size'],
+            maxIdleTimeMS=options['max_idle_time_ms'],
+            waitQueueTimeoutMS=options['wait_queue_timeout_ms'],
+            serverSelectionTimeoutMS=options['server_selection_timeout_ms'],
+            connectTimeoutMS=options['connect_timeout_ms'],
+            retryWrites=True,
+            event_listeners=[pool_stats],
+        )
+    # Lock dışında: log kaydı MongoHandler üzerinden bu client'ı kullanır
+    logger.info(
+        f"MongoDB client initialized with connection pool "
+        f"(maxPoolSize={options['max_pool_size']}, minPoolSize={options['min_pool_size']})"
+    )
+    return _client
+
+
+def get_database():
+    return get_mongo_client()[config['mongo']['database']]
+
+
+def get_pool_stats() -> dict:
+    """Kullanımdaki bağlantılar ve bağlantı bekleme süreleri"""
+    stats = pool_stats.snapshot()
+    stats['max_pool_size'] = get_pool_options()['max_pool_size']
+    return stats
+
+
+def close_mongo_client():
+    """Paylaşılan client'ı kapat (shutdown). Sonrasında kapanmış client'ı kullanan yazmalar hemen hata verir."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        logger.info(f"Closing MongoDB client. Pool stats: {get_pool_stats()}")
+        client.close()
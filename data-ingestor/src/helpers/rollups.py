@@ -0,0 +1,268 @@
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+from zoneinfo import ZoneInfo
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from helpers.bulk_writer import DUPLICATE_KEY_ERROR
+from helpers.logger import main_logger as logger
+from helpers.index_manager import IndexManager, IndexSpec
+
+PERIOD_HOUR = 'hour'
+PERIOD_DAY = 'day'
+
+SCOPE_ALL = 'all'                 # Tüm çağrılar
+SCOPE_NUMBER = 'number'           # Dahili numara başına
+SCOPE_DEPARTMENT = 'department'   # Departman başına
+
+# cdrModel.CallDirection
+_INCOMING = 1
+_OUTGOING = 2
+_INTERNAL = 3
+
+# Dashboard sorguları: dönem + kapsam + zaman aralığı, numara/departman bazında zaman aralığı
+ROLLUP_INDEXES = [
+    IndexSpec('period_scope_start', [('period', ASCENDING), ('scope', ASCENDING), ('start', ASCENDING)]),
+    IndexSpec('scope_key_period_start',
+              [('scope', ASCENDING), ('key', ASCENDING), ('period', ASCENDING), ('start', ASCENDING)]),
+]
+
+# Rebuild'de tek seferde toplanan ham doküman sayısı
+REBUILD_BATCH_SIZE = 10000
+
+# Rollup için okunan alanlar (rebuild projeksiyonu)
+_PROJECTION = {
+    'pk_id': 1,
+    'globalCall.cluster_id': 1,
+    'dateTime.origination': 1,
+    'dateTime.connect': 1,
+    'duration': 1,
+    'callDirection': 1,
+    'callingParty.number': 1,
+    'callingParty.user': 1,
+    'finalCalledParty.number': 1,
+    'finalCalledParty.user': 1,
+}
+
+
+def _as_utc(value: datetime) -> datetime:
+    # PyMongo varsayılan olarak tz'siz UTC datetime döndürür
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _party_number(document, party: str) -> Optional[str]:
+    value = document.get(party) or {}
+    return value.get('number') or None
+
+
+def _party_department(document, party: str, directory):
+    """
+    Kayda gömülü kullanıcının department_id'si: kaydı sınıflandıran dizin snapshot'ı (directoryVersion) ile
+    aynıdır. user alanı olmayan eski kayıtlarda (rebuild) güncel dizine bakılır.
+    """
+    value = document.get(party) or {}
+    if 'user' in value:
+        return (value['user'] or {}).get('department_id')
+    number = value.get('number')
+    return directory.department_of(number) if directory is not None and number else None
+
+
+def _claim_id(document) -> Optional[dict]:
+    """Kaydın claim anahtarı: unique pk_id index'i ile aynı (pk_id, cluster); pk_id'si olmayanlar için None"""
+    pk_id = document.get('pk_id')
+    if not isinstance(pk_id, str):
+        return None
+    return {'pk_id': pk_id, 'cluster_id': (document.get('globalCall') or {}).get('cluster_id')}
+
+
+class CallRollups:
+    """
+    Ingest sırasında güncellenen saatlik / günlük özet dokümanları (dashboard raporları ham veriyi taramasın).
+    Her özet bir dönem (hour / day, gün sınırları timezone'a göre), yön (callDirection) ve kapsam
+    (tüm çağrılar / dahili numara / departman) içindir ve sayaçları tutar:
+        total, answered (connect var ve duration > 0), missed (connect yok ya da duration 0; backend raporları ile aynı), duration (saniye toplamı)
+
+    Sayaçlar batch başına tek bulk_write ile $inc upsert edilir. Her kayıt bir kez sayılır: sayılmadan önce
+    claims collection'ına (pk_id, cluster) anahtarı ile eklenir, duplicate key alan kayıtlar daha önce sayılmıştır.
+    write_batch collection'da bulunan tüm dokümanları (duplicate'ler dahil) bildirir; böylece yazıldıktan
+    sonra sayılamamış kayıtlar (geçici hata sonrası tekrar deneme, insert ile rollup arasında çökme ve
+    dosyanın yeniden işlenmesi) tekrar geldiklerinde sayılır, daha önce sayılanlar tekrar sayılmaz.
+    Claim ile $inc arasında bir hata olursa sayaçlar eksik kalır (loglanır); o aralık rebuild ile ham
+    veriden yeniden hesaplanır.
+
+    Numara kapsamı: gelen çağrıda aranan (finalCalledParty), giden çağrıda arayan (callingParty),
+    dahili çağrıda ikisi de. Departman, kayda gömülü kullanıcının (party.user) department_id'sidir.
+    """
+
+    def __init__(self, collection, claims, tz: str = 'Europe/Istanbul',
+                 directory: Optional[Callable[[], object]] = None):
+        self.collection = collection
+        self.claims = claims  # Sayılmış kayıtların (pk_id, cluster) anahtarları
+        self.timezone = ZoneInfo(tz)
+        self.directory = directory  # Güncel UserDirectory snapshot'ı (user alanı olmayan eski kayıtların departmanı)
+        self.failed_updates = 0
+
+    def ensure_indexes(self):
+        """ROLLUP_INDEXES'i oluştur (küçük collection, senkron)"""
+        IndexManager(self.collection, ROLLUP_INDEXES).ensure_all()
+
+    def _bucket_starts(self, origination: datetime):
+        """(saat başı, yerel gün başı) UTC olarak"""
+        origination = _as_utc(origination)
+        hour = origination.replace(minute=0, second=0, microsecond=0)
+        # Yerel gece yarısı, offset o günün kendi offset'i (DST değişimi olan günler dahil)
+        return hour, self._local_midnight(origination.astimezone(self.timezone))
+
+    def _scopes(self, document, direction, directory):
+        """Çağrının sayıldığı kapsamlar: [(scope, key), ...]"""
+        parties = []
+        if direction in (_OUTGOING, _INTERNAL):
+            parties.append('callingParty')
+        if direction in (_INCOMING, _INTERNAL):
+            parties.append('finalCalledParty')
+        parties = [party for party in parties if _party_number(document, party)]
+
+        scopes = [(SCOPE_ALL, None)]
+        scopes.extend((SCOPE_NUMBER, number) for number in dict.fromkeys(
+            _party_number(document, party) for party in parties
+        ))
+        departments = dict.fromkeys(
+            department for department in (_party_department(document, party, directory) for party in parties)
+            if department is not None
+        )
+        scopes.extend((SCOPE_DEPARTMENT, department) for department in departments)
+        return scopes
+
+    def accumulate(self, documents: Iterable, deltas: Optional[dict] = None) -> dict:
+        """
+        Dokümanların sayaç artışlarını dönem/yön/kapsam anahtarına göre topla.
+        Returns: {(period, start, direction, scope, key): [total, answered, missed, duration]}
+        """
+        if deltas is None:
+            deltas = {}
+        directory = self.directory() if self.directory is not None else None
+        for document in documents:
+            date_time = document.get('dateTime') or {}
+            origination = date_time.get('origination')
+            if origination is None:
+                continue
+            direction = document.get('callDirection')
+            duration = document.get('duration') or 0
+            connected = date_time.get('connect') is not None
+            answered = 1 if connected and duration > 0 else 0
+            missed = 1 - answered
+
+            hour, day = self._bucket_starts(origination)
+            for scope, key in self._scopes(document, direction, directory):
+                for period, start in ((PERIOD_HOUR, hour), (PERIOD_DAY, day)):
+                    counters = deltas.get((period, start, direction, scope, key))
+                    if counters is None:
+                        counters = deltas[(period, start, direction, scope, key)] = [0, 0, 0, 0]
+                    counters[0] += 1
+                    counters[1] += answered
+                    counters[2] += missed
+                    counters[3] += duration
+        return deltas
+
+    def apply(self, deltas: dict):
+        """Sayaç artışlarını tek unordered bulk_write ile $inc upsert et"""
+        if not deltas:
+            return
+        operations = []
+        for (period, start, direction, scope, key), (total, answered, missed, duration) in deltas.items():
+            operations.append(UpdateOne(
+                {'_id': f"{period}|{start:%Y-%m-%dT%H}|{direction}|{scope}|{key if key is not None else ''}"},
+                {
+                    '$setOnInsert': {
+                        'period': period, 'start': start, 'direction': direction, 'scope': scope, 'key': key,
+                    },
+                    '$inc': {'total': total, 'answered': answered, 'missed': missed, 'duration': duration},
+                },
+                upsert=True
+            ))
+        self.collection.bulk_write(operations, ordered=False)
+
+    def claim(self, documents: list) -> list:
+        """
+        Dokümanları sayılmış olarak işaretle (claims'e unordered insert).
+        Returns: daha önce sayılmamış dokümanlar (pk_id'si olmayanlar her zaman)
+        """
+        unkeyed = []
+        keyed = []
+        for document in documents:
+            claim_id = _claim_id(document)
+            if claim_id is None:
+                unkeyed.append(document)
+            else:
+                keyed.append((claim_id, document))
+        if not keyed:
+            return unkeyed
+
+        try:
+            self.claims.insert_many([{'_id': claim_id} for claim_id, _ in keyed], ordered=False)
+            counted = set()
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            counted = {error['index'] for error in write_errors}
+        return unkeyed + [document for index, (_, document) in enumerate(keyed) if index not in counted]
+
+    def update(self, documents: list):
+        """
+        Collection'da bulunan dokümanlar için rollup'ları güncelle (write_batch'ten, thread pool'da).
+        Daha önce sayılmış dokümanlar atlanır. Hata ingestion'ı durdurmaz: loglanır, ilgili aralık rebuild ile düzeltilir.
+        """
+        try:
+            self.apply(self.accumulate(self.claim(documents)))
+        except Exception as e:
+            self.failed_updates += 1
+            originations = [
+                (document.get('dateTime') or {}).get('origination') for document in documents
+            ]
+            originations = [value for value in originations if value is not None]
+            span = f"{min(originations)} - {max(originations)}" if originations else "unknown range"
+            logger.error(f"Rollup update failed for {len(documents)} records ({span}), rebuild this range: {e}")
+
+    def _local_midnight(self, date) -> datetime:
+        return datetime(date.year, date.month, date.day, tzinfo=self.timezone).astimezone(timezone.utc)
+
+    def rebuild(self, source_collection, start_date, end_date) -> int:
+        """
+        [start_date, end_date) yerel gün aralığının rollup'larını ham veriden yeniden oluştur.
+        Aralıktaki rollup dokümanları silinir, ham kayıtlar taranıp aynı toplama ile yeniden yazılır.
+        Aralığa o sırada yazılan kayıtlar çift sayılabilir; servis durdurulmuşken ya da kapanmış günler için çalıştırın.
+        Returns: taranan kayıt sayısı
+        """
+        start = self._local_midnight(start_date)
+        end = self._local_midnight(end_date)
+        deleted = self.collection.delete_many({'start': {'$gte': start, '$lt': end}}).deleted_count
+        logger.info(f"Rollup rebuild {start_date} - {end_date}: {deleted} rollup documents removed")
+
+        started = time.perf_counter()
+        scanned = 0
+        deltas = {}
+        cursor = source_collection.find(
+            {'dateTime.origination': {'$gte': start.replace(tzinfo=None), '$lt': end.replace(tzinfo=None)}},
+            _PROJECTION,
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                # Ham verideki tüm kayıtlar sayılır; claim'ler de tamamlanır (ör. --no-rollups backfill sonrası)
+                self.claim(batch)
+                self.accumulate(batch, deltas)
+                scanned += len(batch)
+                batch = []
+        self.claim(batch)
+        self.accumulate(batch, deltas)
+        scanned += len(batch)
+        self.apply(deltas)
+
+        logger.info(
+            f"Rollup rebuild {start_date} - {end_date}: {scanned} records, {len(deltas)} rollup documents "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return scanned
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Callable, List, Optional, Tuple
+from bson.raw_bson import RawBSONDocument
+from helpers.logger import main_logger as logger
+from helpers.write_controller import TRANSIENT_WRITE_ERRORS
+
+# Kayıt başlığı: payload uzunluğu + CRC32 (yarım yazılmış / bozuk kayıt tespiti)
+_RECORD_HEADER = struct.Struct('<II')
+_SEGMENT_SUFFIX = '.spool'
+_CORRUPT_SUFFIX = '.corrupt'  # CRC kontrolünden geçmeyen segment kenara alınır (000000000001.spool.corrupt)
+_POSITION_FILE = 'replay.pos'
+
+
+class SpoolFullError(Exception):
+    """Spool disk limiti dolu: batch spool'a yazılamadı"""
+
+
+def _segment_name(sequence: int) -> str:
+    return f"{sequence:012d}{_SEGMENT_SUFFIX}"
+
+
+def _split_documents(payload: bytes) -> List[RawBSONDocument]:
+    """Art arda eklenmiş BSON dokümanlarını ayır (her doküman int32 uzunlukla başlar)"""
+    documents = []
+    position = 0
+    while position < len(payload):
+        length = int.from_bytes(payload[position:position + 4], 'little')
+        documents.append(RawBSONDocument(payload[position:position + length]))
+        position += length
+    return documents
+
+
+def _is_torn(file, size: int) -> bool:
+    """Geçerli kayıtlardan sonraki kısım yarım yazılmış bir kayıt mı (CRC'si tutmayan tam kayıt değil)"""
+    header = file.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        return True
+    length, _ = _RECORD_HEADER.unpack(header)
+    return file.tell() + length > size
+
+
+def _read_record(file) -> Optional[bytes]:
+    """Sıradaki kaydın payload'ı; dosya sonu ya da yarım/bozuk kayıtta None"""
+    header = file.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        return None
+    length, checksum = _RECORD_HEADER.unpack(header)
+    payload = file.read(length)
+    if len(payload) < length or zlib.crc32(payload) != checksum:
+        return None
+    return payload
+
+
+class BatchSpool:
+    """
+    MongoDB'ye yazılamayan batch'ler için diskte append-only spool.
+    Batch'ler encode edilmiş BSON olarak segment dosyalarına (000000000001.spool, ...) eklenir;
+    her kayıt fsync edilir, yani append dönünce batch kalıcıdır.
+
+    replay() en eski segmentten başlayarak batch'leri sırayla yazar ve her başarılı batch'ten sonra
+    pozisyonu (replay.pos) atomik olarak kaydeder; tamamen yazılan segment silinir. Bozuk kayıt içeren segment
+    silinmez, .corrupt uzantısıyla kenara alınır ve disk kullanımına sayılmaya devam eder. Replay ortasında
+    çökme olursa son batch tekrar yazılır, unique pk_id index'i tekrarı eler (kayıp ya da duplicate olmaz).
+    Toplam boyut max_bytes'ı aşacaksa append SpoolFullError verir (disk kullanımı sınırlı).
+    """
+
+    def __init__(self, directory: str, max_bytes: int, segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()   # append thread pool'dan paralel çağrılır
+        self._active_bytes = None       # Yazılan (aktif) segmentin boyutu; None = sonraki append yeni segment açar
+        self._sequence = 0              # Son segment numarası
+        self._disk_bytes = 0
+        self._pending_bytes = 0         # Henüz replay edilmemiş byte'lar
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    @property
+    def pending(self) -> bool:
+        """Replay edilmeyi bekleyen batch var mı"""
+        return self._pending_bytes > 0
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(_SEGMENT_SUFFIX) and name[:-len(_SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _path(self, sequence: int) -> str:
+        return os.path.join(self.directory, _segment_name(sequence))
+
+    def _corrupt_files(self) -> List[str]:
+        suffix = _SEGMENT_SUFFIX + _CORRUPT_SUFFIX
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(suffix))
+
+    def _load_position(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, _POSITION_FILE)) as file:
+                position = json.load(file)
+            return position['segment'], position['offset']
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def _save_position(self, segment: int, offset: int):
+        path = os.path.join(self.directory, _POSITION_FILE)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'segment': segment, 'offset': offset}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    def _recover(self):
+        """
+        Başlangıçta: son segmentteki yarım kaydı kes, boyutları hesapla. Yeni batch'ler yeni segmente yazılır.
+        Sadece dosya sonunu aşan (yazılırken kesilmiş) kayıt kesilir; CRC'si tutmayan tam kayıt replay'de
+        segmentle birlikte kenara alınır.
+        """
+        segments = self._segments()
+        if segments:
+            last_path = self._path(segments[-1])
+            with open(last_path, 'r+b') as file:
+                size = os.fstat(file.fileno()).st_size
+                valid = 0
+                while _read_record(file) is not None:
+                    valid = file.tell()
+                file.seek(valid)
+                if valid < size and _is_torn(file, size):
+                    logger.warning(f"Spool segment {last_path} has an incomplete record, truncating at {valid}")
+                    file.truncate(valid)
+            self._sequence = segments[-1]
+
+        replay_segment, replay_offset = self._load_position()
+        for sequence in segments:
+            size = os.path.getsize(self._path(sequence))
+            self._disk_bytes += size
+            self._pending_bytes += size - (min(replay_offset, size) if sequence == replay_segment else 0)
+
+        if self._pending_bytes:
+            logger.warning(
+                f"Spool {self.directory} has {self._pending_bytes} bytes from a previous run "
+                f"in {len(segments)} segments, will be replayed"
+            )
+
+        corrupt = self._corrupt_files()
+        if corrupt:
+            self._disk_bytes += sum(os.path.getsize(os.path.join(self.directory, name)) for name in corrupt)
+            logger.error(f"Spool {self.directory} has corrupt segments kept for inspection: {corrupt}")
+
+    def append(self, documents: List[RawBSONDocument]):
+        """Batch'i spool'a ekle ve diske yaz (fsync). Limit doluysa SpoolFullError."""
+        payload = b''.join(document.raw for document in documents)
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._disk_bytes + len(record) > self.max_bytes:
+                raise SpoolFullError(
+                    f"Spool {self.directory} is full ({self._disk_bytes}/{self.max_bytes} bytes)"
+                )
+            if self._active_bytes is None or self._active_bytes >= self.segment_bytes:
+                self._rotate()
+            # Segment her append'te açılıp kapanır: yazma hata verirse handle sızmaz, yarım kayıt geri alınır
+            with open(self._path(self._sequence), 'ab') as file:
+                try:
+                    file.write(record)
+                    file.flush()
+                    os.fsync(file.fileno())
+                except OSError:
+                    file.truncate(self._active_bytes)
+                    raise
+            self._active_bytes += len(record)
+            self._disk_bytes += len(record)
+            self._pending_bytes += len(record)
+
+    def _rotate(self):
+        """Sonraki append'ler için yeni segmente geç (lock altında çağrılır)"""
+        self._sequence += 1
+        self._active_bytes = 0
+
+    def _next_segment(self) -> Optional[int]:
+        """Replay edilecek en eski segment; aktif segment ise önce kapatılır (yeni batch'ler yenisine yazılır)"""
+        with self._lock:
+            segments = self._segments()
+            if not segments:
+                return None
+            if self._active_bytes is not None and segments[0] == self._sequence:
+                self._active_bytes = None
+            return segments[0]
+
+    def replay(self, write_batch: Callable[[List[RawBSONDocument]], object]) -> Tuple[int, int]:
+        """
+        Bekleyen batch'leri sırayla write_batch ile yaz (thread'de çalışır).
+        write_batch hata verirse replay durur, pozisyon son başarılı batch'te kalır ve hata iletilir.
+        Returns: (batches, documents)
+        """
+        batches = documents = 0
+        while True:
+            sequence = self._next_segment()
+            if sequence is None:
+                return batches, documents
+
+            path = self._path(sequence)
+            replay_segment, offset = self._load_position()
+            if replay_segment != sequence:
+                offset = 0
+
+            corrupt = False
+            with open(path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                file.seek(offset)
+                while True:
+                    payload = _read_record(file)
+                    if payload is None:
+                        corrupt = file.tell() < size
+                        break
+                    batch = _split_documents(payload)
+                    write_batch(batch)
+                    offset = file.tell()
+                    self._save_position(sequence, offset)
+                    with self._lock:
+                        self._pending_bytes -= _RECORD_HEADER.size + len(payload)
+                    batches += 1
+                    documents += len(batch)
+
+            if corrupt:
+                # Kalan batch'ler kaybolmasın: dosya kenara alınır, disk limiti içinde sayılmaya devam eder
+                corrupt_path = path + _CORRUPT_SUFFIX
+                os.replace(path, corrupt_path)
+                logger.error(
+                    f"Spool segment {path} is corrupt after offset {offset}, "
+                    f"{size - offset} bytes not replayed; moved to {corrupt_path}"
+                )
+                with self._lock:
+                    self._pending_bytes -= size - offset
+            else:
+                os.remove(path)
+                with self._lock:
+                    self._disk_bytes -= size
+            with self._lock:
+                if not self._segments():
+                    self._pending_bytes = 0
+            self._save_position(sequence + 1, 0)
+
+    def close(self):
+        with self._lock:
+            self._active_bytes = None
+
+    def get_stats(self) -> dict:
+        return {
+            'pending_bytes': self._pending_bytes,
+            'disk_bytes': self._disk_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class SpoolReplayer:
+    """
+    Spool'daki batch'leri arka planda MongoDB'ye yazar (DirectoryManager gibi asyncio görevi).
+    Her interval saniyede bekleyen batch varsa replay dener; MongoDB hâlâ erişilemiyorsa bir sonraki denemeye kalır.
+    """
+
+    def __init__(self, spool: BatchSpool, write_batch: Callable[[List[RawBSONDocument]], object],
+                 interval: int = 10):
+        self.spool = spool
+        self.write_batch = write_batch
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def replay(self) -> bool:
+        """Bekleyen batch'leri yaz. Returns: spool boşaldı mı"""
+        if not self.spool.pending:
+            return True
+        try:
+            batches, documents = await asyncio.to_thread(self.spool.replay, self.write_batch)
+        except TRANSIENT_WRITE_ERRORS as e:
+            logger.debug(f"Spool replay postponed, MongoDB unavailable: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Spool replay failed: {e}")
+            return False
+        logger.info(f"Spool replayed: {batches} batches, {documents} documents")
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.replay()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,47 @@
+import time
+from typing import Optional
+
+
+class StageMetrics:
+    """
+    Bir ingestion pipeline aşamasının sayaçları.
+    depth: aşamanın kuyruğunda bekleyen / işlenmekte olan iş sayısı (backpressure göstergesi)
+    items / rows: tamamlanan iş ve satır sayısı; rows_per_sec ilk işten bu yana ortalama
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.depth = 0
+        self.items = 0
+        self.rows = 0
+        self._started: Optional[float] = None
+
+    def enqueue(self, count: int = 1):
+        if self._started is None:
+            self._started = time.monotonic()
+        self.depth += count
+
+    def dequeue(self, count: int = 1):
+        self.depth -= count
+
+    def record(self, items: int = 1, rows: int = 0):
+        if self._started is None:
+            self._started = time.monotonic()
+        self.items += items
+        self.rows += rows
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started is not None else 0
+        return {
+            'depth': self.depth,
+            'items': self.items,
+            'rows': self.rows,
+            'rows_per_sec': round(self.rows / elapsed) if elapsed else 0,
+        }
+
+    def __str__(self):
+        stats = self.snapshot()
+        return f"{self.name}: depth {stats['depth']}, {stats['items']} items, {stats['rows']} rows, {stats['rows_per_sec']} rows/s"
@@ -0,0 +1,83 @@
+from datetime import date, datetime, time, timezone
+from functools import lru_cache
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo
+from helpers.config import load_config
+
+# Farklı dakika sayısı; bir dosyadaki kayıtlar birkaç saati kapsar
+_MINUTE_CACHE_SIZE = 16384
+
+
+def _parse_time(value) -> time:
+    """'07:45' -> time(7, 45) (YAML 07:45'i dakika cinsinden int olarak da okuyabilir)"""
+    if isinstance(value, int):
+        return time(value // 60, value % 60)
+    return time.fromisoformat(str(value))
+
+
+class CalendarBuckets:
+    """
+    Kayıt zamanının yerel takvim alanları (raporlar sorgu anında timezone hesabı yapmasın):
+        day '2024-03-15', hour 14, isoWeek '2024-W11', month '2024-03', weekday 5 (ISO, Pazartesi = 1),
+        businessHours: mesai günü, tatil değil ve start <= saat:dakika < end
+    Alanlar sadece dakikaya bağlıdır; sonuç epoch dakikası başına cache'lenir ve paylaşılır (değiştirilmemeli).
+    """
+
+    def __init__(self, tz: str = 'Europe/Istanbul', business_start='07:45', business_end='16:45',
+                 business_days: Iterable[int] = (1, 2, 3, 4, 5, 6, 7), holidays: Iterable = ()):
+        self.timezone = ZoneInfo(tz)
+        self.business_start = _parse_time(business_start)
+        self.business_end = _parse_time(business_end)
+        self.business_days = frozenset(int(day) for day in business_days)
+        self.holidays = frozenset(
+            holiday if isinstance(holiday, date) else date.fromisoformat(str(holiday)) for holiday in holidays
+        )
+        self._minute_buckets = lru_cache(maxsize=_MINUTE_CACHE_SIZE)(self._compute)
+
+    @classmethod
+    def from_config(cls, calendar_config: Optional[dict]) -> 'CalendarBuckets':
+        calendar_config = calendar_config or {}
+        business_hours = calendar_config.get('business_hours') or {}
+        return cls(
+            tz=calendar_config.get('timezone', 'Europe/Istanbul'),
+            business_start=business_hours.get('start', '07:45'),
+            business_end=business_hours.get('end', '16:45'),
+            business_days=business_hours.get('weekdays') or (1, 2, 3, 4, 5, 6, 7),
+            holidays=calendar_config.get('holidays') or (),
+        )
+
+    def buckets(self, value: Optional[datetime]) -> Optional[dict]:
+        """UTC zamanın yerel takvim alanları (tz'siz değerler UTC kabul edilir, MongoDB'den okunanlar gibi)"""
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return self._minute_buckets(int(value.timestamp()) // 60)
+
+    def _compute(self, minute: int) -> dict:
+        local = datetime.fromtimestamp(minute * 60, tz=self.timezone)
+        iso = local.isocalendar()
+        business = (
+            iso.weekday in self.business_days
+            and local.date() not in self.holidays
+            and self.business_start <= local.time() < self.business_end
+        )
+        return {
+            'day': f"{local:%Y-%m-%d}",
+            'hour': local.hour,
+            'isoWeek': f"{iso.year}-W{iso.week:02d}",
+            'month': f"{local:%Y-%m}",
+            'weekday': iso.weekday,
+            'businessHours': business,
+        }
+
+
+_default_calendar: Optional[CalendarBuckets] = None
+
+
+def get_calendar() -> CalendarBuckets:
+    """config.yaml 'calendar' bloğundan takvim (process başına bir kez, parse process'lerinde de)"""
+    global _default_calendar
+    if _default_calendar is None:
+        _default_calendar = CalendarBuckets.from_config(load_config().get('calendar'))
+    return _default_calendar
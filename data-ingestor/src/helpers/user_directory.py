@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+from helpers.logger import main_logger as logger
+
+# Türkiye ülke kodu; '+90', '0090' ve '90' ile başlayan uzun numaralardan atılır
+COUNTRY_CODE = '90'
+# Normalize edilmiş numara -> dahili mi? cache'inin üst sınırı
+_LOOKUP_CACHE_SIZE = 100000
+# Arama numaralarından atılan ayraçlar
+_SEPARATORS = str.maketrans('', '', '-().')
+
+
+def normalize_number(number) -> Optional[str]:
+    """
+    Telefon numarasını karşılaştırma için sadeleştir:
+    boşluklar ve '#'/'*' sonekleri atılır, ülke kodu ve baştaki sıfırlar kaldırılır.
+    '+905321234567', '05321234567' -> '5321234567'
+    """
+    if number is None:
+        return None
+    if isinstance(number, float) and number.is_integer():
+        number = int(number)  # Excel'den sayı olarak gelen dahililer (8036.0)
+
+    text = str(number).strip().replace(' ', '').rstrip('#*')
+    if text.startswith('+'):
+        text = text[1:]
+        if text.startswith(COUNTRY_CODE):
+            text = text[len(COUNTRY_CODE):]
+    elif text.startswith('00' + COUNTRY_CODE):
+        text = text[2 + len(COUNTRY_CODE):]
+    elif text.startswith(COUNTRY_CODE) and len(text) == 12:
+        text = text[len(COUNTRY_CODE):]
+
+    text = text.lstrip('0')
+    return text or None
+
+
+@lru_cache(maxsize=_LOOKUP_CACHE_SIZE)
+def number_digits(number) -> Optional[str]:
+    """
+    Arama için normalize edilmiş, sadece rakamlardan oluşan numara (ayraçlar atılır).
+    '+90 (532) 123-45-67' -> '5321234567'; harf içeren numaralar (URI, köprü adları) None
+    """
+    normalized = normalize_number(number)
+    if normalized is None:
+        return None
+    digits = normalized.translate(_SEPARATORS)
+    return digits if digits.isdigit() and digits.isascii() else None
+
+
+def _parse_range(rule: str):
+    start, end = (part.strip() for part in rule.split('-', 1))
+    if len(start) != len(end) or not start.isdigit() or not end.isdigit():
+        raise ValueError(f"Invalid directory range rule: {rule}")
+    return len(start), int(start), int(end)
+
+
+class UserDirectory:
+    """
+    Dahili numara dizini. `number in directory` kontrolü O(1) amortize:
+    önce ham numara frozenset'te aranır, sonra normalize edilmiş hali ve
+    DID blokları için prefix/aralık kuralları (ör. '8036', '80360000-80369999').
+    Sonuçlar numara başına cache'lenir.
+
+    blocks: etiket -> numara prefix'leri (ör. {'merkez': ['8036']}); blocks_of ile normalize numaranın
+    etiketleri okunur (arama alanları için izlenen numara blokları).
+
+    profiles: numara -> kullanıcı bilgisi {'name', 'department_id', 'department'} (CDR'lara gömülür,
+    profile_of / department_of ile okunur). Değeri olmayan alanlar profilde yer almaz.
+
+    Bir snapshot oluşturulduktan sonra değişmez; `version` içerikten türetilir
+    (aynı numara listesi, profiller, bloklar ve kurallar her zaman aynı version'ı verir).
+    """
+
+    def __init__(self, phone_numbers: Iterable, prefixes: Iterable[str] = (), ranges: Iterable[str] = (),
+                 profiles: Optional[dict] = None, blocks: Optional[dict] = None):
+        numbers = [number for number in phone_numbers if number is not None and number != '']
+        self._exact = frozenset(str(number).strip() for number in numbers)
+        self._normalized = frozenset(filter(None, (normalize_number(number) for number in numbers)))
+        self._prefixes = tuple(str(prefix) for prefix in prefixes)
+        self._ranges = tuple(_parse_range(str(rule)) for rule in ranges)
+        self._cache = {}
+        self._profiles = {}
+        for number, profile in (profiles or {}).items():
+            profile = {key: value for key, value in profile.items() if value is not None}
+            if number is not None and profile:
+                self._profiles[str(number).strip()] = profile
+        self._normalized_profiles = {
+            normalize_number(number): profile for number, profile in self._profiles.items()
+            if normalize_number(number)
+        }
+        self._profile_cache = {}
+        self._blocks = tuple(
+            (str(prefix), str(tag)) for tag, prefixes in (blocks or {}).items()
+            for prefix in ([prefixes] if isinstance(prefixes, (str, int)) else prefixes or ())
+        )
+        self._block_cache = {}
+
+        signature = '\n'.join(sorted(self._exact)) + '|' + ','.join(self._prefixes) + '|' + ','.join(map(str, ranges))
+        if self._profiles:
+            signature += '|' + ','.join(
+                f"{number}={sorted(profile.items())}" for number, profile in sorted(self._profiles.items())
+            )
+        if self._blocks:
+            signature += '|' + ','.join(f"{tag}={prefix}" for prefix, tag in self._blocks)
+        self.version = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:12]
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def __len__(self):
+        return len(self._exact)
+
+    def __getstate__(self):
+        # Parse process'lerine gönderilirken lookup cache'i taşınmaz
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        state['_profile_cache'] = {}
+        state['_block_cache'] = {}
+        return state
+
+    def __contains__(self, number) -> bool:
+        if not number:
+            return False
+        if number in self._exact:
+            return True
+
+        cached = self._cache.get(number)
+        if cached is None:
+            cached = self._classify(number)
+            if len(self._cache) >= _LOOKUP_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[number] = cached
+        return cached
+
+    def profile_of(self, number) -> Optional[dict]:
+        """Numaranın kullanıcı bilgisi (bilinmiyorsa None). Dönen dict paylaşılır, değiştirilmemeli."""
+        if not number:
+            return None
+        profile = self._profiles.get(number)
+        if profile is not None:
+            return profile
+
+        # Dış numaralar çoğunlukla eşleşmez: normalize sonucu (None dahil) cache'lenir
+        if number in self._profile_cache:
+            return self._profile_cache[number]
+        profile = self._normalized_profiles.get(normalize_number(number))
+        if len(self._profile_cache) >= _LOOKUP_CACHE_SIZE:
+            self._profile_cache.clear()
+        self._profile_cache[number] = profile
+        return profile
+
+    def blocks_of(self, digits: str) -> tuple:
+        """number_digits() sonucunun dahil olduğu blokların etiketleri (config sırasıyla)"""
+        if not self._blocks or not digits:
+            return ()
+        tags = self._block_cache.get(digits)
+        if tags is None:
+            tags = tuple(dict.fromkeys(tag for prefix, tag in self._blocks if digits.startswith(prefix)))
+            if len(self._block_cache) >= _LOOKUP_CACHE_SIZE:
+                self._block_cache.clear()
+            self._block_cache[digits] = tags
+        return tags
+
+    def department_of(self, number):
+        """Numaranın department_id'si (bilinmiyorsa None)"""
+        profile = self.profile_of(number)
+        return profile.get('department_id') if profile is not None else None
+
+    def _classify(self, number) -> bool:
+        normalized = normalize_number(number)
+        if normalized is None:
+            return False
+        if normalized in self._normalized:
+            return True
+        if self._prefixes and normalized.startswith(self._prefixes):
+            return True
+        if self._ranges and normalized.isdigit():
+            value = int(normalized)
+            for length, start, end in self._ranges:
+                if len(normalized) == length and start <= value <= end:
+                    return True
+        return False
+
+
+class DirectoryManager:
+    """
+    Kullanıcı dizininin güncel snapshot'ını tutar ve arka planda yeniler.
+    users collection'ı her refresh_interval saniyede okunur; içerik değişmişse
+    yeni snapshot tek bir referans atamasıyla devreye alınır. Dosya işleyen kod
+    `current`'ı dosya başında bir kez alır, böylece dosya boyunca tutarlı bir görünüm kullanır.
+    """
+
+    def __init__(self, loader: Callable[[], UserDirectory], refresh_interval: int = 300):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.current: Optional[UserDirectory] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self) -> UserDirectory:
+        """İlk snapshot'ı senkron yükle (başlangıçta)"""
+        self.current = self.loader()
+        logger.info(f"User directory loaded: {len(self.current)} numbers (version {self.current.version})")
+        return self.current
+
+    async def refresh(self) -> bool:
+        """Dizini yeniden oku; değişmişse snapshot'ı değiştir. Returns: değişti mi"""
+        try:
+            snapshot = await asyncio.to_thread(self.loader)
+        except Exception as e:
+            # Okuma hatasında eski snapshot ile devam et
+            logger.error(f"User directory refresh failed, keeping version {self.current.version}: {e}")
+            return False
+
+        if self.current is not None and snapshot.version == self.current.version:
+            return False
+
+        previous = self.current
+        self.current = snapshot
+        logger.info(
+            f"User directory updated: version {previous.version if previous else None} -> {snapshot.version} "
+            f"({len(previous) if previous else 0} -> {len(snapshot)} numbers)"
+        )
+        return True
+
+    def start(self):
+        """Arka plan yenileme görevini başlat (refresh_interval <= 0 ise kapalı)"""
+        if self.refresh_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
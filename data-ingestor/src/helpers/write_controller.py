@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import deque
+from pymongo.errors import AutoReconnect, ExecutionTimeout, NetworkTimeout, WTimeoutError
+from helpers.logger import main_logger as logger
+
+# Bağlantı kopması / zaman aşımı: batch bekleyip tekrar denenebilir (unique index sayesinde idempotent)
+TRANSIENT_WRITE_ERRORS = (AutoReconnect, NetworkTimeout, ExecutionTimeout, WTimeoutError)
+
+
+class AdaptiveWriteController:
+    """
+    Yazma latency'sine göre batch boyutunu ve eşzamanlı yazma sayısını ayarlayan AIMD controller.
+    Tüm dosyaların BulkWriter'ları aynı controller'ı kullanır (semaphore yerine acquire/release).
+
+    Her `window` yazmada bir son yazmaların p95 latency'si hedefle karşılaştırılır:
+    - p95 > hedef: batch boyutu decrease_factor ile çarpılır, concurrency bir azaltılır
+    - p95 < hedef * headroom: batch boyutu batch_step kadar, concurrency bir artar (üst sınır write_workers)
+    AutoReconnect / timeout hatalarında ikisi de yarıya iner ve batch üstel bekleme ile tekrar denenir.
+    Her karar loglanır (hedeflerin ayarlanması için).
+    """
+
+    def __init__(self, batch_size: int, concurrency: int, target_p95_ms: float = 500,
+                 min_batch_size: int = 100, max_batch_size: int = 10000, batch_step: int = 250,
+                 decrease_factor: float = 0.5, headroom: float = 0.5, min_concurrency: int = 1,
+                 max_concurrency: int = None, window: int = 20, max_retries: int = 5,
+                 backoff_seconds: float = 1, max_backoff_seconds: float = 30):
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency or concurrency)
+        self.batch_size = self._clamp(batch_size, self.min_batch_size, self.max_batch_size)
+        self.concurrency = self._clamp(concurrency, self.min_concurrency, self.max_concurrency)
+
+        self.target = target_p95_ms / 1000
+        self.batch_step = max(1, batch_step)
+        self.decrease_factor = decrease_factor
+        self.headroom = headroom
+        self.window = max(1, window)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._latencies = deque(maxlen=self.window)
+        self._backoff = 0         # Art arda geçici hata sayısı (bekleme süresi bununla katlanır)
+        self._resume_at = 0       # Geçici hatadan sonra yeni yazmaya başlanacak en erken zaman
+        self._active = 0
+        self._waiters = deque()
+
+        # İstatistikler
+        self.increases = 0
+        self.decreases = 0
+        self.backoffs = 0
+
+    @staticmethod
+    def _clamp(value, lower, upper):
+        return max(lower, min(upper, int(value)))
+
+    async def acquire(self):
+        """Yazma slotu al: aynı anda en fazla concurrency yazma, geçici hatadan sonra bekleme süresi dolana kadar hiç"""
+        while True:
+            delay = self._resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self._active < self.concurrency:
+                self._active += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self):
+        self._active -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Bekleyenlerin hepsi uyandırılır, her biri limiti tekrar kontrol eder
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    def observe(self, latency: float):
+        """Başarılı bir yazmanın süresi (saniye)"""
+        self._backoff = 0
+        self._latencies.append(latency)
+        if len(self._latencies) < self.window:
+            return
+
+        latencies = sorted(self._latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self._latencies.clear()
+
+        batch_size, concurrency = self.batch_size, self.concurrency
+        if p95 > self.target:
+            self.batch_size = self._clamp(batch_size * self.decrease_factor, self.min_batch_size, self.max_batch_size)
+            self.concurrency = max(self.min_concurrency, concurrency - 1)
+            reason = f"p95 {p95 * 1000:.0f}ms > target {self.target * 1000:.0f}ms"
+            self.decreases += 1
+        elif p95 < self.target * self.headroom:
+            self.batch_size = min(self.max_batch_size, batch_size + self.batch_step)
+            self.concurrency = min(self.max_concurrency, concurrency + 1)
+            if (self.batch_size, self.concurrency) == (batch_size, concurrency):
+                return  # İkisi de üst sınırda
+            reason = f"p95 {p95 * 1000:.0f}ms < {self.target * self.headroom * 1000:.0f}ms"
+            self.increases += 1
+        else:
+            logger.debug(f"Write controller: p95 {p95 * 1000:.0f}ms within target, "
+                         f"batch {batch_size}, concurrency {concurrency}")
+            return
+
+        self._log_decision(reason, batch_size, concurrency)
+
+    def backoff(self, error: Exception) -> float:
+        """
+        Geçici yazma hatası: batch boyutu ve concurrency yarıya iner, yeni yazmalar bekletilir.
+        Returns: batch tekrar denenmeden önce beklenecek süre (saniye)
+        """
+        now = time.monotonic()
+        if now < self._resume_at:
+            # Aynı kesintide paralel batch'lerin hataları: tekrar küçültme, mevcut beklemeye katıl
+            return self._resume_at - now
+
+        batch_size, concurrency = self.batch_size, self.concurrency
+        self.batch_size = self._clamp(batch_size // 2, self.min_batch_size, self.max_batch_size)
+        self.concurrency = max(self.min_concurrency, concurrency // 2)
+        self._latencies.clear()
+
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** self._backoff)
+        self._backoff += 1
+        self._resume_at = now + delay
+        self.backoffs += 1
+
+        self._log_decision(f"{type(error).__name__}, backing off {delay:.1f}s", batch_size, concurrency,
+                           warning=True)
+        return delay
+
+    def _log_decision(self, reason: str, batch_size: int, concurrency: int, warning: bool = False):
+        message = (f"Write controller: {reason}; batch {batch_size} -> {self.batch_size}, "
+                   f"concurrency {concurrency} -> {self.concurrency}")
+        if warning:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        if self.concurrency > concurrency:
+            self._wake_waiters()
+
+    def get_stats(self) -> dict:
+        return {
+            'batch_size': self.batch_size,
+            'concurrency': self.concurrency,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'backoffs': self.backoffs,
+        }
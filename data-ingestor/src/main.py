@@ -1,8 +1,9 @@
 import asyncio
 import signal
 import sys
-from helpers.logger import main_logger as logger
+from helpers.logger import main_logger as logger, stop_mongo_logging
 from processors.cdr_processor import CDRProcessor
+from helpers.mongo import close_mongo_client
 
 
 class ServiceState:
@@ -60,8 +61,8 @@ async def main():
         await processor.initialize()
         logger.info(f"System initialized. Source: {source_dir}, Processed: {processed_dir}")
         
-        # 2 dakikada bir çalış (graceful shutdown destekli)
-        await processor.run_periodic_processing(interval=120)
+        # Yeni dosya geldiğinde ve en geç watcher.poll_interval saniyede bir çalış (graceful shutdown destekli)
+        await processor.run_periodic_processing()
         
     except asyncio.CancelledError:
         logger.info("Service tasks cancelled")
@@ -71,9 +72,14 @@ async def main():
         logger.error(f"Fatal error: {e}")
         raise
     finally:
+        # run_periodic_processing kendisi kapatır; initialize yarıda kaldıysa başlatılan görevler burada durur
+        await processor.close()
         logger.info("=" * 60)
         logger.info("CDR DataIngestor Service stopped")
         logger.info("=" * 60)
+        # En son: log kayıtları da paylaşılan client ile yazılıyor, önce kuyruktakiler yazılır
+        stop_mongo_logging()
+        close_mongo_client()
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 import os
 import asyncio
-from helpers.logger import main_logger as logger
+from helpers.logger import main_logger as logger, stop_mongo_logging
+from helpers.mongo import close_mongo_client
 from processors.cdr_processor import CDRProcessor
 
 async def main():
@@ -28,6 +29,10 @@ async def main():
     except Exception as e:
         logger.error(f"Fatal error in development: {e}")
         raise
+    finally:
+        await processor.close()
+        stop_mongo_logging()
+        close_mongo_client()
 
 if __name__ == '__main__':
     asyncio.run(main())
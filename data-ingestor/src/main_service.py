@@ -1,7 +1,8 @@
 import asyncio
 import signal
 import sys
-from helpers.logger import main_logger as logger
+from helpers.logger import main_logger as logger, stop_mongo_logging
+from helpers.mongo import close_mongo_client
 from processors.cdr_processor import CDRProcessor
 
 class CDRService:
@@ -56,6 +57,8 @@ class CDRService:
             logger.error(f"Fatal error in service: {e}")
             raise
         finally:
+            # Parse process'leri, watcher ve arka plan görevleri (spool replay, dizin yenileme, index'ler)
+            await self.processor.close()
             logger.info("CDR DataIngestor Service stopped")
 
 async def main():
@@ -73,6 +76,10 @@ async def main():
     except Exception as e:
         logger.error(f"Service failed with error: {e}")
         sys.exit(1)
+    finally:
+        # En son: log kayıtları da paylaşılan client ile yazılıyor, önce kuyruktakiler yazılır
+        stop_mongo_logging()
+        close_mongo_client()
 
 if __name__ == '__main__':
     asyncio.run(main())
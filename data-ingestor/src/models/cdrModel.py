@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from models.cdrSubModels import Authorization, CallingParty, DateTime, Destination, FinalCalledParty, GlobalCall, HuntPilot, Incoming, LastRedirect, LastRedirecting, Orig, OriginalCalledParty, Outgoing, OutPulsed
 from enum import Enum
@@ -39,4 +39,10 @@ class CdrModel(BaseModel):
     wasCallQueued: Optional[bool] = Field(None, title="Was Call Queued")
     totalWaitTimeInQueue: Optional[int] = Field(None, title="Total Wait Time In Queue")
     pk_id: Optional[str] = Field(None, title="Primary Key ID")
-    callDirection: Optional[int] = Field(None, title="Call Direction")
\ No newline at end of file
+    callDirection: Optional[int] = Field(None, title="Call Direction")
+    directoryVersion: Optional[str] = Field(None, title="User Directory Version")
+    parties: Optional[List[str]] = Field(None, title="Party Numbers (calling, final called, original called)")
+    partyDigits: Optional[List[str]] = Field(None, title="Normalized Digits-Only Party Numbers")
+    partyDigitsReversed: Optional[List[str]] = Field(None, title="Reversed Party Digits (suffix search)")
+    blocks: Optional[List[str]] = Field(None, title="Tracked Number Block Tags")
+    calendar: Optional[dict] = Field(None, title="Local Calendar Buckets (day, hour, isoWeek, month, weekday, businessHours)")
@@ -13,6 +13,7 @@ class CallingParty(BaseModel):
     partition: Optional[str] = Field(None, title="Calling Party Partition")
     uri: Optional[str] = Field(None, title="Calling Party URI")
     unicode_login_user_id: Optional[str] = Field(None, title="Calling Party Unicode Login User ID")
+    user: Optional[dict] = Field(None, title="Calling Party Directory User (name, department_id, department)")
 
 
 class DateTime(BaseModel):
@@ -94,6 +95,7 @@ class FinalCalledParty(BaseModel):
     uri: Optional[str] = Field(None, title="Final Called Party URI")
     pattern: Optional[str] = Field(None, title="Final Called Party Pattern")
     unicode_login_user_id: Optional[str] = Field(None, title="Final Called Party Unicode Login User ID")
+    user: Optional[dict] = Field(None, title="Final Called Party Directory User (name, department_id, department)")
 
 
 class GlobalCall(BaseModel):
@@ -204,6 +206,7 @@ class OriginalCalledParty(BaseModel):
     partition: Optional[str] = Field(None, title="Original Called Party Partition")
     uri: Optional[str] = Field(None, title="Original Called Party URI")
     pattern: Optional[str] = Field(None, title="Original Called Party Pattern")
+    user: Optional[dict] = Field(None, title="Original Called Party Directory User (name, department_id, department)")
 
 
 class Outgoing(BaseModel):
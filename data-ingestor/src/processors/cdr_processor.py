@@ -1,21 +1,70 @@
 import os
-import csv
 import asyncio
 import time
+from concurrent.futures import ProcessPoolExecutor
+from bson.raw_bson import RawBSONDocument
 from datetime import datetime
 from helpers.logger import main_logger as logger
-from users import get_unique_phone_numbers
-from utils import get_mongo_collection, insert_to_mongo
-from create_collection import create_collection_if_not_exists
+from users import load_user_directory
+from utils import get_mongo_collection, get_checkpoint_collection, get_rollup_collection, get_rollup_claim_collection, ingestion_config, pipeline_config, config
+from create_collection import create_collection_if_not_exists, get_index_manager
 from helpers.file_manager import FileManager
+from helpers.file_watcher import FileWatcher
+from helpers.file_recovery import StaleFileRecovery
+from helpers.user_directory import DirectoryManager
+from helpers.checkpoint_store import CheckpointStore
+from helpers.stage_metrics import StageMetrics
+from helpers.mongo import get_pool_stats
+from helpers.spool import BatchSpool, SpoolReplayer
+from helpers.rollups import CallRollups
+from helpers.write_controller import AdaptiveWriteController, TRANSIENT_WRITE_ERRORS
+from helpers.document_builder import VALIDATION_SAMPLED
+from processors.file_parser import iter_chunk_documents, find_record_boundaries, read_header, parse_cdr_chunk
+from helpers.bulk_writer import BulkWriter, write_batch, DEFAULT_MAX_DOCS, DEFAULT_MAX_BYTES, DEFAULT_MAX_IN_FLIGHT
 
 class CDRProcessor:
     def __init__(self, source_dir: str = "E:\\CDR", processed_dir: str = "E:\\CDR_Processed"):
-        self.file_manager = FileManager(source_dir, processed_dir)
+        # Yeni dosya tespiti: inotify olayları (varsa) + güvenlik ağı olarak periyodik tarama
+        self.watcher_config = config.get('watcher') or {}
+        self.file_manager = FileManager(
+            source_dir,
+            processed_dir,
+            stable_seconds=self.watcher_config.get('stable_seconds', 10),
+            ledger_path=(config.get('ledger') or {}).get('path'),
+        )
+        self.file_watcher = None
+        self.file_recovery = None
         self.collection = None
-        self.users_collection = None
+        self.directory_manager = DirectoryManager(
+            load_user_directory,
+            refresh_interval=(config.get('directory') or {}).get('refresh_interval', 300),
+        )
         self._should_exit = False  # Graceful shutdown flag
         
+        # Pipeline aşamaları: dosyalar -> parse (process pool) -> yazma (insert_many), aralarında sınırlı kuyruklar
+        self.file_workers = pipeline_config.get('file_workers') or os.cpu_count() or 1
+        self.parse_workers = pipeline_config.get('parse_workers') or os.cpu_count() or 1
+        self.parse_queue_size = max(1, pipeline_config.get('parse_queue_size', 8))
+        self.write_workers = max(1, pipeline_config.get('write_workers', DEFAULT_MAX_IN_FLIGHT))
+        self.stages = {name: StageMetrics(name) for name in ('files', 'parse', 'write')}
+        self._parse_pool = None
+        self._write_semaphore = None  # Tüm dosyaların paylaştığı in-flight yazma limiti
+        self._write_controller = None  # adaptive açıksa semaphore yerine: batch boyutu + concurrency
+        
+        # Dosyalar kayıt sınırlarından parçalara bölünür: paralel parse birimi ve checkpoint aralığı
+        self.chunk_size = ingestion_config.get('chunk_size', 4 * 1024 * 1024)
+        self.checkpoints = None
+        
+        # MongoDB erişilemezken yazılamayan batch'ler diskte spool'a yazılır, erişim gelince replay edilir
+        self.spool = None
+        self.spool_replayer = None
+        
+        # Dashboard için saatlik / günlük özetler (ingest sırasında güncellenir)
+        self.rollups = None
+        
+        # Tanımlı index'lerin arka planda oluşturulması ve kullanım raporu
+        self.index_manager = None
+        
     def request_shutdown(self):
         """Service tarafından shutdown isteği"""
         logger.info("CDRProcessor received shutdown request")
@@ -27,7 +76,79 @@ class CDRProcessor:
         
         await create_collection_if_not_exists()
         self.collection = get_mongo_collection()
-        self.users_collection = get_unique_phone_numbers()
+        self.checkpoints = CheckpointStore(get_checkpoint_collection())
+        # Eksik index'ler ingestion'ı bekletmeden oluşturulur, sonra periyodik $indexStats raporu
+        self.index_manager = get_index_manager(self.collection)
+        if (config.get('indexes') or {}).get('build_on_startup', True):
+            self.index_manager.start()
+        # Kullanıcı dizini: ilk snapshot + arka planda periyodik yenileme (servis restart gerekmez)
+        self.directory_manager.load()
+        self.directory_manager.start()
+        
+        rollup_config = config.get('rollups') or {}
+        if rollup_config.get('enabled', True):
+            self.rollups = CallRollups(
+                get_rollup_collection(),
+                get_rollup_claim_collection(),
+                tz=rollup_config.get('timezone', 'Europe/Istanbul'),
+                directory=lambda: self.directory_manager.current,
+            )
+            self.rollups.ensure_indexes()
+        
+        self.file_watcher = FileWatcher(self.file_manager, mode=self.watcher_config.get('mode', 'auto'))
+        self.file_watcher.start()
+        
+        # Yarıda kalmış (.processing) dosyalar: arka planda, başlangıçta ve periyodik olarak kurtarılır
+        recovery_config = config.get('recovery') or {}
+        if recovery_config.get('enabled', True):
+            self.file_recovery = StaleFileRecovery(
+                self.file_manager,
+                stale_seconds=recovery_config.get('stale_seconds', 3600),
+                interval=recovery_config.get('interval', 300),
+                on_recovered=lambda files: self.file_watcher.changed.set(),
+            )
+            self.file_recovery.start()
+        
+        spool_config = config.get('spool') or {}
+        if spool_config.get('enabled', True):
+            self.spool = BatchSpool(
+                spool_config.get('directory', 'E:\\CDR_Spool'),
+                max_bytes=spool_config.get('max_bytes', 2 * 1024 * 1024 * 1024),
+                segment_bytes=spool_config.get('segment_bytes', 64 * 1024 * 1024),
+            )
+            self.spool_replayer = SpoolReplayer(
+                self.spool,
+                lambda batch: write_batch(self.collection, batch, rollups=self.rollups),
+                interval=spool_config.get('replay_interval', 10),
+            )
+            self.spool_replayer.start()
+        
+        # Yazma aşaması tüm dosyalar için ortak: aynı anda en fazla write_workers insert_many
+        self._write_semaphore = asyncio.Semaphore(self.write_workers)
+        adaptive = ingestion_config.get('adaptive') or {}
+        if adaptive.get('enabled', True):
+            # write_workers üst sınırdır; batch_size başlangıç değeridir
+            self._write_controller = AdaptiveWriteController(
+                batch_size=ingestion_config.get('batch_size', DEFAULT_MAX_DOCS),
+                concurrency=self.write_workers,
+                target_p95_ms=adaptive.get('target_p95_ms', 500),
+                min_batch_size=adaptive.get('min_batch_size', 100),
+                max_batch_size=adaptive.get('max_batch_size', 10000),
+                batch_step=adaptive.get('batch_step', 250),
+                min_concurrency=adaptive.get('min_write_workers', 1),
+                window=adaptive.get('window', 20),
+                max_retries=adaptive.get('max_retries', 5),
+                backoff_seconds=adaptive.get('backoff_seconds', 1),
+                max_backoff_seconds=adaptive.get('max_backoff_seconds', 30),
+            )
+        if self.parse_workers > 1:
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        logger.info(
+            f"Ingestion pipeline: {self.file_workers} files, "
+            f"{self.parse_workers if self._parse_pool else 'in-process'} parse workers "
+            f"(queue {self.parse_queue_size}/file), {self.write_workers} write workers"
+            + (f" (adaptive, target p95 {self._write_controller.target * 1000:.0f}ms)" if self._write_controller else "")
+        )
         
         # Başlangıç istatistikleri
         stats = self.file_manager.get_processing_stats()
@@ -41,49 +162,59 @@ class CDRProcessor:
             'file_path': file_path,
             'filename': os.path.basename(file_path),
             'records_processed': 0,
+            'records_inserted': 0,
+            'records_failed': 0,
+            'records_duplicate': 0,
+            'resumed_from_row': 0,
+            'records_spooled': 0,
             'processing_time': 0,
             'error': None
         }
         
         locked_file_path = None
+        writer = None
         
         try:
+            # Dosya boyunca tek bir dizin snapshot'ı kullanılır (yenileme dosyalar arasında devreye girer)
+            user_directory = self.directory_manager.current
+            result['directory_version'] = user_directory.version
+            
             # Dosyayı işleme için kilitle
             locked_file_path = self.file_manager.lock_file_for_processing(file_path)
             
+            # Daha önce yarıda kalmışsa son commit edilen noktadan devam et
+            filename = result['filename']
+            file_size = os.path.getsize(locked_file_path)
+            start_offset, start_row = await self._load_checkpoint(filename, file_size)
+            if start_offset:
+                logger.info(f"Resuming {filename} from row {start_row} (offset {start_offset}/{file_size})")
+                result['resumed_from_row'] = start_row
+            
             # CSV dosyasını oku ve işle
-            records_count = 0
-            batch_tasks = []
+            writer = BulkWriter(
+                self.collection,
+                max_docs=ingestion_config.get('batch_size', DEFAULT_MAX_DOCS),
+                max_bytes=ingestion_config.get('batch_max_bytes', DEFAULT_MAX_BYTES),
+                semaphore=self._write_semaphore,
+                on_commit=lambda position: self._save_checkpoint(filename, file_size, *position),
+                metrics=self.stages['write'],
+                controller=self._write_controller,
+                spool=self.spool,
+                rollups=self.rollups,
+            )
+            records_count = await self._ingest_file(locked_file_path, user_directory, writer, start_offset, start_row)
             
-            with open(locked_file_path, mode='r', encoding='utf-8-sig') as file:
-                csv_reader = csv.DictReader(file)
-
-                # NOT: DictReader zaten ilk satırı header olarak kullanır
-                # next() çağrısı KALDIRILDI - aksi halde ilk veri satırı kaybolur!
-
-                # Her satırı işle
-                for row_num, row in enumerate(csv_reader, 1):
-                    try:
-                        batch_tasks.append(insert_to_mongo(self.collection, row, self.users_collection))
-                        records_count += 1
-                        
-                        # Her 1000 kayıtta bir batch işle (memory management)
-                        if len(batch_tasks) >= 1000:
-                            await asyncio.gather(*batch_tasks)
-                            batch_tasks = []
-                            
-                    except Exception as row_error:
-                        logger.error(f"Error processing row {row_num} in {result['filename']}: {row_error}")
-                        # Tek satır hatası tüm dosyayı durdurmaz
-                
-                # Son batch'i işle
-                if batch_tasks:
-                    await asyncio.gather(*batch_tasks)
+            write_stats = writer.get_stats()
+            result['records_inserted'] = write_stats['inserted']
+            result['records_failed'] = write_stats['failed']
+            result['records_duplicate'] = write_stats['duplicates']
+            result['records_spooled'] = write_stats['spooled']
             
             # Başarılı tamamlama
             if records_count > 0:
                 success = self.file_manager.move_to_processed(locked_file_path, records_count)
                 if success:
+                    self._clear_checkpoint(filename)
                     result['success'] = True
                     result['records_processed'] = records_count
                     result['processing_time'] = time.time() - start_time
@@ -97,6 +228,10 @@ class CDRProcessor:
             result['error'] = str(e)
             logger.error(f"Error processing file {result['filename']}: {e}")
             
+            # Arka planda devam eden yazmalar bitmeden dosyayı bırakma
+            if writer is not None:
+                await writer.wait_pending()
+            
             # Hata durumunda dosyayı unlock et
             if locked_file_path:
                 self.file_manager.unlock_file_on_failure(locked_file_path)
@@ -104,11 +239,130 @@ class CDRProcessor:
         result['processing_time'] = time.time() - start_time
         return result
     
+    async def _load_checkpoint(self, filename: str, file_size: int):
+        try:
+            return await asyncio.to_thread(self.checkpoints.load, filename, file_size)
+        except TRANSIENT_WRITE_ERRORS as e:
+            if self.spool is None:
+                raise
+            # Kesinti sırasında dosya baştan spool'a işlenir; tekrar yazılan satırları unique index eler
+            logger.warning(f"Checkpoint for {filename} could not be read, starting from the beginning: {e}")
+            return 0, 0
+    
+    def _save_checkpoint(self, filename: str, file_size: int, offset: int, row: int):
+        # Spool'a yazılırken MongoDB erişilemez; checkpoint atlanır (çökmede dosya baştan işlenir, tekrarlar elenir)
+        if self.spool is not None and self.spool.pending:
+            return
+        self.checkpoints.save(filename, file_size, offset, row)
+    
+    def _clear_checkpoint(self, filename: str):
+        # Dosya zaten taşındı; silinemeyen checkpoint sadece gereksiz bir kayıttır
+        try:
+            self.checkpoints.clear(filename)
+        except Exception as e:
+            logger.warning(f"Checkpoint for {filename} could not be cleared: {e}")
+    
+    async def _ingest_file(self, locked_file_path: str, user_directory, writer: BulkWriter,
+                           start_offset: int = 0, start_row: int = 0) -> int:
+        """
+        Dosyayı kayıt sınırlarından chunk_size'lık parçalara bölüp writer'a aktar (checkpoint varsa oradan başlayarak).
+        Process pool varsa parçalar parse aşamasına gönderilir ve dosya sırasıyla yazılır; parse kuyruğu
+        parse_queue_size ile sınırlı olduğundan yazma yavaşsa okuma da bekler (backpressure).
+        Pool yoksa satırlar okunurken yazılır.
+        Her parçanın sonunda writer'a (offset, satır) işareti bırakılır, yazıldığında checkpoint olarak kaydedilir.
+        Returns: işlenen satır sayısı (checkpoint öncesi dahil)
+        """
+        validation = ingestion_config.get('validation', VALIDATION_SAMPLED)
+        sample_rate = ingestion_config.get('validation_sample_rate', 1000)
+        
+        chunks = await asyncio.to_thread(find_record_boundaries, locked_file_path, self.chunk_size, start_offset)
+        header = await asyncio.to_thread(read_header, locked_file_path)
+        records_count = start_row
+        
+        if self._parse_pool is not None:
+            if len(chunks) > 1:
+                logger.info(f"Parsing {os.path.basename(locked_file_path)} in {len(chunks)} chunks")
+            queue = asyncio.Queue(maxsize=self.parse_queue_size)
+            producer = asyncio.create_task(self._produce_chunks(
+                queue, locked_file_path, chunks, header, user_directory, validation, sample_rate
+            ))
+            try:
+                for _ in chunks:
+                    end, future = await queue.get()
+                    records_count = await self._write_chunk(end, future, writer, records_count)
+            finally:
+                # Hata durumunda okumayı durdur, henüz başlamamış parçaları iptal et
+                producer.cancel()
+                while not queue.empty():
+                    queue.get_nowait()[1].cancel()
+                    self.stages['parse'].dequeue()
+        else:
+            for start, end in chunks:
+                count = 0
+                for document in iter_chunk_documents(locked_file_path, start, end, header, user_directory,
+                                                     validation, sample_rate):
+                    count += 1
+                    # Writer batch sınırına ulaşınca insert_many ile flush eder.
+                    # Yazma hataları (bağlantı vb.) burada yakalanmaz, dosya tekrar denenir.
+                    if document is not None:
+                        await writer.add(document)
+                records_count += count
+                self.stages['parse'].record(1, count)
+                await writer.mark((end, records_count))
+        
+        # Son batch'i yaz ve devam eden yazmaları bekle
+        await writer.flush()
+        return records_count
+    
+    async def _produce_chunks(self, queue: asyncio.Queue, locked_file_path: str, chunks, header,
+                              user_directory, validation: str, sample_rate: int):
+        """Okuma aşaması: parçaları sırayla parse pool'una gönder (kuyruk doluysa bekler)"""
+        loop = asyncio.get_running_loop()
+        for start, end in chunks:
+            try:
+                future = loop.run_in_executor(
+                    self._parse_pool, parse_cdr_chunk, locked_file_path, start, end, header,
+                    user_directory, validation, sample_rate
+                )
+            except Exception as e:
+                # Pool kullanılamıyorsa (ör. BrokenProcessPool) hata yazma tarafına iletilir
+                future = loop.create_future()
+                future.set_exception(e)
+            try:
+                await queue.put((end, future))
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            self.stages['parse'].enqueue()
+    
+    async def _write_chunk(self, end: int, future, writer: BulkWriter, records_count: int) -> int:
+        """Parse edilmiş parçayı writer'a aktar. Returns: güncel satır sayısı"""
+        try:
+            count, documents = await future
+        finally:
+            self.stages['parse'].dequeue()
+        self.stages['parse'].record(1, count)
+        for raw in documents:
+            await writer.add(RawBSONDocument(raw))
+        records_count += count
+        await writer.mark((end, records_count))
+        return records_count
+    
+    def get_pipeline_stats(self) -> dict:
+        """Aşama başına kuyruk derinliği ve throughput (+ adaptive yazma controller'ı ve connection pool durumu)"""
+        stats = {name: stage.snapshot() for name, stage in self.stages.items()}
+        if self._write_controller is not None:
+            stats['write_controller'] = self._write_controller.get_stats()
+        stats['mongo_pool'] = get_pool_stats()
+        if self.spool is not None:
+            stats['spool'] = self.spool.get_stats()
+        return stats
+    
     async def process_available_files(self):
-        """Mevcut tüm dosyaları işle"""
+        """Mevcut tüm dosyaları işle (en eski dosyadan başlayarak, en fazla file_workers dosya aynı anda)"""
         start_time = time.time()
         
-        # İşlenmeye hazır dosyaları al
+        # İşlenmeye hazır dosyaları al (CUCM dosya adındaki zamana göre sıralı)
         available_files = self.file_manager.get_available_files()
         
         if not available_files:
@@ -121,45 +375,122 @@ class CDRProcessor:
         total_files = len(available_files)
         successful_files = 0
         failed_files = 0
+        skipped_files = 0
         total_records = 0
         
-        # Her dosyayı sırayla işle
-        for file_path in available_files:
-            result = await self.process_single_file(file_path)
-            
-            if result['success']:
+        file_slots = asyncio.Semaphore(self.file_workers)
+        for stage in self.stages.values():
+            stage.reset()
+        self.stages['files'].enqueue(total_files)
+        
+        async def process_with_slot(file_path):
+            async with file_slots:
+                self.stages['files'].dequeue()
+                # Shutdown istendiyse yeni dosyaya başlama
+                if self._should_exit:
+                    return None
+                result = await self.process_single_file(file_path)
+                self.stages['files'].record(1, result['records_processed'])
+                return result
+        
+        results = await asyncio.gather(*(process_with_slot(file_path) for file_path in available_files))
+        
+        for result in results:
+            if result is None:
+                skipped_files += 1
+            elif result['success']:
                 successful_files += 1
                 total_records += result['records_processed']
                 logger.info(f"✓ Processed: {result['filename']} ({result['records_processed']} records, {result['processing_time']:.2f}s)")
+                if result['records_failed']:
+                    logger.warning(f"  {result['records_failed']} records failed to insert in {result['filename']}")
+                if result['records_duplicate']:
+                    logger.info(f"  {result['records_duplicate']} records were already present in {result['filename']}")
+                if result['records_spooled']:
+                    logger.warning(f"  {result['records_spooled']} records were spooled to disk for {result['filename']} (MongoDB unavailable)")
             else:
                 failed_files += 1
                 logger.error(f"✗ Failed: {result['filename']} - {result['error']}")
         
         # Özet
         total_time = time.time() - start_time
-        logger.info(f"Batch completed: {successful_files}/{total_files} files successful, {total_records} records, {total_time:.2f}s")
+        logger.info(f"Batch completed: {successful_files}/{total_files} files successful, {total_records} records, {total_time:.2f}s"
+                    + (f", {skipped_files} skipped due to shutdown" if skipped_files else ""))
+        logger.info("Pipeline: " + "; ".join(str(stage) for stage in self.stages.values()))
+        if self._write_controller is not None:
+            logger.info(f"Write controller: {self._write_controller.get_stats()}")
+        logger.info(f"Mongo pool: {get_pool_stats()}")
+        if self.spool is not None and self.spool.pending:
+            logger.warning(f"Spool has batches waiting for MongoDB: {self.spool.get_stats()}")
         
         # İstatistikleri güncelle
         stats = self.file_manager.get_processing_stats()
         logger.info(f"Current stats: {stats}")
     
-    async def run_periodic_processing(self, interval: int = 120):
-        """2 dakikada bir dosyaları kontrol et ve işle (graceful shutdown destekli)"""
-        logger.info(f"Starting periodic processing every {interval} seconds")
-        
+    async def close(self):
+        """Arka plan görevlerini ve parse process'lerini kapat (birden fazla çağrılabilir)"""
+        await self.directory_manager.stop()
+        if self.index_manager is not None:
+            await self.index_manager.stop()
+        if self.file_recovery is not None:
+            await self.file_recovery.stop()
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+        if self.spool_replayer is not None:
+            await self.spool_replayer.stop()
+            self.spool.close()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=True, cancel_futures=True)
+            self._parse_pool = None
+        self.file_manager.close()
+    
+    async def _wait_for_files(self, interval: int):
+        """
+        Bir sonraki işleme turuna kadar bekle: file watcher yeni dosya bildirdiğinde (debounce sonrası)
+        ya da en geç interval saniye sonra. Shutdown sinyali 5 saniye içinde yakalanır.
+        """
+        changed = self.file_watcher.changed if self.file_watcher is not None else None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + interval
         while not self._should_exit:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if changed is None:
+                await asyncio.sleep(min(5, remaining))
+                continue
             try:
-                logger.info("=== Starting periodic file processing ===")
-                await self.process_available_files()
-                logger.info(f"=== Processing completed. Next run in {interval} seconds ===")
-                
-            except Exception as e:
-                logger.error(f"Error in periodic processing: {e}")
-            
-            # Bir sonraki çalışmaya kadar bekle (shutdown sinyalini hızlı yakala)
-            remaining = interval
-            while remaining > 0 and not self._should_exit:
-                await asyncio.sleep(min(5, remaining))  # 5 saniyede bir kontrol
-                remaining -= 5
+                await asyncio.wait_for(changed.wait(), min(5, remaining))
+            except asyncio.TimeoutError:
+                continue
+            # Aynı anda gelen dosyalar tek turda işlensin
+            await asyncio.sleep(self.watcher_config.get('debounce', 1))
+            break
+        if changed is not None:
+            changed.clear()
+    
+    async def run_periodic_processing(self, interval: int = None):
+        """
+        Dosyaları işle: file watcher aktifse yeni dosya geldiğinde, her durumda en geç interval saniyede bir
+        (varsayılan watcher.poll_interval, graceful shutdown destekli)
+        """
+        if interval is None:
+            interval = self.watcher_config.get('poll_interval', 120)
+        watching = self.file_watcher is not None and self.file_watcher.active
+        logger.info(f"Starting file processing: {'on file events and ' if watching else ''}every {interval} seconds")
         
+        try:
+            while not self._should_exit:
+                try:
+                    logger.info("=== Starting periodic file processing ===")
+                    await self.process_available_files()
+                    logger.info(f"=== Processing completed. Next run {'on new files or ' if watching else ''}in {interval} seconds ===")
+                    
+                except Exception as e:
+                    logger.error(f"Error in periodic processing: {e}")
+                
+                await self._wait_for_files(interval)
+        finally:
+            # İptal / hata durumunda da arka plan görevleri ve parse process'leri kapatılır
+            await self.close()
         logger.info("Periodic processing stopped due to shutdown request")
@@ -0,0 +1,233 @@
+import csv
+import io
+import mmap
+import os
+from itertools import pairwise
+from contextlib import closing
+from typing import Iterable, Iterator, List, Optional, Tuple
+from helpers.logger import main_logger as logger
+from helpers.converters import compile_row_plan
+from helpers.document_builder import RowConverter
+
+# Kayıt sınırı ararken dosyanın okunduğu blok boyutu
+_SCAN_BLOCK_SIZE = 1024 * 1024
+# mmap okuyucuda tek seferde map edilip decode edilen pencere boyutu (kayıt sınırına kadar kısaltılır)
+_READ_WINDOW_SIZE = 1024 * 1024
+# str.splitlines'ın '\n' dışında satır sonu saydığı karakterlerin UTF-8 byte'ları
+_CONTROL_LINE_BREAKS = (b'\x0b', b'\x0c', b'\x1c', b'\x1d', b'\x1e')
+_OTHER_LINE_BREAKS = _CONTROL_LINE_BREAKS + tuple(char.encode() for char in '\x85\u2028\u2029')
+
+
+def _last_record_end(data: bytes) -> Optional[int]:
+    """
+    Bir kayıt başından başlayan data içindeki son kayıt sonu (tırnak dışındaki son '\\n' sonrası).
+    Hiç kayıt sonu yoksa None.
+    """
+    in_quotes = data.count(b'"') & 1
+    suffix = len(data)
+    newline = data.rfind(b'\n')
+    while newline != -1:
+        # [0, newline] aralığının tırnak paritesi = toplam parite ^ sonrasındaki tırnaklar
+        in_quotes ^= data.count(b'"', newline + 1, suffix) & 1
+        if not in_quotes:
+            return newline + 1
+        suffix = newline + 1
+        newline = data.rfind(b'\n', 0, newline)
+    return None
+
+
+def _map_range(file, start: int, length: int) -> bytes:
+    """Dosyanın [start, start + length) aralığını map edip byte olarak al (map hemen kapatılır)"""
+    offset = start - start % mmap.ALLOCATIONGRANULARITY
+    with mmap.mmap(file.fileno(), start + length - offset, access=mmap.ACCESS_READ, offset=offset) as buffer:
+        return buffer[start - offset:]
+
+
+def _mmap_supported(file) -> bool:
+    try:
+        mmap.mmap(file.fileno(), 1, access=mmap.ACCESS_READ).close()
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _decode_lines(data: bytes, encoding: str):
+    """Text mode okuma ile aynı satırlar: \\r\\n ve \\r -> \\n, sadece '\\n' den bölünür"""
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    text = data.decode(encoding)
+    if any(marker in data for marker in (_CONTROL_LINE_BREAKS if data.isascii() else _OTHER_LINE_BREAKS)):
+        # str.splitlines bu karakterlerden de böler; text mode bölmez
+        return io.StringIO(text, newline='\n')
+    return text.splitlines(keepends=True)
+
+
+def _iter_mapped_rows(file, start: int, end: int) -> Iterator[List[str]]:
+    position = start
+    while position < end:
+        length = min(_READ_WINDOW_SIZE, end - position)
+        while True:
+            data = _map_range(file, position, length)
+            stop = len(data) if position + length >= end else _last_record_end(data)
+            if stop is not None:
+                break
+            length = min(2 * length, end - position)  # Pencereye sığmayan uzun kayıt
+
+        yield from csv.reader(_decode_lines(data[:stop], 'utf-8-sig' if position == 0 else 'utf-8'))
+        position += stop
+
+
+def _iter_text_rows(file, start: int, end: Optional[int]) -> Iterator[List[str]]:
+    file.seek(start)
+    if end is None:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig' if start == 0 else 'utf-8')
+    else:
+        text = io.TextIOWrapper(io.BytesIO(file.read(end - start)), encoding='utf-8-sig' if start == 0 else 'utf-8')
+    yield from csv.reader(text)
+
+
+def iter_csv_rows(file_path: str, start: int = 0, end: Optional[int] = None,
+                  use_mmap: Optional[bool] = None) -> Iterator[List[str]]:
+    """
+    Dosyanın [start, end) byte aralığındaki CSV kayıtları (start bir kayıt başı olmalı, 0 = header dahil).
+    use_mmap=None: byte aralıkları (parçalar) mmap ile kayıt sınırında biten pencereler halinde okunur,
+    parçanın tamamı belleğe kopyalanmaz; tüm dosya ise TextIOWrapper ile akış halinde okunur (zaten sınırlı bellek).
+    mmap desteklenmiyorsa (ör. bazı ağ paylaşımları) normal okumaya düşülür. Çıktı her durumda aynıdır.
+    """
+    if use_mmap is None:
+        use_mmap = end is not None
+
+    with open(file_path, mode='rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if use_mmap and size and _mmap_supported(file):
+            yield from _iter_mapped_rows(file, start, size if end is None else min(end, size))
+        else:
+            if use_mmap and size:
+                logger.debug(f"mmap not available for {file_path}, using buffered reader")
+            yield from _iter_text_rows(file, start, end)
+
+
+def _convert_rows(rows: Iterable[List[str]], header: List[str], user_directory, validation: str,
+                  sample_rate: int, encode_documents: bool) -> Iterator:
+    # Kolon index'leri plan içinde derlenir (header imzasına göre cache'li)
+    plan = compile_row_plan(tuple(header))
+    converter = RowConverter(
+        plan,
+        user_directory,
+        mode=validation,
+        sample_rate=sample_rate,
+        encode_documents=encode_documents,
+    )
+
+    for row in rows:
+        if not row:
+            continue  # Boş satır (DictReader davranışı ile aynı)
+        yield converter.convert(row)
+
+
+def _collect(documents: Iterator) -> Tuple[int, List[bytes]]:
+    records_count = 0
+    raws = []
+    for document in documents:
+        records_count += 1
+        if document is not None:
+            raws.append(document.raw)
+    return records_count, raws
+
+
+def iter_cdr_documents(file_path: str, user_directory, validation: str, sample_rate: int,
+                       encode_documents: bool = False) -> Iterator:
+    """
+    CDR dosyasını satır satır dokümana çevir.
+    Her veri satırı için bir değer üretir: doküman ya da hatalı satırlar için None.
+    Referans yol: servis dosyaları parçalara bölüp iter_chunk_documents kullanır; bu fonksiyon sadece
+    parse_cdr_file (benchmark.py'deki seri ölçüm) içindir.
+    """
+    rows = iter_csv_rows(file_path)
+    header = next(rows, None) or []
+    yield from _convert_rows(rows, header, user_directory, validation, sample_rate, encode_documents)
+
+
+def parse_cdr_file(file_path: str, user_directory, validation: str, sample_rate: int) -> Tuple[int, List[bytes]]:
+    """
+    Dosyanın tamamını tek process'te parse eder (benchmark.py chunks: paralel parse_cdr_chunk'ın seri referansı).
+    Servis bunu kullanmaz; sonuç parse_cdr_chunk'ınkiyle aynı biçimde, encode edilmiş BSON byte'larıdır.
+    Returns: (records_count, [bson bytes])
+    """
+    return _collect(iter_cdr_documents(file_path, user_directory, validation, sample_rate, encode_documents=True))
+
+
+def find_record_boundaries(file_path: str, chunk_size: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Dosyayı yaklaşık chunk_size byte'lık parçalara kayıt sınırlarından böl.
+    Tırnak içindeki satır sonları kayıt sonu sayılmaz: dosya baştan okunurken '"' sayısının
+    paritesi tutulur ("" kaçışı pariteyi değiştirmez), sınır yalnızca tırnak dışındaki '\\n' sonrası olabilir.
+    start bir kayıt başı olmalı (0 ya da bir checkpoint offset'i); 0'dan başlayan ilk parça header'ı içerir.
+    Returns: [(start, end), ...] byte aralıkları
+    """
+    boundaries = [start]
+    in_quotes = False
+    position = start               # Okunan bloğun dosyadaki başlangıç offset'i
+    target = start + chunk_size    # Bir sonraki sınırın aranacağı en erken offset
+
+    with open(file_path, mode='rb') as file:
+        file.seek(start)
+        while True:
+            block = file.read(_SCAN_BLOCK_SIZE)
+            if not block:
+                break
+
+            offset = 0  # Bloğun pariteye işlenmiş kısmı
+            while position + len(block) > target:
+                scan_from = max(target - position, offset)
+                in_quotes ^= block.count(b'"', offset, scan_from) & 1
+                offset = scan_from
+
+                found = False
+                newline = block.find(b'\n', offset)
+                while newline != -1:
+                    in_quotes ^= block.count(b'"', offset, newline) & 1
+                    offset = newline + 1
+                    if not in_quotes:
+                        found = True
+                        break
+                    newline = block.find(b'\n', offset)
+                if not found:
+                    break  # Sınır sonraki blokta
+
+                boundaries.append(position + offset)
+                target = position + offset + chunk_size
+
+            in_quotes ^= block.count(b'"', offset) & 1
+            position += len(block)
+
+    boundaries.append(position)
+    return [(start, end) for start, end in pairwise(boundaries) if end > start]
+
+
+def read_header(file_path: str) -> List[str]:
+    """Dosyanın ilk kaydını (header) kolon listesi olarak oku"""
+    with closing(iter_csv_rows(file_path)) as rows:
+        return next(rows, None) or []
+
+
+def iter_chunk_documents(file_path: str, start: int, end: int, header: List[str], user_directory,
+                         validation: str, sample_rate: int, encode_documents: bool = False) -> Iterator:
+    """
+    Dosyanın [start, end) byte aralığındaki kayıtları dokümana çevir (iter_cdr_documents gibi).
+    İlk parça (start == 0) header satırı ile başlar, o satır atlanır.
+    """
+    rows = iter_csv_rows(file_path, start, end)
+    if start == 0:
+        next(rows, None)
+    yield from _convert_rows(rows, header, user_directory, validation, sample_rate, encode_documents)
+
+
+def parse_cdr_chunk(file_path: str, start: int, end: int, header: List[str], user_directory,
+                    validation: str, sample_rate: int) -> Tuple[int, List[bytes]]:
+    """
+    Process pool worker'ı: dosyanın [start, end) byte aralığındaki kayıtları parse eder.
+    Returns: (records_count, [bson bytes])
+    """
+    return _collect(iter_chunk_documents(file_path, start, end, header, user_directory, validation, sample_rate,
+                                         encode_documents=True))
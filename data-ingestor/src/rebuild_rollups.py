@@ -0,0 +1,52 @@
+"""
+Saatlik / günlük çağrı rollup'larını ham CDR kayıtlarından yeniden hesaplar.
+
+Kullanım:
+    python rebuild_rollups.py --from 2024-01-01 --to 2024-02-01
+
+Tarihler rollups.timezone'a göre yerel gündür, --to hariçtir. Aralıktaki rollup dokümanları silinip
+yeniden yazılır: rollup güncellemesi başarısız olduğunda (log'da "Rollup update failed"), backfill
+--no-rollups ile yapıldığında ya da rollup tanımı değiştiğinde kullanılır. Aralığa o sırada yazılan
+kayıtlar çift sayılabilir; servis durdurulmuşken ya da kapanmış günler için çalıştırın.
+"""
+import argparse
+from datetime import date, timedelta
+from helpers.logger import stop_mongo_logging
+from helpers.mongo import close_mongo_client
+from helpers.rollups import CallRollups
+from users import load_user_directory
+from utils import get_mongo_collection, get_rollup_collection, get_rollup_claim_collection, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild hourly/daily call rollups")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, required=True, help="İlk gün (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help="Son gün hariç (varsayılan: --from + 1 gün)")
+    args = parser.parse_args()
+    end = args.end or args.start + timedelta(days=1)
+    if end <= args.start:
+        parser.error("--to must be after --from")
+
+    try:
+        # user alanı olmayan eski kayıtların departmanları güncel kullanıcı dizininden alınır
+        directory = load_user_directory()
+        rollups = CallRollups(
+            get_rollup_collection(),
+            get_rollup_claim_collection(),
+            tz=(config.get('rollups') or {}).get('timezone', 'Europe/Istanbul'),
+            directory=lambda: directory,
+        )
+        rollups.ensure_indexes()
+        # Gün gün: her gün ayrı silinip yazılır, yarıda kesilirse sadece son gün tekrar çalıştırılır
+        day = args.start
+        while day < end:
+            scanned = rollups.rebuild(get_mongo_collection(), day, day + timedelta(days=1))
+            print(f"{day}: {scanned} records")
+            day += timedelta(days=1)
+    finally:
+        stop_mongo_logging()
+        close_mongo_client()
+
+
+if __name__ == '__main__':
+    main()
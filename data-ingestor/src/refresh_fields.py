@@ -0,0 +1,114 @@
+"""
+CDR'larda yazma sırasında türetilen alanları yeniler: gömülü kullanıcı bilgisi
+(callingParty / finalCalledParty / originalCalledParty .user), arama alanları (parties, partyDigits,
+partyDigitsReversed, blocks) ve yerel takvim alanları (calendar).
+
+Kullanım:
+    python refresh_fields.py                              # Tüm kayıtlar
+    python refresh_fields.py --from 2024-01-01 --to 2024-02-01
+
+Personel listesi (users / departments), directory.blocks ya da calendar ayarları değiştiğinde ve bu alanlar
+eklenmeden önce yazılmış kayıtlar için çalıştırılır. Servis yeni listeyi directory.refresh_interval
+içinde kendisi alır; arada yazılan kayıtlar da düzelsin diye o süre geçtikten sonra çalıştırın. Kayıtlar
+sadece gerekli alanlarla taranır, sadece değişen taraflar unordered bulk_write ile güncellenir; tekrar
+çalıştırmak güvenlidir. Departman rollup'ları için ayrıca rebuild_rollups.py çalıştırılmalıdır.
+"""
+import argparse
+import time
+from datetime import date, datetime
+from pymongo import UpdateOne
+from helpers.converters import PARTIES, attach_search_fields
+from helpers.time_buckets import get_calendar
+from helpers.logger import main_logger as logger, stop_mongo_logging
+from helpers.mongo import close_mongo_client
+from users import load_user_directory
+from utils import get_mongo_collection
+
+# Tek bulk_write'taki güncelleme sayısı
+DEFAULT_BATCH_SIZE = 1000
+# attach_search_fields'ın yazdığı alanlar
+SEARCH_FIELDS = ('parties', 'partyDigits', 'partyDigitsReversed', 'blocks')
+
+
+def field_updates(document, directory) -> dict:
+    """Dokümandaki türetilmiş alanlar güncel dizinle hesaplanandan farklıysa $set alanları"""
+    updates = {}
+    for party in PARTIES:
+        value = document.get(party)
+        if value is None:
+            continue
+        profile = directory.profile_of(value.get('number'))
+        # Alanın olmaması da fark sayılır: eski kayıtlar null ile tamamlanır
+        if 'user' not in value or value['user'] != profile:
+            updates[f"{party}.user"] = profile
+
+    expected = {party: document[party] for party in PARTIES if document.get(party) is not None}
+    attach_search_fields(expected, directory)
+    for field in SEARCH_FIELDS:
+        if field not in document or document[field] != expected[field]:
+            updates[field] = expected[field]
+
+    calendar = get_calendar().buckets((document.get('dateTime') or {}).get('origination'))
+    if 'calendar' not in document or document['calendar'] != calendar:
+        updates['calendar'] = calendar
+    return updates
+
+
+def refresh_fields(collection, directory, query: dict, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple:
+    """
+    query'ye uyan kayıtların türetilmiş alanlarını yenile.
+    Returns: (taranan, güncellenen)
+    """
+    projection = dict.fromkeys(SEARCH_FIELDS + ('calendar', 'dateTime.origination'), 1)
+    for party in PARTIES:
+        projection[f"{party}.number"] = 1
+        projection[f"{party}.user"] = 1
+
+    scanned = 0
+    updated = 0
+    operations = []
+    for document in collection.find(query, projection, batch_size=batch_size):
+        scanned += 1
+        updates = field_updates(document, directory)
+        if updates:
+            operations.append(UpdateOne({'_id': document['_id']}, {'$set': updates}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+            logger.info(f"Field refresh: {scanned} records scanned, {updated} updated")
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return scanned, updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh derived user, search and calendar fields on CDR records")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help="İlk gün, UTC (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help="Son gün hariç, UTC (YYYY-MM-DD)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="bulk_write başına güncelleme")
+    args = parser.parse_args()
+
+    query = {}
+    if args.start or args.end:
+        origination = {}
+        if args.start:
+            origination['$gte'] = datetime.combine(args.start, datetime.min.time())
+        if args.end:
+            origination['$lt'] = datetime.combine(args.end, datetime.min.time())
+        query['dateTime.origination'] = origination
+
+    try:
+        directory = load_user_directory()
+        started = time.perf_counter()
+        scanned, updated = refresh_fields(get_mongo_collection(), directory, query, max(1, args.batch_size))
+        message = (f"Fields refreshed (directory version {directory.version}): {scanned} records scanned, "
+                   f"{updated} updated in {time.perf_counter() - started:.1f}s")
+        logger.info(message)
+        print(message)
+    finally:
+        stop_mongo_logging()
+        close_mongo_client()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 import os
 import pandas as pd
-from pymongo import MongoClient
 from helpers.config import load_config
+from helpers.mongo import get_database
+from helpers.user_directory import UserDirectory
 
 config = load_config()
 
@@ -12,9 +13,7 @@ def excel_to_json(excel_file_path):
 
 def get_mongo_users_collection():
     """Get the MongoDB collection for users."""
-    client = MongoClient(config['mongo']['uri'])
-    db = client[config['mongo']['database']]
-    return db['users']
+    return get_database()['users']
 
 def insert_json_to_mongo(json_data):
     collection = get_mongo_users_collection()
@@ -26,6 +25,34 @@ def get_unique_phone_numbers():
     phone_numbers = collection.distinct("phone_number")
     return phone_numbers
 
+def get_user_profiles():
+    """Numara -> {'name', 'department_id', 'department'} (CDR'lara gömülen kullanıcı bilgisi)."""
+    database = get_database()
+    department_names = {
+        department['_id']: department.get('name')
+        for department in database['departments'].find({}, {'name': 1})
+    }
+    return {
+        user['phone_number']: {
+            'name': user.get('name'),
+            'department_id': user.get('department_id'),
+            'department': department_names.get(user.get('department_id')),
+        }
+        for user in get_mongo_users_collection().find({}, {'phone_number': 1, 'name': 1, 'department_id': 1})
+        if user.get('phone_number') is not None
+    }
+
+def load_user_directory():
+    """Dahili numara dizinini MongoDB'den ve config.yaml 'directory' kurallarından oluştur."""
+    directory_config = config.get('directory') or {}
+    return UserDirectory(
+        get_unique_phone_numbers(),
+        prefixes=directory_config.get('internal_prefixes') or [],
+        ranges=directory_config.get('internal_ranges') or [],
+        profiles=get_user_profiles(),
+        blocks=directory_config.get('blocks') or {},
+    )
+
 if __name__ == "__main__":
     import sys
     
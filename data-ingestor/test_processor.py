@@ -20,8 +20,8 @@ import asyncio
 
 async def test():
     print("CDR Processor Test Başlıyor...")
+    processor = CDRProcessor('E:/CDR', 'E:/CDR_Processed')
     try:
-        processor = CDRProcessor('E:/CDR', 'E:/CDR_Processed')
         await processor.initialize()
         
         stats = processor.file_manager.get_processing_stats()
@@ -39,6 +39,8 @@ async def test():
         
     except Exception as e:
         print(f"✗ Test hatası: {e}")
+    finally:
+        await processor.close()
 
 if __name__ == "__main__":
     asyncio.run(test())
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Modüller src/ içinden import edilir (servis gibi); log dosyaları E:\ yerine geçici dizine
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault('CDR_LOG_DIR', tempfile.mkdtemp(prefix='cdr_test_logs_'))
+
+from helpers.logger import MongoHandler, main_logger  # noqa: E402
+
+# Testler MongoDB'ye log yazmaz
+for handler in list(main_logger.handlers):
+    if isinstance(handler, MongoHandler):
+        main_logger.removeHandler(handler)
+        handler.close()
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURES_DIR, name)
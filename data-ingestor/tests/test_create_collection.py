@@ -0,0 +1,66 @@
+"""create_collection_if_not_exists: $jsonSchema validator hem yeni hem mevcut collection'a uygulanır"""
+import asyncio
+
+import mongomock
+import pytest
+from pymongo.errors import OperationFailure
+
+import create_collection
+from create_collection import CDR_SCHEMA, create_collection_if_not_exists
+
+
+class CommandRecorder:
+    """mongomock collMod desteklemiyor: komutları kaydeden veritabanı"""
+
+    def __init__(self, database, error=None):
+        self._database = database
+        self.commands = []
+        self.error = error
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+    def __getitem__(self, name):
+        return self._database[name]
+
+    def command(self, command):
+        self.commands.append(command)
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = CommandRecorder(mongomock.MongoClient()['cdr'])
+    monkeypatch.setattr(create_collection, 'get_database', lambda: database)
+    return database
+
+
+def collection_name():
+    return create_collection.config['mongo']['collection']
+
+
+def validators(database):
+    return [command['validator']['$jsonSchema'] for command in database.commands if 'collMod' in command]
+
+
+def test_new_collection_gets_validator(database):
+    asyncio.run(create_collection_if_not_exists())
+    assert collection_name() in database.list_collection_names()
+    assert validators(database) == [CDR_SCHEMA]
+
+
+def test_existing_collection_validator_is_updated(database):
+    database.create_collection(collection_name())
+    asyncio.run(create_collection_if_not_exists())
+
+    assert validators(database) == [CDR_SCHEMA]
+    properties = validators(database)[0]['properties']
+    assert 'user' in properties['callingParty']['properties']
+    assert {'parties', 'partyDigits', 'partyDigitsReversed', 'blocks', 'calendar'} <= properties.keys()
+
+
+def test_collmod_without_privilege_does_not_block_startup(database):
+    database.error = OperationFailure('not authorized', code=13)
+    asyncio.run(create_collection_if_not_exists())
+    assert 'pk_id_unique' in database[collection_name()].index_information()
@@ -0,0 +1,101 @@
+"""
+Hızlı yol (DocumentBuilder) ile Pydantic yolu (parse_csv_row(...).model_dump()) aynı dokümanı üretmeli:
+BSON olarak byte-byte aynı (key sırası ve tipler dahil), hatalı satırlarda da aynı hata.
+Corpus: tests/fixtures/cdr_parity*.csv (tırnaklı / çok satırlı alanlar, boş ve kısa satırlar,
+Unicode rakamlar, dizinde olan / olmayan numaralar, farklı kolon sırası ve eksik kolonlar).
+"""
+import csv
+
+import pytest
+from bson import encode
+from pydantic import ValidationError
+
+from conftest import fixture_path
+from helpers.converters import compile_row_plan, parse_csv_row
+from helpers.document_builder import VALIDATION_SAMPLED, RowConverter, compile_document_builder
+from helpers.user_directory import UserDirectory
+
+FIXTURES = ['cdr_parity.csv', 'cdr_parity_reordered.csv']
+
+
+def make_directory():
+    return UserDirectory(
+        ['80361001', '80361002', '05321234567'],
+        prefixes=['8037'],
+        ranges=['80380000-80380099'],
+        profiles={
+            '80361001': {'name': 'Ayşe Yılmaz', 'department_id': 3, 'department': 'Muhasebe'},
+            '80361002': {'name': 'Mehmet Öz', 'department_id': None, 'department': None},
+            '05321234567': {'name': 'Saha Ekibi', 'department_id': 7, 'department': 'Saha'},
+        },
+        blocks={'merkez': ['8036'], 'fabrika': ['8037', '8038']},
+    )
+
+
+DIRECTORIES = {
+    'directory': make_directory,
+    'empty-directory': lambda: UserDirectory([]),
+}
+
+
+def read_fixture(name: str):
+    # Pipeline gibi: boş satırlar atlanır, kısa satırlar olduğu gibi kalır
+    with open(fixture_path(name), mode='r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        plan = compile_row_plan(tuple(next(reader)))
+        return plan, [row for row in reader if row]
+
+
+def encode_or_error(build):
+    try:
+        return encode(build())
+    except ValueError as e:  # ValidationError dahil
+        return type(e).__name__
+
+
+@pytest.mark.parametrize('directory_name', DIRECTORIES)
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_builder_matches_model_dump(fixture, directory_name):
+    directory = DIRECTORIES[directory_name]()
+    plan, rows = read_fixture(fixture)
+    builder = compile_document_builder(plan)
+
+    for number, row in enumerate(rows, 1):
+        expected = encode_or_error(lambda: parse_csv_row(row, plan, directory).model_dump())
+        actual = encode_or_error(lambda: builder.build(row, directory))
+        assert actual == expected, f"{fixture} row {number} differs: {row}"
+
+
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_sampled_converter_reports_no_mismatch(fixture):
+    plan, rows = read_fixture(fixture)
+    converter = RowConverter(plan, make_directory(), mode=VALIDATION_SAMPLED, sample_rate=1)
+    for row in rows:
+        converter.convert(row)
+    assert converter.mismatches == 0
+
+
+def test_corpus_covers_edge_cases():
+    # Corpus sadeleşirse parity testi anlamını yitirmesin
+    directory = make_directory()
+    plan, rows = read_fixture('cdr_parity.csv')
+    builder = compile_document_builder(plan)
+    documents = []
+    errors = 0
+    for row in rows:
+        try:
+            documents.append(builder.build(row, directory))
+        except ValidationError:
+            errors += 1
+
+    assert errors >= 2  # origSpan 'abc' ve '５' (Pydantic Unicode rakamı kabul etmez)
+    assert any(len(row) < len(plan.header) for row in rows)
+    assert any('\n' in (document['comment'] or '') for document in documents)
+    assert any('"' in (document['comment'] or '') for document in documents)
+    assert any(document['duration'] == 34 for document in documents)   # '٣٤'
+    assert any(document['orig']['span'] == 7 for document in documents)  # '7.0'
+    users = [document['callingParty']['user'] for document in documents]
+    assert any(user is not None for user in users) and any(user is None for user in users)
+    assert any(document['blocks'] for document in documents)
+    assert any(document['partyDigits'] is None for document in documents)
+    assert any(document['calendar'] is None for document in documents)
@@ -0,0 +1,50 @@
+"""MongoHandler: WARNING+ tekrarları mesaj bazında özetlenir, aynı satırdan farklı mesajlar ayrı yazılır"""
+import logging
+
+from helpers.logger import MongoHandler
+
+
+def make_record(msg, args=None, level=logging.ERROR, lineno=413):
+    return logging.LogRecord('cdr', level, '/src/processors/cdr_processor.py', lineno, msg, args, None)
+
+
+def make_handler():
+    return MongoHandler('cdr', 'logs', options={'dedupe_seconds': 60, 'rate_limit': 0})
+
+
+def allowed(handler, records):
+    with handler._condition:
+        return [handler._allow(record) for record in records]
+
+
+def test_distinct_messages_from_the_same_call_are_all_written():
+    handler = make_handler()
+    records = [make_record(f"✗ Failed: cdr_{number} - timeout") for number in range(3)]
+    assert allowed(handler, records) == [True, True, True]
+    assert handler.stats['suppressed'] == 0
+
+
+def test_format_args_are_part_of_the_key():
+    handler = make_handler()
+    records = [make_record("✗ Failed: %s", (name,)) for name in ('cdr_1', 'cdr_2', 'cdr_1')]
+    assert allowed(handler, records) == [True, True, False]
+
+
+def test_repeated_message_is_suppressed_and_summarized():
+    handler = make_handler()
+    records = [make_record("Rollup update failed") for _ in range(4)]
+    assert allowed(handler, records) == [True, False, False, False]
+    assert handler.stats['suppressed'] == 3
+
+    handler.options['dedupe_seconds'] = 0.0  # Pencere doldu
+    summaries = [entry for entry in handler._take_batch() if entry.get('suppressed')]
+    assert len(summaries) == 1
+    assert summaries[0]['suppressed'] == 3
+    assert summaries[0]['line'] == 413
+    assert summaries[0]['message'].endswith("first: Rollup update failed")
+
+
+def test_info_records_are_never_deduplicated():
+    handler = make_handler()
+    records = [make_record("Processing file", level=logging.INFO) for _ in range(3)]
+    assert allowed(handler, records) == [True, True, True]
@@ -0,0 +1,93 @@
+"""
+Parçalara bölme ve checkpoint'ten devam: sınırlar tırnak paritesine göre sadece kayıt başlarına düşmeli,
+parçaların satırları birleşince dosyanın tamamı ile aynı olmalı (mmap ve normal okuyucuda).
+"""
+import mongomock
+import pytest
+
+import processors.file_parser as file_parser
+from conftest import fixture_path
+from helpers.checkpoint_store import CheckpointStore
+from processors.file_parser import _last_record_end, find_record_boundaries, iter_csv_rows
+
+CHUNK_SIZES = [1, 7, 64, 997, 4096, 10 ** 9]
+
+# Sınırların tırnak içine düşebileceği kayıtlar: tırnaklı satır sonları, "" kaçışları, CRLF, BOM
+QUOTED = (
+    '﻿pkid,comment,duration\r\n'
+    '1,"first\nsecond",10\r\n'
+    '2,"a ""quoted"" value, with comma",20\r\n'
+    '3,"""\n""\n""",30\r\n'
+    '4,,40\r\n'
+    '5,"ends with newline\n",50\r\n'
+    '6,"\n\n\n",60\r\n'
+    '7,plain,70'
+)
+
+
+@pytest.fixture(params=['quoted', 'cdr_parity.csv', 'cdr_parity_reordered.csv'])
+def cdr_file(request, tmp_path):
+    if request.param == 'quoted':
+        path = tmp_path / 'cdr_quoted'
+        path.write_bytes(QUOTED.encode('utf-8'))
+        return str(path)
+    return fixture_path(request.param)
+
+
+def chunk_rows(path, chunks, use_mmap):
+    rows = []
+    for start, end in chunks:
+        rows.extend(iter_csv_rows(path, start, end, use_mmap=use_mmap))
+    return rows
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_chunks_reproduce_the_whole_file(cdr_file, chunk_size):
+    expected = list(iter_csv_rows(cdr_file))
+    chunks = find_record_boundaries(cdr_file, chunk_size)
+
+    assert chunks[0][0] == 0
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    assert chunk_rows(cdr_file, chunks, use_mmap=False) == expected
+    assert chunk_rows(cdr_file, chunks, use_mmap=True) == expected
+
+
+def test_mmap_windows_grow_for_long_records(cdr_file, monkeypatch):
+    # Pencereden uzun kayıtlar: pencere kayıt sonu bulunana kadar büyütülür
+    monkeypatch.setattr(file_parser, '_READ_WINDOW_SIZE', 16)
+    expected = list(iter_csv_rows(cdr_file))
+    chunks = find_record_boundaries(cdr_file, 4096)
+    assert chunk_rows(cdr_file, chunks, use_mmap=True) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 64, 4096])
+def test_resume_from_every_record_boundary(cdr_file, chunk_size):
+    # Checkpoint offset'i bir parça sonudur; oradan bölünen dosya kalan satırları aynen vermeli
+    expected = list(iter_csv_rows(cdr_file))
+    row = 0
+    for start, end in find_record_boundaries(cdr_file, chunk_size):
+        resumed = find_record_boundaries(cdr_file, chunk_size, start=start)
+        assert resumed[0][0] == start
+        assert chunk_rows(cdr_file, resumed, use_mmap=True) == expected[row:]
+        row += len(list(iter_csv_rows(cdr_file, start, end)))
+
+
+def test_last_record_end_ignores_quoted_newlines():
+    assert _last_record_end(b'1,"a\nb"\n2,"c\n') == len(b'1,"a\nb"\n')
+    assert _last_record_end(b'1,"a ""x"" b"\n2,d') == len(b'1,"a ""x"" b"\n')
+    assert _last_record_end(b'1,"a\nb\nc') is None
+    assert _last_record_end(b'1,2,3') is None
+
+
+def test_checkpoint_never_moves_backwards():
+    store = CheckpointStore(mongomock.MongoClient().db.ingest_checkpoints)
+    store.save('cdr_1', 1000, 600, 30)
+    store.save('cdr_1', 1000, 300, 15)  # Geç commit edilen önceki parça
+    assert store.load('cdr_1', 1000) == (600, 30)
+
+
+def test_checkpoint_is_discarded_when_the_file_size_changes():
+    store = CheckpointStore(mongomock.MongoClient().db.ingest_checkpoints)
+    store.save('cdr_1', 1000, 600, 30)
+    assert store.load('cdr_1', 1200) == (0, 0)
+    assert store.load('cdr_1', 1000) == (0, 0)
@@ -0,0 +1,170 @@
+"""CallRollups: her kayıt bir kez sayılır (tekrar deneme, yeniden işleme), departman kayda gömülü kullanıcıdan"""
+from datetime import date, datetime
+
+import mongomock
+import pytest
+from pymongo.errors import AutoReconnect
+
+from helpers.bulk_writer import write_batch
+from helpers.rollups import CallRollups
+from users import UserDirectory
+
+
+class BulkWriteShim:
+    """mongomock'un bulk_write'ı pymongo 4 UpdateOne'ı okuyamıyor: işlemleri tek tek update_one ile uygula"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self._collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+
+class FlakyCollection:
+    """İlk insert_many'de ilk `written` dokümanı yazıp bağlantı hatası veren collection"""
+
+    def __init__(self, collection, written):
+        self._collection = collection
+        self.written = written
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def insert_many(self, documents, **kwargs):
+        if self.written is not None:
+            written, self.written = self.written, None
+            self._collection.insert_many(documents[:written], ordered=False)
+            raise AutoReconnect('connection reset')
+        return self._collection.insert_many(documents, **kwargs)
+
+
+def make_cdr(number: int, department_id=3, user=True):
+    calling = {'number': '80361001'}
+    if user:
+        calling['user'] = {'name': 'Ayşe Yılmaz', 'department_id': department_id, 'department': 'Muhasebe'}
+    return {
+        'pk_id': f"pk-{number}",
+        'globalCall': {'cluster_id': 'CL1'},
+        'callDirection': 2,
+        'dateTime': {
+            'origination': datetime(2024, 3, 14, 9, number % 60),
+            'connect': datetime(2024, 3, 14, 9, number % 60) if number % 2 else None,
+        },
+        'duration': 10 if number % 2 else 0,
+        'callingParty': calling,
+        'finalCalledParty': {'number': '05321234567'},
+    }
+
+
+@pytest.fixture
+def database():
+    return mongomock.MongoClient()['cdr']
+
+
+@pytest.fixture
+def calls(database):
+    collection = database['incoming_calls']
+    collection.create_index([('pk_id', 1), ('globalCall.cluster_id', 1)], unique=True)
+    return collection
+
+
+def make_rollups(database, department_id=99):
+    # Dizin, kayıtları sınıflandıran snapshot'tan farklı: departman yazma anındaki dizinden alınmamalı
+    directory = UserDirectory(['80361001'], profiles={
+        '80361001': {'name': 'Ayşe Yılmaz', 'department_id': department_id, 'department': 'Yeni'},
+    })
+    return CallRollups(
+        BulkWriteShim(database['call_rollups']), database['call_rollup_claims'], directory=lambda: directory
+    )
+
+
+def counters(database, period='day', scope='all', key=None):
+    document = database['call_rollups'].find_one({'period': period, 'scope': scope, 'key': key})
+    return None if document is None else (
+        document['total'], document['answered'], document['missed'], document['duration']
+    )
+
+
+def test_batch_counts_each_document(database, calls):
+    rollups = make_rollups(database)
+    assert write_batch(calls, [make_cdr(number) for number in range(10)], rollups=rollups) == (10, 0, 0)
+    assert counters(database) == (10, 5, 5, 50)
+    assert counters(database, period='hour') == (10, 5, 5, 50)
+    assert counters(database, scope='number', key='80361001') == (10, 5, 5, 50)
+
+
+def test_retry_after_partial_insert_counts_written_documents_once(database, calls):
+    rollups = make_rollups(database)
+    batch = [make_cdr(number) for number in range(10)]
+    flaky = FlakyCollection(calls, written=4)
+
+    with pytest.raises(AutoReconnect):
+        write_batch(flaky, batch, rollups=rollups)
+    assert counters(database) is None
+
+    # Tekrar deneme: ilk 4 kayıt duplicate gelir ama henüz sayılmamıştır
+    assert write_batch(flaky, batch, rollups=rollups) == (6, 0, 4)
+    assert counters(database) == (10, 5, 5, 50)
+    assert rollups.failed_updates == 0
+
+
+def test_reprocessed_file_is_not_counted_twice(database, calls):
+    rollups = make_rollups(database)
+    write_batch(calls, [make_cdr(number) for number in range(6)], rollups=rollups)
+
+    # Çökme sonrası dosya baştan: önceki kayıtlar duplicate, yeniler bir kez eklenir
+    assert write_batch(calls, [make_cdr(number) for number in range(10)], rollups=rollups) == (4, 0, 6)
+    assert counters(database) == (10, 5, 5, 50)
+
+
+def test_crash_between_insert_and_rollup_is_recovered_on_reprocess(database, calls):
+    calls.insert_many([make_cdr(number) for number in range(5)])
+
+    rollups = make_rollups(database)
+    assert write_batch(calls, [make_cdr(number) for number in range(5)], rollups=rollups) == (0, 0, 5)
+    assert counters(database) == (5, 2, 3, 20)
+
+
+def test_department_comes_from_embedded_user(database, calls):
+    rollups = make_rollups(database, department_id=99)
+    write_batch(calls, [make_cdr(number, department_id=3) for number in range(4)], rollups=rollups)
+    write_batch(calls, [make_cdr(number, department_id=None) for number in range(4, 6)], rollups=rollups)
+
+    assert counters(database, scope='department', key=3) == (4, 2, 2, 20)
+    # Kullanıcısı departmansız olarak sınıflandırılmış kayıtlar güncel dizindeki departmana sayılmaz
+    assert counters(database, scope='department', key=99) is None
+
+
+def test_documents_without_user_fall_back_to_directory(database, calls):
+    rollups = make_rollups(database, department_id=99)
+    write_batch(calls, [make_cdr(number, user=False) for number in range(2)], rollups=rollups)
+    assert counters(database, scope='department', key=99) == (2, 1, 1, 10)
+
+
+def test_rebuild_matches_incremental_counts(database, calls):
+    rollups = make_rollups(database)
+    write_batch(calls, [make_cdr(number) for number in range(7)], rollups=rollups)
+    calls.insert_many([make_cdr(number) for number in range(7, 12)])  # --no-rollups ile yazılmış
+    before = counters(database)
+
+    assert rollups.rebuild(calls, date(2024, 3, 14), date(2024, 3, 15)) == 12
+    assert before == (7, 3, 4, 30)
+    assert counters(database) == (12, 6, 6, 60)
+    assert counters(database, scope='department', key=3) == (12, 6, 6, 60)
+
+    # Rebuild claim'leri tamamlar: aynı kayıtlar tekrar geldiğinde sayılmaz
+    write_batch(calls, [make_cdr(number) for number in range(12)], rollups=rollups)
+    assert counters(database) == (12, 6, 6, 60)
+
+
+def test_connected_call_with_zero_duration_is_missed(database, calls):
+    # Backend raporları gibi: connect == null || duration == 0 cevapsızdır
+    rollups = make_rollups(database)
+    zero_duration = make_cdr(1)
+    zero_duration['duration'] = 0
+    write_batch(calls, [zero_duration, make_cdr(3), make_cdr(4)], rollups=rollups)
+    assert counters(database) == (3, 1, 2, 10)
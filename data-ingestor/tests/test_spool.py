@@ -0,0 +1,176 @@
+"""BatchSpool: CRC'li kayıtlar, segment rotasyonu, yarım kaydın kesilmesi ve pozisyondan devam eden replay"""
+import asyncio
+import os
+
+import pytest
+from bson import encode
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import AutoReconnect
+
+from helpers.spool import BatchSpool, SpoolFullError, SpoolReplayer
+
+
+def make_batch(start: int, size: int = 3):
+    return [RawBSONDocument(encode({'pk_id': f"pk-{number}", 'n': number})) for number in range(start, start + size)]
+
+
+def pk_ids(batches):
+    return [document['pk_id'] for batch in batches for document in batch]
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.spool'))
+
+
+class Recorder:
+    """write_batch yerine: yazılan batch'leri toplar, fail_at'inci çağrıda hata verir"""
+
+    def __init__(self, fail_at=None, error=RuntimeError('write failed')):
+        self.batches = []
+        self.calls = 0
+        self.fail_at = fail_at
+        self.error = error
+
+    def __call__(self, batch):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise self.error
+        self.batches.append(batch)
+
+
+def test_replay_writes_batches_in_order_across_segments(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20, segment_bytes=200)
+    for start in range(0, 30, 3):
+        spool.append(make_batch(start))
+    assert len(segment_files(tmp_path)) > 1
+    assert spool.pending
+
+    recorder = Recorder()
+    assert spool.replay(recorder) == (10, 30)
+    assert pk_ids(recorder.batches) == [f"pk-{number}" for number in range(30)]
+    assert segment_files(tmp_path) == []
+    assert not spool.pending
+    assert spool.get_stats()['disk_bytes'] == 0
+
+
+def test_append_after_replay_goes_to_a_new_segment(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(make_batch(0))
+    spool.replay(Recorder())
+    spool.append(make_batch(3))
+
+    recorder = Recorder()
+    assert spool.replay(recorder) == (1, 3)
+    assert pk_ids(recorder.batches) == ['pk-3', 'pk-4', 'pk-5']
+
+
+def test_recovery_truncates_torn_record(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(make_batch(0))
+    spool.append(make_batch(3))
+    spool.close()
+    last = tmp_path / segment_files(tmp_path)[-1]
+    complete_size = last.stat().st_size
+    with open(last, 'ab') as file:
+        file.write(b'\x40\x00\x00\x00\x01\x02\x03\x04torn')  # Yazılırken kesilmiş kayıt
+
+    recovered = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    assert last.stat().st_size == complete_size
+    assert recovered.get_stats()['pending_bytes'] == complete_size
+
+    recorder = Recorder()
+    assert recovered.replay(recorder) == (2, 6)
+    assert pk_ids(recorder.batches) == [f"pk-{number}" for number in range(6)]
+
+
+def test_crc_mismatch_stops_replay_of_the_segment(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(make_batch(0))
+    first_record_end = os.path.getsize(tmp_path / segment_files(tmp_path)[0])
+    spool.append(make_batch(3))
+    spool.close()
+
+    path = tmp_path / segment_files(tmp_path)[0]
+    data = bytearray(path.read_bytes())
+    data[first_record_end + 20] ^= 0xFF  # İkinci kaydın payload'ında bozuk byte
+    path.write_bytes(bytes(data))
+
+    recorder = Recorder()
+    BatchSpool(str(tmp_path), max_bytes=1 << 20).replay(recorder)
+    # Bozuk kayıt yazılmaz; öncesi yazılır, segment kapatılır
+    assert pk_ids(recorder.batches) == ['pk-0', 'pk-1', 'pk-2']
+    assert segment_files(tmp_path) == []
+
+
+def test_corrupt_segment_is_kept_aside(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(make_batch(0))
+    first_record_end = os.path.getsize(tmp_path / segment_files(tmp_path)[0])
+    spool.append(make_batch(3))
+    spool.append(make_batch(6))
+    spool.close()
+
+    name = segment_files(tmp_path)[0]
+    data = bytearray((tmp_path / name).read_bytes())
+    data[first_record_end + 20] ^= 0xFF
+    (tmp_path / name).write_bytes(bytes(data))
+
+    restarted = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    restarted.replay(Recorder())
+    corrupt = tmp_path / (name + '.corrupt')
+    # Yazılamayan batch'ler silinmez: dosya olduğu gibi kenarda, disk kullanımına sayılır
+    assert corrupt.read_bytes() == bytes(data)
+    assert not restarted.pending
+    assert restarted.get_stats()['disk_bytes'] == len(data)
+
+    # Yeniden başlatmada da sayılır ve replay edilmez
+    reopened = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    assert reopened.get_stats()['disk_bytes'] == len(data)
+    assert reopened.replay(Recorder()) == (0, 0)
+    assert corrupt.exists()
+
+
+def test_replay_resumes_from_saved_position_after_failure(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    for start in range(0, 15, 3):
+        spool.append(make_batch(start))
+
+    failing = Recorder(fail_at=3)
+    with pytest.raises(RuntimeError):
+        spool.replay(failing)
+    assert pk_ids(failing.batches) == [f"pk-{number}" for number in range(6)]
+    spool.close()
+
+    # Yeniden başlatma: yazılmış batch'ler tekrar yazılmaz, bekleyen byte'lar pozisyondan hesaplanır
+    restarted = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    assert restarted.pending
+    recorder = Recorder()
+    assert restarted.replay(recorder) == (3, 9)
+    assert pk_ids(recorder.batches) == [f"pk-{number}" for number in range(6, 15)]
+    assert not restarted.pending
+
+
+def test_append_raises_when_spool_is_full(tmp_path):
+    probe = BatchSpool(str(tmp_path / 'probe'), max_bytes=1 << 20)
+    probe.append(make_batch(0))
+    record_bytes = probe.get_stats()['disk_bytes']
+
+    spool = BatchSpool(str(tmp_path / 'spool'), max_bytes=record_bytes * 3 // 2)
+    spool.append(make_batch(0))
+    with pytest.raises(SpoolFullError):
+        spool.append(make_batch(3))
+    assert spool.get_stats()['disk_bytes'] == record_bytes
+
+
+def test_replayer_keeps_batches_while_mongodb_is_unavailable(tmp_path):
+    spool = BatchSpool(str(tmp_path), max_bytes=1 << 20)
+    spool.append(make_batch(0))
+
+    unavailable = Recorder(fail_at=1, error=AutoReconnect('connection refused'))
+    assert asyncio.run(SpoolReplayer(spool, unavailable).replay()) is False
+    assert spool.pending
+
+    recorder = Recorder()
+    assert asyncio.run(SpoolReplayer(spool, recorder).replay()) is True
+    assert pk_ids(recorder.batches) == ['pk-0', 'pk-1', 'pk-2']
+    assert not spool.pending
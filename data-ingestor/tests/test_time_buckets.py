@@ -0,0 +1,90 @@
+"""CalendarBuckets: UTC -> yerel takvim alanları, mesai saati sınırları ve ISO hafta yıl geçişleri"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from helpers.time_buckets import CalendarBuckets
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def calendar():
+    # Istanbul UTC+3 (2016'dan beri yaz saati yok); 2024-03-14 Perşembe
+    return CalendarBuckets(business_days=(1, 2, 3, 4, 5), holidays=['2024-04-23'])
+
+
+def test_utc_is_converted_to_local_time(calendar):
+    buckets = calendar.buckets(utc(2024, 3, 14, 11, 30))
+    assert buckets == {
+        'day': '2024-03-14', 'hour': 14, 'isoWeek': '2024-W11', 'month': '2024-03', 'weekday': 4,
+        'businessHours': True,
+    }
+
+
+def test_naive_values_are_treated_as_utc(calendar):
+    assert calendar.buckets(datetime(2024, 3, 14, 11, 30)) == calendar.buckets(utc(2024, 3, 14, 11, 30))
+    assert calendar.buckets(None) is None
+
+
+def test_local_day_and_month_can_differ_from_utc(calendar):
+    buckets = calendar.buckets(utc(2024, 3, 31, 22, 15))  # Yerel 2024-04-01 01:15
+    assert (buckets['day'], buckets['hour'], buckets['month'], buckets['weekday']) == ('2024-04-01', 1, '2024-04', 1)
+
+
+@pytest.mark.parametrize('local_time, expected', [
+    ((7, 44), False),
+    ((7, 45), True),   # Başlangıç dahil
+    ((16, 44), True),
+    ((16, 45), False),  # Bitiş hariç
+])
+def test_business_hours_boundaries(calendar, local_time, expected):
+    hour, minute = local_time
+    value = datetime(2024, 3, 14, hour, minute, tzinfo=calendar.timezone)
+    assert calendar.buckets(value)['businessHours'] is expected
+
+
+def test_seconds_within_the_last_business_minute_are_business_hours(calendar):
+    value = datetime(2024, 3, 14, 16, 44, 59, tzinfo=calendar.timezone)
+    assert calendar.buckets(value)['businessHours'] is True
+
+
+def test_weekends_and_holidays_are_outside_business_hours(calendar):
+    saturday = datetime(2024, 3, 16, 10, 0, tzinfo=calendar.timezone)
+    holiday = datetime(2024, 4, 23, 10, 0, tzinfo=calendar.timezone)
+    assert calendar.buckets(saturday)['weekday'] == 6
+    assert calendar.buckets(saturday)['businessHours'] is False
+    assert calendar.buckets(holiday)['businessHours'] is False
+    assert calendar.buckets(holiday - timedelta(days=1))['businessHours'] is True
+
+
+@pytest.mark.parametrize('day, iso_week', [
+    (date(2026, 12, 28), '2026-W53'),
+    (date(2026, 12, 31), '2026-W53'),
+    (date(2027, 1, 1), '2026-W53'),   # Yeni yılın ilk günleri önceki yılın 53. haftası
+    (date(2027, 1, 3), '2026-W53'),
+    (date(2027, 1, 4), '2027-W01'),
+    (date(2024, 12, 30), '2025-W01'),  # Eski yılın son günleri yeni yılın 1. haftası
+])
+def test_iso_week_year_rollover(calendar, day, iso_week):
+    value = datetime(day.year, day.month, day.day, 12, 0, tzinfo=calendar.timezone)
+    assert calendar.buckets(value)['isoWeek'] == iso_week
+
+
+def test_new_year_in_local_time_before_utc(calendar):
+    buckets = calendar.buckets(utc(2026, 12, 31, 21, 30))  # Yerel 2027-01-01 00:30
+    assert (buckets['day'], buckets['month'], buckets['isoWeek']) == ('2027-01-01', '2027-01', '2026-W53')
+    assert calendar.buckets(utc(2026, 12, 31, 20, 59))['day'] == '2026-12-31'
+
+
+def test_from_config_reads_business_hours():
+    calendar = CalendarBuckets.from_config({
+        'timezone': 'UTC',
+        'business_hours': {'start': 540, 'end': '17:00', 'weekdays': [1, 2, 3, 4, 5]},  # YAML 09:00 -> 540
+        'holidays': [date(2024, 3, 15)],
+    })
+    assert calendar.buckets(utc(2024, 3, 14, 9, 0))['businessHours'] is True
+    assert calendar.buckets(utc(2024, 3, 14, 8, 59))['businessHours'] is False
+    assert calendar.buckets(utc(2024, 3, 15, 10, 0))['businessHours'] is False
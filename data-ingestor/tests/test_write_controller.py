@@ -0,0 +1,142 @@
+"""AdaptiveWriteController: p95'e göre AIMD, sınırlar, geçici hatada bekleme ve bekleyen yazmaların uyandırılması"""
+import asyncio
+
+from pymongo.errors import AutoReconnect
+
+from helpers.write_controller import AdaptiveWriteController
+
+
+def make_controller(**options):
+    settings = dict(batch_size=1000, concurrency=4, target_p95_ms=500, min_batch_size=100,
+                    max_batch_size=2000, batch_step=250, window=5, backoff_seconds=10, max_backoff_seconds=30)
+    settings.update(options)
+    return AdaptiveWriteController(**settings)
+
+
+def observe_window(controller, latency):
+    for _ in range(controller.window):
+        controller.observe(latency)
+
+
+def test_p95_above_target_decreases():
+    controller = make_controller()
+    observe_window(controller, 0.8)
+    assert (controller.batch_size, controller.concurrency) == (500, 3)
+    assert controller.decreases == 1
+
+
+def test_p95_below_headroom_increases():
+    controller = make_controller(max_concurrency=8)
+    observe_window(controller, 0.1)
+    assert (controller.batch_size, controller.concurrency) == (1250, 5)
+    assert controller.increases == 1
+
+
+def test_p95_within_target_keeps_settings():
+    controller = make_controller()
+    observe_window(controller, 0.4)  # headroom (250ms) ile hedef (500ms) arası
+    assert (controller.batch_size, controller.concurrency) == (1000, 4)
+    assert controller.increases == controller.decreases == 0
+
+
+def test_p95_uses_the_slowest_writes_of_the_window():
+    controller = make_controller(window=20)
+    for _ in range(18):
+        controller.observe(0.1)
+    controller.observe(0.9)
+    controller.observe(0.9)
+    assert controller.decreases == 1
+
+
+def test_decisions_wait_for_a_full_window():
+    controller = make_controller()
+    for _ in range(controller.window - 1):
+        controller.observe(0.8)
+    assert (controller.batch_size, controller.concurrency) == (1000, 4)
+
+
+def test_settings_are_clamped():
+    controller = make_controller(batch_size=150, concurrency=1)
+    observe_window(controller, 0.8)
+    assert (controller.batch_size, controller.concurrency) == (100, 1)
+
+    controller = make_controller(batch_size=1900, concurrency=4)
+    observe_window(controller, 0.1)
+    assert (controller.batch_size, controller.concurrency) == (2000, 4)  # max_concurrency = concurrency
+    observe_window(controller, 0.1)
+    assert controller.increases == 1  # İkisi de üst sınırda: karar yok
+
+    controller = make_controller(batch_size=50000, concurrency=0)
+    assert (controller.batch_size, controller.concurrency) == (2000, 1)
+
+
+def test_backoff_halves_and_grows_exponentially():
+    controller = make_controller()
+    assert controller.backoff(AutoReconnect('down')) == 10
+    assert (controller.batch_size, controller.concurrency) == (500, 2)
+
+    controller._resume_at = 0  # Bekleme doldu, kesinti sürüyor
+    assert controller.backoff(AutoReconnect('down')) == 20
+    controller._resume_at = 0
+    assert controller.backoff(AutoReconnect('down')) == 30  # max_backoff_seconds
+    assert controller.backoffs == 3
+
+
+def test_backoff_joins_an_in_progress_pause():
+    controller = make_controller()
+    controller.backoff(AutoReconnect('down'))
+    delay = controller.backoff(AutoReconnect('down'))  # Paralel batch'in aynı kesintideki hatası
+
+    assert 0 < delay <= 10
+    assert (controller.batch_size, controller.concurrency) == (500, 2)
+    assert controller.backoffs == 1
+
+
+def test_successful_write_resets_backoff():
+    controller = make_controller()
+    controller.backoff(AutoReconnect('down'))
+    controller.observe(0.1)
+    controller._resume_at = 0
+    assert controller.backoff(AutoReconnect('down')) == 10
+
+
+def test_acquire_limits_concurrent_writes():
+    async def scenario():
+        controller = make_controller(concurrency=1)
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        controller.release()
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(scenario())
+
+
+def test_growing_concurrency_wakes_waiters():
+    async def scenario():
+        controller = make_controller(concurrency=1, max_concurrency=2)
+        await controller.acquire()
+        waiting = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        # Slot bırakılmadan: hızlı yazmalar concurrency'yi artırır, bekleyen yazma başlar
+        observe_window(controller, 0.1)
+        assert controller.concurrency == 2
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(scenario())
+
+
+def test_acquire_waits_for_backoff_to_end():
+    async def scenario():
+        controller = make_controller(backoff_seconds=0.05)
+        controller.backoff(AutoReconnect('down'))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await controller.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) >= 0.04